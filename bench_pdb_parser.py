@@ -0,0 +1,1290 @@
+import sys
+import time
+import math
+import random
+import argparse
+import tempfile
+import os
+import io
+import json
+import platform
+import datetime
+import itertools
+import contextlib
+import gzip
+import bz2
+import lzma
+import shutil
+import tracemalloc
+import asyncio
+import subprocess
+
+from pdb_parser import (RaminCalc, AtomTable, LazyAtomTable, Structure, pdb_file_reader, atom_table_reader, mmap_pdb_reader,
+                        hetero_atom_pdb_reader, amino_acid_composition_calculator,
+                        amino_acid_composition_percentage_calculator, atomic_composition_calculator,
+                        atomic_composition_percentage_calculator, amino_acid_hydrophobicity_composition_calculator,
+                        amino_acid_hydrophobicity_composition_percentage_calculator,
+                        amino_acid_charge_composition_calculator, hetero_atom_residue_counter,
+                        most_distant_residue_finder, radius_of_gyration_calculator, print_function,
+                        analysis_record, atomic_mass, open_pdb, parser_version, Kyte_Doolittle_scale, Trajectory)
+from pdb_cache import ResultCache
+from pdb_binary import save_structure, load_structure
+from pdb_spatial import CellList
+from pdb_profile import Profiler
+from pdb_select import compile_selection
+from pdb_service import AnalysisService
+from pdb_backbone import backbone_chains, backbone_dihedrals, secondary_structure
+from pdb_sasa import atom_sasa
+from pdb_superpose import coordinate_stack, rmsd_to_reference, rmsd_matrix
+
+"""
+Benchmarks for the PDB parser
+
+Usage: python bench_pdb_parser.py <benchmark> [--atoms N]
+       python bench_pdb_parser.py suite [--atoms N] [--models M] [--hetatm-fraction F] [--history file.json]
+       python bench_pdb_parser.py compare old.json new.json [--threshold 0.1]
+"""
+
+# residue templates used by the synthetic structure generator: (atom name, element)
+_backbone = [("N", "N"), ("CA", "C"), ("C", "C"), ("O", "O"), ("CB", "C")]
+_residue_names = ["ALA", "ARG", "ASN", "ASP", "CYS", "GLN", "GLU", "GLY", "HIS", "ILE",
+                  "LEU", "LYS", "MET", "PHE", "PRO", "SER", "THR", "TRP", "TYR", "VAL"]
+# ligands of the synthetic HETATM records, every ligand residue has these 10 atoms: (atom name, element)
+_ligand_names = ["ATP", "NAG", "HEM", "FAD", "SAM"]
+_ligand_atoms = [("C1", "C"), ("C2", "C"), ("C3", "C"), ("C4", "C"), ("N1", "N"),
+                 ("N2", "N"), ("O1", "O"), ("O2", "O"), ("O3", "O"), ("S1", "S")]
+# ideal bond lengths (Å) and angles (degrees) of the backbone, used by backbone_from_dihedrals
+_bond_lengths = {"N-CA": 1.458, "CA-C": 1.525, "C-N": 1.329, "C-O": 1.231}
+_bond_angles = {"N-CA-C": 111.2, "CA-C-N": 116.2, "C-N-CA": 121.7, "CA-C-O": 120.5}
+
+
+def _reflect(value, wall=500.0):
+    if abs(value) > wall:
+        return (2 * wall - abs(value)) * (1 if value > 0 else -1)
+    return value
+
+
+def synthetic_atom_lines(n_atoms, n_chains=1, seed=0):
+    """
+        Function to generate format-valid ATOM lines of a synthetic structure
+
+        Parameters
+        ----------
+        n_atoms : int
+            number of ATOM lines to generate
+
+        n_chains : int
+            number of chains the atoms are split into
+
+        seed : int
+            seed of the random walk of the coordinates
+
+        Return
+        ----------
+        lines : generator
+            generator of PDB ATOM lines (with trailing newline)
+
+    """
+    rng = random.Random(seed)
+    atoms_per_chain = max(1, -(-n_atoms // n_chains))
+    x, y, z = 0.0, 0.0, 0.0
+    for i in range(n_atoms):
+        chain_index, index_in_chain = divmod(i, atoms_per_chain)
+        chain = chr(ord("A") + chain_index % 26)
+        residue_index, atom_index = divmod(index_in_chain, len(_backbone))
+        atom_name, element = _backbone[atom_index]
+        # the coordinates follow a random walk so the chains are spread in space, reflected at the walls of a
+        # box so they always fit the 8 character coordinate columns
+        x, y, z = (_reflect(value + rng.uniform(-1.5, 1.5)) for value in (x, y, z))
+        yield "ATOM  %5d  %-3s %3s %1s%4d    %8.3f%8.3f%8.3f%6.2f%6.2f          %2s  \n" % (
+            (i + 1) % 100000, atom_name, _residue_names[residue_index % len(_residue_names)], chain,
+            (residue_index + 1) % 10000, x, y, z, 1.0, rng.uniform(10.0, 80.0), element)
+
+
+def synthetic_hetatm_lines(n_hetatm, atom_lines, first_serial=1, seed=0):
+    """
+        Function to generate HETATM lines of ligands and waters around a synthetic structure
+
+        Parameters
+        ----------
+        n_hetatm : int
+            number of HETATM lines, half of them ligand atoms (residues of 10 atoms) and half waters
+
+        atom_lines : list
+            ATOM lines the ligands and waters are placed next to
+
+        first_serial : int
+            atom serial number of the first HETATM line
+
+        seed : int
+            seed of the placement
+
+        Return
+        ----------
+        lines : generator
+            generator of PDB HETATM lines (with trailing newline)
+
+    """
+    rng = random.Random(seed)
+    n_ligand = n_hetatm - n_hetatm // 2
+    x = y = z = 0.0
+    for i in range(n_hetatm):
+        if i < n_ligand:
+            residue_index, atom_index = divmod(i, 10)
+            name, chain = _ligand_names[residue_index % len(_ligand_names)], "Z"
+            atom_name, element = _ligand_atoms[atom_index]
+        else:
+            residue_index, atom_index = i - n_ligand, 0
+            name, chain, atom_name, element = "HOH", "W", "O", "O"
+        if atom_index == 0:
+            # every residue starts next to a random protein atom
+            anchor = rng.choice(atom_lines)
+            x, y, z = (float(anchor[start:start + 8]) for start in (30, 38, 46))
+        x, y, z = (_reflect(value + rng.uniform(-1.5, 1.5)) for value in (x, y, z))
+        yield "HETATM%5d  %-3s %3s %1s%4d    %8.3f%8.3f%8.3f%6.2f%6.2f          %2s  \n" % (
+            (first_serial + i) % 100000, atom_name, name, chain, (residue_index + 1) % 10000, x, y, z, 1.0,
+            rng.uniform(10.0, 80.0), element)
+
+
+def write_synthetic_pdb(path, n_atoms, n_chains=1, seed=0, models=1, hetatm_fraction=0.0):
+    """
+        Function to write a synthetic structure
+
+        Parameters
+        ----------
+        path : str
+            output path
+
+        n_atoms : int
+            number of ATOM records per model
+
+        n_chains : int
+            number of chains
+
+        seed : int
+            seed of the coordinates
+
+        models : int
+            number of models, more than one writes MODEL/ENDMDL records with displaced coordinates
+
+        hetatm_fraction : float
+            number of HETATM records (ligands and waters) as a fraction of n_atoms
+
+        Return
+        ----------
+        path : str
+
+    """
+    atom_lines = list(synthetic_atom_lines(n_atoms, n_chains, seed))
+    hetatm_lines = list(synthetic_hetatm_lines(round(n_atoms * hetatm_fraction), atom_lines, n_atoms + 1, seed))
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        for model in range(models):
+            if models > 1:
+                f.write("MODEL     %4d\n" % (model + 1))
+            if model == 0:
+                f.writelines(atom_lines)
+                f.writelines(hetatm_lines)
+            else:
+                # the later models move every atom a little
+                for line in itertools.chain(atom_lines, hetatm_lines):
+                    f.write(line[:30] + "".join("%8.3f" % _reflect(float(line[start:start + 8]) + rng.gauss(0, 0.5))
+                                                for start in (30, 38, 46)) + line[54:])
+            if models > 1:
+                f.write("ENDMDL\n")
+        f.write("END\n")
+    return path
+
+
+def _place(a, b, c, length, angle, torsion):
+    # point d with |cd| = length, angle bcd and dihedral abcd in degrees (natural extension reference frame)
+    angle = math.radians(angle)
+    torsion = math.radians(torsion)
+    bc = [c[k] - b[k] for k in range(3)]
+    norm = math.sqrt(sum(v * v for v in bc))
+    bc = [v / norm for v in bc]
+    ab = [b[k] - a[k] for k in range(3)]
+    n = [ab[1] * bc[2] - ab[2] * bc[1], ab[2] * bc[0] - ab[0] * bc[2], ab[0] * bc[1] - ab[1] * bc[0]]
+    norm = math.sqrt(sum(v * v for v in n))
+    n = [v / norm for v in n]
+    m = [n[1] * bc[2] - n[2] * bc[1], n[2] * bc[0] - n[0] * bc[2], n[0] * bc[1] - n[1] * bc[0]]
+    x = -length * math.cos(angle)
+    y = length * math.sin(angle) * math.cos(torsion)
+    z = length * math.sin(angle) * math.sin(torsion)
+    return tuple(c[k] + x * bc[k] + y * m[k] + z * n[k] for k in range(3))
+
+
+def backbone_from_dihedrals(angles, chain="A", residue_name="ALA", first_number=1, first_serial=1):
+    """
+        Function to build the ATOM records of a backbone with ideal geometry from its dihedrals
+
+        Parameters
+        ----------
+        angles : list
+            list of (phi, psi, omega) in degrees per residue, the phi of the first residue and the omega of the
+            last one are not used
+
+        chain : str
+            chain identifier
+
+        residue_name : str
+            name of every residue
+
+        first_number, first_serial : int
+            residue sequence number and atom serial number of the first residue and atom
+
+        Return
+        ----------
+        atom_lines : list
+            N, CA, C and O records of every residue
+
+    """
+    lines = []
+    n, ca = (0.0, 0.0, 0.0), (_bond_lengths["N-CA"], 0.0, 0.0)
+    c = _place((0.0, 1.0, 0.0), n, ca, _bond_lengths["CA-C"], _bond_angles["N-CA-C"], -60.0)
+    for index, (phi, psi, omega) in enumerate(angles):
+        if index:
+            previous_n, previous_ca, previous_c = n, ca, c
+            n = _place(previous_n, previous_ca, previous_c, _bond_lengths["C-N"], _bond_angles["CA-C-N"], previous[1])
+            ca = _place(previous_ca, previous_c, n, _bond_lengths["N-CA"], _bond_angles["C-N-CA"], previous[2])
+            c = _place(previous_c, n, ca, _bond_lengths["CA-C"], _bond_angles["N-CA-C"], phi)
+        o = _place(n, ca, c, _bond_lengths["C-O"], _bond_angles["CA-C-O"], psi + 180.0)
+        previous = (phi, psi, omega)
+        for atom, (x, y, z) in zip(("N", "CA", "C", "O"), (n, ca, c, o)):
+            lines.append("ATOM  %5d  %-3s %3s %1s%4d    %8.3f%8.3f%8.3f%6.2f%6.2f          %2s  \n" % (
+                (first_serial + len(lines)) % 100000, atom, residue_name, chain, (first_number + index) % 10000,
+                x, y, z, 1.0, 20.0, atom[0]))
+    return lines
+
+
+def synthetic_backbone_lines(n_residues, chain_length=2000, seed=0):
+    """
+        Function to generate the backbone of an assembly of chains made of helices and hairpins
+
+        Parameters
+        ----------
+        n_residues : int
+            number of residues
+
+        chain_length : int
+            residues per chain, the chains are laid out 200 Å apart on a grid
+
+        seed : int
+            seed of the segment lengths
+
+        Return
+        ----------
+        atom_lines : list
+            N, CA, C and O records
+
+    """
+    rng = random.Random(seed)
+    helix, strand, loop = (-57.0, -47.0, 180.0), (-139.0, 135.0, 180.0), (-70.0, 140.0, 180.0)
+    hairpin = [strand] * 6 + [(60.0, -120.0, 180.0), (-80.0, 0.0, 180.0)] + [strand] * 6
+    chain_ids = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+    lines = []
+    for index, start in enumerate(range(0, n_residues, chain_length)):
+        angles = []
+        length = min(chain_length, n_residues - start)
+        while len(angles) < length:
+            angles += [helix] * rng.randint(8, 25) if rng.random() < 0.5 else hairpin
+            angles += [loop] * rng.randint(2, 5)
+        dx, dy = (index % 10) * 200.0, (index // 10) * 200.0
+        for line in backbone_from_dihedrals(angles[:length], chain_ids[index % len(chain_ids)],
+                                            first_serial=len(lines) + 1):
+            lines.append(line[:30] + "%8.3f%8.3f" % (float(line[30:38]) + dx, float(line[38:46]) + dy) + line[46:])
+    return lines
+
+
+def synthetic_globule_lines(n_atoms, n_chains=4, spacing=2.7, seed=0):
+    """
+        Function to generate ATOM lines of a compact globule, about as densely packed as a protein
+
+        Parameters
+        ----------
+        n_atoms : int
+            number of ATOM lines to generate
+
+        n_chains : int
+            number of chains, every chain is a slab of the globule
+
+        spacing : float
+            distance in Å between neighboring atoms of the jittered cubic lattice the atoms sit on
+
+        seed : int
+            seed of the jitter
+
+        Return
+        ----------
+        lines : list
+            list of PDB ATOM lines (with trailing newline)
+
+    """
+    rng = random.Random(seed)
+    side = max(1, round(n_atoms ** (1.0 / 3.0)))
+    atoms_per_chain = max(1, -(-n_atoms // n_chains))
+    lines = []
+    for i in range(n_atoms):
+        chain_index, index_in_chain = divmod(i, atoms_per_chain)
+        residue_index, atom_index = divmod(index_in_chain, len(_backbone))
+        atom_name, element = _backbone[atom_index]
+        # lattice position of the atom, filling the globule layer by layer
+        layer, rest = divmod(i, side * side)
+        x, y, z = ((value + rng.uniform(-0.15, 0.15)) * spacing for value in (layer, *divmod(rest, side)))
+        lines.append("ATOM  %5d  %-3s %3s %1s%4d    %8.3f%8.3f%8.3f%6.2f%6.2f          %2s  \n" % (
+            (i + 1) % 100000, atom_name, _residue_names[residue_index % len(_residue_names)],
+            chr(ord("A") + chain_index % 26), (residue_index + 1) % 10000, x, y, z, 1.0, 20.0, element))
+    return lines
+
+
+def synthetic_ensemble_text(n_models, n_residues, noise=1.0, seed=0):
+    """
+        Function to generate an ensemble of models (MODEL/ENDMDL) of a synthetic backbone
+
+        Parameters
+        ----------
+        n_models : int
+            number of models
+
+        n_residues : int
+            residues of the single chain of every model
+
+        noise : float
+            standard deviation in Å of the displacement of every atom from the first model
+
+        seed : int
+            seed of the rotations and displacements
+
+        Return
+        ----------
+        text : str
+            PDB text of the models, every model randomly rotated around z and shifted
+
+    """
+    rng = random.Random(seed)
+    atom_lines = synthetic_backbone_lines(n_residues, chain_length=n_residues, seed=seed)
+    points = [tuple(float(line[start:start + 8]) for start in (30, 38, 46)) for line in atom_lines]
+    parts = []
+    for model in range(n_models):
+        angle = rng.uniform(-math.pi, math.pi)
+        cos, sin = math.cos(angle), math.sin(angle)
+        shift = [rng.uniform(-10.0, 10.0) for _ in range(3)]
+        parts.append(f"MODEL     {model + 1:4d}\n")
+        for line, (x, y, z) in zip(atom_lines, points):
+            if model:
+                x, y, z = (value + rng.gauss(0.0, noise) for value in (x, y, z))
+            parts.append("%s%8.3f%8.3f%8.3f%s" % (line[:30], cos * x - sin * y + shift[0], sin * x + cos * y + shift[1],
+                                                  z + shift[2], line[54:]))
+        parts.append("ENDMDL\n")
+    return "".join(parts)
+
+
+def _legacy_get_custom_data_pdb(pdb_line, template_get, simple=False):
+    # the original eval() based implementation of RaminCalc.get_custom_data_pdb, kept as the baseline
+    result_temp = "{"
+    for key, value in template_get.items():
+        result_temp += "'" + key + "'" + ":pdb_line" + str(value) + ",\n"
+    result_temp += "}"
+    result_temp = eval(result_temp)
+    if simple == True and len(result_temp.items()) == 1:
+        return list(result_temp.values())[0]
+    return result_temp
+
+
+def _timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def _legacy_radius_of_gyration(atom_lines):
+    # the original radius_of_gyration_calculator: a dictionary per atom, then one pass per sum
+    template = RaminCalc.get_template_pdb(["Element symbol", "X orthogonal Å coordinate",
+                                           "Y orthogonal Å coordinate", "Z orthogonal Å coordinate"])
+    atoms = []
+    for line in atom_lines:
+        d_temp = _legacy_get_custom_data_pdb(line, template)
+        atoms.append({"mass": atomic_mass[d_temp["Element symbol"]],
+                      "x": float(d_temp["X orthogonal Å coordinate"]),
+                      "y": float(d_temp["Y orthogonal Å coordinate"]),
+                      "z": float(d_temp["Z orthogonal Å coordinate"])})
+    total_mass = sum([x["mass"] for x in atoms])
+    center_of_mass = {axis: sum([x[axis] * x["mass"] for x in atoms]) / total_mass for axis in "xyz"}
+    return (sum([x["mass"] * sum([(x[axis] - center_of_mass[axis]) ** 2 for axis in "xyz"]) for x in atoms])
+            / total_mass) ** 0.5
+
+
+def bench_extractor(atom_lines):
+    """
+        Function to compare the eval() based extraction with the compiled column extractor
+
+        Parameters
+        ----------
+        atom_lines : list
+            list of atomic lines
+
+        Return
+        ----------
+        results : dictionary
+            key: name of the extraction path
+            value: lines per second
+
+    """
+    template_get = RaminCalc.get_template_pdb(["Chain identifier", "Atom name", "Residue sequence number",
+                                               "X orthogonal Å coordinate", "Y orthogonal Å coordinate",
+                                               "Z orthogonal Å coordinate"])
+    extractor = RaminCalc.compile_template_pdb(template_get)
+
+    def run_legacy():
+        for line in atom_lines:
+            _legacy_get_custom_data_pdb(line, template_get)
+
+    def run_cached():
+        for line in atom_lines:
+            RaminCalc.get_custom_data_pdb(line, template_get)
+
+    def run_compiled():
+        for line in atom_lines:
+            extractor(line)
+
+    def run_compiled_values():
+        for _ in extractor.iter_values(atom_lines):
+            pass
+
+    results = {}
+    for name, function in [("eval per line", run_legacy), ("get_custom_data_pdb", run_cached),
+                           ("compiled dict", run_compiled), ("compiled tuple", run_compiled_values)]:
+        _, seconds = _timed(function)
+        results[name] = len(atom_lines) / seconds
+    return results
+
+
+def _retained_bytes(function, *args):
+    # bytes still allocated by the object function returns, measured with tracemalloc
+    tracemalloc.start()
+    result = function(*args)
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, retained
+
+
+def _atom_dicts(pdb_file):
+    # the per-atom dictionaries radius_of_gyration_calculator used to build from the atomic lines
+    template = RaminCalc.get_template_pdb(["Element symbol", "X orthogonal Å coordinate",
+                                           "Y orthogonal Å coordinate", "Z orthogonal Å coordinate"])
+    extractor = RaminCalc.compile_template_pdb(template)
+    return [{"name": element, "mass": 12.0107, "x": float(x), "y": float(y), "z": float(z)}
+            for element, x, y, z in extractor.iter_values(pdb_file_reader(pdb_file))]
+
+
+def bench_memory(pdb_file):
+    """
+        Function to compare the memory per atom of the atomic lines with the columnar AtomTable
+
+        Parameters
+        ----------
+        pdb_file : str
+            path to pdb file
+
+        Return
+        ----------
+        results : dictionary
+            key: name of the representation
+            value: bytes per atom
+
+    """
+    lines, lines_bytes = _retained_bytes(pdb_file_reader, pdb_file)
+    _, dicts_bytes = _retained_bytes(_atom_dicts, pdb_file)
+    table, table_bytes = _retained_bytes(atom_table_reader, pdb_file)
+    return {"list of strings": lines_bytes / len(lines),
+            "list of atom dicts": dicts_bytes / len(lines),
+            "AtomTable": table_bytes / len(table),
+            "AtomTable columns only": table.nbytes / len(table)}
+
+
+def _peak_bytes(function, *args):
+    # peak of the Python allocations while function runs, measured with tracemalloc
+    # the time is taken on a separate run since tracing slows down every allocation
+    _, seconds = _timed(function, *args)
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak, seconds
+
+
+def bench_mmap(pdb_file):
+    """
+        Function to compare the peak memory of atomic_composition_calculator reading lines and mapped records
+
+        Parameters
+        ----------
+        pdb_file : str
+            path to pdb file
+
+        Return
+        ----------
+        results : dictionary
+            key: name of the reader
+            value: (peak bytes, seconds)
+
+    """
+    def with_lines():
+        atomic_composition_calculator(pdb_file_reader(pdb_file))
+
+    def with_mmap():
+        with mmap_pdb_reader(pdb_file) as records:
+            atomic_composition_calculator(records)
+
+    return {"pdb_file_reader": _peak_bytes(with_lines), "mmap_pdb_reader": _peak_bytes(with_mmap)}
+
+
+def bench_cache(pdb_files, cache_directory):
+    """
+        Function to compare analyzing files without cache, with a cold cache and with a warm cache
+
+        Parameters
+        ----------
+        pdb_files : list
+            list of paths to pdb files
+
+        cache_directory : str
+            empty directory for the cache
+
+        Return
+        ----------
+        results : dictionary
+            key: name of the run
+            value: seconds
+
+    """
+    def uncached():
+        for pdb_file in pdb_files:
+            analysis_record(pdb_file)
+
+    cache = ResultCache(cache_directory)
+
+    def cached():
+        for pdb_file in pdb_files:
+            cache.analyze(pdb_file)
+
+    results = {"no cache": _timed(uncached)[1], "cold cache": _timed(cached)[1], "warm cache": _timed(cached)[1]}
+    results["hits/misses"] = (cache.hits, cache.misses)
+    return results
+
+
+def bench_binary(pdb_file, binary_file):
+    """
+        Function to compare parsing the PDB text with loading the binary format
+
+        Parameters
+        ----------
+        pdb_file : str
+            path to pdb file
+
+        binary_file : str
+            path the binary file is written to
+
+        Return
+        ----------
+        results : dictionary
+            key: name of the step
+            value: seconds (and the file sizes in bytes)
+
+    """
+    structure, parse_seconds = _timed(Structure.from_file, pdb_file)
+    _, save_seconds = _timed(save_structure, structure, binary_file)
+    loaded, load_seconds = _timed(load_structure, binary_file)
+    assert len(loaded) == len(structure)
+    return {"text parse": parse_seconds, "binary save": save_seconds, "binary load": load_seconds,
+            "text bytes": os.path.getsize(pdb_file), "binary bytes": os.path.getsize(binary_file)}
+
+
+def synthetic_shell_lines(n_residues, radius=None, seed=0):
+    """
+        Function to generate CA atoms spread on a spherical shell, the worst case of the most distant pair search
+
+        Parameters
+        ----------
+        n_residues : int
+            number of CA atoms
+
+        radius : float
+            radius of the shell in Å, by default the one of a globule of the same number of residues
+
+        seed : int
+            seed of the directions
+
+        Return
+        ----------
+        atom_lines : list
+            CA records of a single chain
+
+    """
+    rng = random.Random(seed)
+    radius = radius or 3.0 * n_residues ** (1 / 3)
+    lines = []
+    for i in range(n_residues):
+        direction = [rng.gauss(0.0, 1.0) for _ in range(3)]
+        norm = math.sqrt(sum(value * value for value in direction))
+        x, y, z = (radius * value / norm for value in direction)
+        lines.append("ATOM  %5d  CA  ALA A%4d    %8.3f%8.3f%8.3f  1.00 20.00           C  \n" % (
+            (i + 1) % 100000, (i + 1) % 10000, x, y, z))
+    return lines
+
+
+def bench_most_distant(chain_sizes, max_exhaustive=10000, shapes=("walk", "shell")):
+    """
+        Function to compare the exhaustive and the fast most_distant_residue_finder on single chains
+
+        Parameters
+        ----------
+        chain_sizes : list
+            number of CA atoms of every benchmarked chain
+
+        max_exhaustive : int
+            the O(n^2) path is skipped (None) for chains with more CA atoms than this
+
+        shapes : tuple
+            "walk" for the random walk of synthetic_atom_lines, "shell" for CA atoms on a spherical shell, where
+            every atom is as far from the center as the others
+
+        Return
+        ----------
+        results : list
+            list of (shape, CA atoms, exhaustive seconds or None, fast seconds, identical result or None)
+
+    """
+    results = []
+    for shape in shapes:
+        for size in chain_sizes:
+            atom_lines = synthetic_shell_lines(size) if shape == "shell" \
+                else synthetic_atom_lines(size * len(_backbone))
+            table = AtomTable.from_lines(atom_lines)
+            fast, fast_seconds = _timed(lambda: most_distant_residue_finder(table, fast=True))
+            if size <= max_exhaustive:
+                exhaustive, exhaustive_seconds = _timed(lambda: most_distant_residue_finder(table))
+                results.append((shape, size, exhaustive_seconds, fast_seconds, exhaustive == fast))
+            else:
+                results.append((shape, size, None, fast_seconds, None))
+    return results
+
+
+def bench_rg(atom_lines):
+    """
+        Function to compare the original and the single pass radius_of_gyration_calculator
+
+        Parameters
+        ----------
+        atom_lines : list
+            list of atomic lines
+
+        Return
+        ----------
+        results : dictionary
+            key: name of the variant
+            value: (seconds, radius of gyration)
+
+    """
+    table = AtomTable.from_lines(atom_lines)
+    results = {}
+    for name, function in [("original", lambda: _legacy_radius_of_gyration(atom_lines)),
+                           ("single pass, lines", lambda: radius_of_gyration_calculator(atom_lines)),
+                           ("single pass, table", lambda: radius_of_gyration_calculator(table)),
+                           ("per chain, table", lambda: radius_of_gyration_calculator(table, by_chain=True))]:
+        value, seconds = _timed(function)
+        results[name] = (seconds, value)
+    return results
+
+
+def bench_contacts(atom_counts, cutoff=4.0):
+    """
+        Function to time all pairs within a cutoff on synthetic structures of growing size
+
+        Parameters
+        ----------
+        atom_counts : list
+            number of atoms of every benchmarked structure
+
+        cutoff : float
+            contact cutoff in Å, also used as the cell size
+
+        Return
+        ----------
+        results : list
+            list of (atoms, index build seconds, pairs seconds, number of pairs)
+
+    """
+    results = []
+    for n_atoms in atom_counts:
+        table = AtomTable.from_lines(synthetic_atom_lines(n_atoms))
+        index, build_seconds = _timed(CellList, table.coordinates, cutoff)
+        n_pairs, pairs_seconds = _timed(lambda: sum(1 for _ in index.pairs_within(cutoff)))
+        results.append((n_atoms, build_seconds, pairs_seconds, n_pairs))
+    return results
+
+
+def bench_compressed(pdb_file):
+    """
+        Function to compare building a Structure from plain and compressed copies of a file
+
+        Parameters
+        ----------
+        pdb_file : str
+            path to plain pdb file, the compressed copies are written next to it
+
+        Return
+        ----------
+        results : dictionary
+            key: name of the input and reading mode
+            value: (seconds, file bytes)
+
+    """
+    results = {}
+    for suffix, opener in [(".gz", gzip.open), (".bz2", bz2.open), (".xz", lzma.open)]:
+        with open(pdb_file, "rb") as source, opener(pdb_file + suffix, "wb") as target:
+            shutil.copyfileobj(source, target)
+    for name, path, threaded in [("plain", pdb_file, False), ("gzip", pdb_file + ".gz", False),
+                                 ("gzip, threaded", pdb_file + ".gz", True), ("bz2", pdb_file + ".bz2", False),
+                                 ("bz2, threaded", pdb_file + ".bz2", True), ("xz", pdb_file + ".xz", False),
+                                 ("xz, threaded", pdb_file + ".xz", True)]:
+        def parse():
+            with open_pdb(path, threaded=threaded) as lines:
+                return Structure.from_file(lines)
+        _, seconds = _timed(parse)
+        results[name] = (seconds, os.path.getsize(path))
+    return results
+
+
+def bench_profile(pdb_file, repeat=3):
+    """
+        Function to measure the overhead of the profiling hooks of print_function
+
+        Parameters
+        ----------
+        pdb_file : str
+            path to pdb file
+
+        repeat : int
+            every variant is run this many times and the fastest run is kept
+
+        Return
+        ----------
+        results : dictionary
+            key: profiling mode
+            value: seconds
+
+    """
+    def run(profiler):
+        with contextlib.redirect_stdout(io.StringIO()):
+            print_function(pdb_file, profiler)
+    # a warm-up run, so the file is in the page cache for every variant
+    run(None)
+    results = {}
+    for name, make in [("off", lambda: None), ("timing", Profiler), ("timing and memory", lambda: Profiler(True))]:
+        _, results[name] = _best_of(repeat, lambda: run(make()))
+    return results
+
+
+def bench_lazy(atom_lines):
+    """
+        Function to compare decoding only the used columns with decoding every column
+
+        Parameters
+        ----------
+        atom_lines : list
+            list of atomic lines
+
+        Return
+        ----------
+        results : dictionary
+            key: calculator
+            value: (seconds with a full AtomTable, seconds with a LazyAtomTable, decoded lazy columns)
+            both include building the table from the lines
+
+    """
+    results = {}
+    for name, calculator in [("atomic_composition", atomic_composition_calculator),
+                             ("most_distant_residue_finder", lambda table: most_distant_residue_finder(table,
+                                                                                                        fast=True)),
+                             ("radius_of_gyration", radius_of_gyration_calculator)]:
+        full, full_seconds = _timed(lambda: calculator(AtomTable.from_lines(atom_lines)))
+        table = LazyAtomTable(atom_lines)
+        lazy, lazy_seconds = _timed(calculator, table)
+        assert lazy == full
+        results[name] = (full_seconds, lazy_seconds, table.decoded())
+    return results
+
+
+def bench_select(atom_lines):
+    """
+        Function to compare compiled selection masks with filtering the atoms in Python
+
+        Parameters
+        ----------
+        atom_lines : list
+            list of atomic lines
+
+        Return
+        ----------
+        results : dictionary
+            key: query
+            value: (seconds filtering the parsed lines, seconds of the first mask, seconds of the cached mask,
+            selected atoms)
+
+    """
+    table = AtomTable.from_lines(atom_lines)
+    atoms = [RaminCalc.get_data_pdb(line) for line in atom_lines]
+    queries = [("chain A and name CA", lambda atom: atom["Chain identifier"] == "A" and atom["Atom name"] == "CA"),
+               ("element C N O and bfactor < 50",
+                lambda atom: atom["Element symbol"] in ("C", "N", "O") and float(atom["Temperature factor"]) < 50),
+               ("not protein or resid 10-20",
+                lambda atom: atom["Type"] != "ATOM" or 10 <= int(atom["Residue sequence number"]) <= 20)]
+    results = {}
+    for query, keep in queries:
+        expected, python_seconds = _timed(lambda: [index for index, atom in enumerate(atoms) if keep(atom)])
+        selection = compile_selection(query)
+        first, first_seconds = _timed(selection.indices, table)
+        cached, cached_seconds = _timed(selection.indices, table)
+        assert first == cached == expected
+        results[query] = (python_seconds, first_seconds, cached_seconds, len(expected))
+    return results
+
+
+def bench_backbone(atom_lines):
+    """
+        Function to time the backbone gathering, dihedrals and secondary structure
+
+        Parameters
+        ----------
+        atom_lines : list
+            list of atomic lines
+
+        Return
+        ----------
+        results : dictionary
+            key: step
+            value: seconds, every step on a new AtomTable so none reuses the work of another: the dihedrals and
+            the secondary structure include gathering the backbone, and the secondary structure step is the
+            whole assignment
+
+    """
+    results = {}
+    for name, function in [("gather backbone", backbone_chains), ("dihedrals", backbone_dihedrals),
+                           ("secondary structure", secondary_structure)]:
+        table = AtomTable.from_lines(atom_lines)
+        table.residues()
+        _, results[name] = _timed(function, table)
+    return results
+
+
+def bench_sasa(atom_counts, n_points=100, workers=None):
+    """
+        Function to time the solvent accessible surface area on synthetic globules of growing size
+
+        Parameters
+        ----------
+        atom_counts : list
+            number of atoms of every benchmarked globule
+
+        n_points : int
+            test points on the sphere of every atom
+
+        workers : int
+            processes measuring the chains in parallel, also timed when more than 1
+
+        Return
+        ----------
+        results : list
+            list of (atoms, seconds in this process, seconds with the workers or None, total area in Å²)
+
+    """
+    results = []
+    for n_atoms in atom_counts:
+        table = AtomTable.from_lines(synthetic_globule_lines(n_atoms))
+        areas, seconds = _timed(lambda: atom_sasa(table, n_points=n_points))
+        parallel_seconds = None
+        if workers is not None and workers > 1:
+            _, parallel_seconds = _timed(lambda: atom_sasa(table, n_points=n_points, workers=workers))
+        results.append((n_atoms, seconds, parallel_seconds, sum(areas)))
+    return results
+
+
+def bench_rmsd(n_models, n_residues, workers=None):
+    """
+        Function to time the RMSD of an ensemble, one model versus all and all versus all
+
+        Parameters
+        ----------
+        n_models : int
+            number of models of the ensemble
+
+        n_residues : int
+            residues of every model, the CA atoms are compared
+
+        workers : int
+            processes of the all versus all matrix, also timed when more than 1
+
+        Return
+        ----------
+        results : dictionary
+            key: step
+            value: seconds
+
+    """
+    text = synthetic_ensemble_text(n_models, n_residues)
+    results = {}
+    trajectory, results["read models"] = _timed(Trajectory.from_file, io.StringIO(text))
+    stack, results["match CA atoms"] = _timed(coordinate_stack, trajectory, "name CA")
+    _, results["one vs all"] = _timed(rmsd_to_reference, stack)
+    _, results["all vs all"] = _timed(rmsd_matrix, stack)
+    if workers is not None and workers > 1:
+        _, results[f"all vs all, {workers} workers"] = _timed(rmsd_matrix, stack, workers)
+    return results
+
+
+def bench_service(pdb_files, workers=None):
+    """
+        Function to compare a process per structure with requests to the analysis service
+
+        Parameters
+        ----------
+        pdb_files : list
+            list of paths to pdb files
+
+        workers : int
+            worker processes of the service
+
+        Return
+        ----------
+        results : dictionary
+            key: "process per file", "service" (first requests) and "service cached" (the same requests again)
+            value: (seconds, latency percentiles in milliseconds of the service requests, None for the processes)
+
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pdb_parser.py")
+    _, process_seconds = _timed(lambda: [subprocess.run([sys.executable, script, pdb_file], check=True,
+                                                        stdout=subprocess.DEVNULL) for pdb_file in pdb_files])
+    results = {"process per file": (process_seconds, None)}
+
+    async def run():
+        service = AnalysisService(workers)
+        try:
+            for name in ["service", "service cached"]:
+                service._latencies.clear()
+                start = time.perf_counter()
+                answers = await asyncio.gather(*[_timed_request(service, pdb_file) for pdb_file in pdb_files])
+                assert all(status == 200 for status, _ in answers)
+                results[name] = (time.perf_counter() - start, service.stats()["latency_ms"])
+        finally:
+            service.close()
+
+    asyncio.run(run())
+    return results
+
+
+async def _timed_request(service, pdb_file):
+    # analysis request whose latency is recorded like the HTTP layer does
+    start = time.perf_counter()
+    answer = await service.analyze({"path": pdb_file})
+    service.record_latency(time.perf_counter() - start)
+    return answer
+
+
+def _best_of(repeat, function, *args):
+    # result and the fastest of repeat timed runs
+    best = None
+    for _ in range(repeat):
+        result, seconds = _timed(function, *args)
+        best = seconds if best is None else min(best, seconds)
+    return result, best
+
+
+def bench_suite(pdb_file, repeat=3, max_exhaustive=10000):
+    """
+        Function to time every public function of the parser on a file
+
+        Parameters
+        ----------
+        pdb_file : str
+            path to pdb file
+
+        repeat : int
+            every function is run this many times and the fastest run is kept
+
+        max_exhaustive : int
+            the O(n^2) most_distant_residue_finder is skipped when there are more CA atoms than this
+
+        Return
+        ----------
+        results : dictionary
+            key: function name
+            value: seconds
+
+    """
+    results = {}
+    atom_lines, results["pdb_file_reader"] = _best_of(repeat, pdb_file_reader, pdb_file)
+    heteroatom_lines, results["hetero_atom_pdb_reader"] = _best_of(repeat, hetero_atom_pdb_reader, pdb_file)
+    composition, results["amino_acid_composition_calculator"] = _best_of(
+        repeat, amino_acid_composition_calculator, atom_lines)
+    for function, args in [(amino_acid_composition_percentage_calculator, (atom_lines,)),
+                           (atomic_composition_calculator, (atom_lines,)),
+                           (atomic_composition_percentage_calculator, (atom_lines,)),
+                           (amino_acid_hydrophobicity_composition_calculator, (composition, Kyte_Doolittle_scale)),
+                           (amino_acid_hydrophobicity_composition_percentage_calculator,
+                            (composition, Kyte_Doolittle_scale)),
+                           (amino_acid_charge_composition_calculator, (composition,)),
+                           (hetero_atom_residue_counter, (heteroatom_lines,)),
+                           (radius_of_gyration_calculator, (atom_lines,))]:
+        _, results[function.__name__] = _best_of(repeat, function, *args)
+
+    _, results["most_distant_residue_finder (fast)"] = _best_of(
+        repeat, lambda: most_distant_residue_finder(atom_lines, fast=True))
+    if sum(line[12:16].strip() == "CA" for line in atom_lines) <= max_exhaustive:
+        _, results["most_distant_residue_finder"] = _best_of(repeat, most_distant_residue_finder, atom_lines)
+
+    def quiet_print_function():
+        with contextlib.redirect_stdout(io.StringIO()):
+            print_function(pdb_file)
+    _, results["print_function"] = _best_of(repeat, quiet_print_function)
+    return results
+
+
+def record_history(history_file, entry):
+    # append an entry to the JSON history (a list of entries) and return the whole history
+    history = []
+    if os.path.exists(history_file):
+        with open(history_file, "r") as f:
+            history = json.load(f)
+    history.append(entry)
+    with open(history_file, "w") as f:
+        json.dump(history, f, indent=1)
+    return history
+
+
+def _last_entry(result_file):
+    # the latest entry of a history file, or the entry of a single result file
+    with open(result_file, "r") as f:
+        results = json.load(f)
+    return results[-1] if isinstance(results, list) else results
+
+
+def compare_results(old_file, new_file, threshold=0.1, min_seconds=0.001):
+    """
+        Function to compare two benchmark results and flag the slowdowns
+
+        Parameters
+        ----------
+        old_file : str
+            baseline history or result file, its latest entry is used
+
+        new_file : str
+            new history or result file, its latest entry is used
+
+        threshold : float
+            relative slowdown reported as a regression, 0.1 flags functions more than 10% slower
+
+        min_seconds : float
+            functions faster than this in the new result are never flagged, their timings are mostly noise
+
+        Return
+        ----------
+        rows : list
+            list of (function name, old seconds, new seconds, new / old, regression) of the functions in both
+
+    """
+    old, new = _last_entry(old_file)["results"], _last_entry(new_file)["results"]
+    rows = []
+    for name in old:
+        if name in new:
+            ratio = new[name] / old[name] if old[name] else float("inf")
+            rows.append((name, old[name], new[name], ratio, ratio > 1 + threshold and new[name] >= min_seconds))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks for the PDB parser")
+    parser.add_argument("benchmark", choices=["suite", "compare", "extractor", "memory", "mmap", "most-distant",
+                                              "cache", "binary", "rg", "contacts", "compressed",
+                                              "profile", "lazy", "select", "service", "backbone", "sasa", "rmsd"])
+    parser.add_argument("results", nargs="*", help="compare: the old and the new result or history file")
+    parser.add_argument("--atoms", type=int, default=1000000, help="number of atoms of the synthetic structure")
+    parser.add_argument("--chains", type=int, default=4, help="number of chains of the synthetic structure")
+    parser.add_argument("--files", type=int, default=20, help="number of files the atoms are split into (cache)")
+    parser.add_argument("--ca-sizes", type=int, nargs="+", default=[1000, 10000, 50000],
+                        help="CA atoms per chain for the most-distant benchmark")
+    parser.add_argument("--max-exhaustive", type=int, default=10000,
+                        help="largest chain the O(n^2) most-distant path is timed on")
+    parser.add_argument("--contact-sizes", type=int, nargs="+", default=[25000, 50000, 100000, 200000],
+                        help="atoms of the structures of the contacts benchmark")
+    parser.add_argument("--cutoff", type=float, default=4.0, help="contact cutoff in Å")
+    parser.add_argument("--residues", type=int, default=100000, help="residues of the backbone benchmark")
+    parser.add_argument("--sasa-sizes", type=int, nargs="+", default=[2000, 10000, 50000],
+                        help="atoms of the globules of the sasa benchmark")
+    parser.add_argument("--points", type=int, default=100, help="test points per atom (sasa)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (sasa, rmsd)")
+    parser.add_argument("--ensemble", type=int, nargs=2, default=[1000, 500], metavar=("MODELS", "RESIDUES"),
+                        help="models and residues per model of the rmsd benchmark")
+    parser.add_argument("--models", type=int, default=1, help="models of the synthetic structure (suite)")
+    parser.add_argument("--hetatm-fraction", type=float, default=0.05,
+                        help="HETATM records as a fraction of the atoms (suite)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per function, the fastest is kept (suite)")
+    parser.add_argument("--history", default="bench_history.json", help="JSON history the suite results go to")
+    parser.add_argument("--label", default="", help="label of the suite entry, etc: a version or commit")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative slowdown flagged by compare (default 0.1 = 10%%)")
+    args = parser.parse_args(argv)
+
+    if args.benchmark == "compare":
+        if len(args.results) != 2:
+            parser.error("compare needs the old and the new result file")
+        regressions = 0
+        for name, old, new, ratio, regression in compare_results(*args.results, args.threshold):
+            regressions += regression
+            print(f"{name:<60} {old:9.4f} s  {new:9.4f} s  {ratio:6.2f}x{'  SLOWER' if regression else ''}")
+        print(f"{regressions} regression(s) above {args.threshold:.0%}")
+        return 1 if regressions else 0
+
+    if args.benchmark == "contacts":
+        print(f"Pairs within {args.cutoff} Å through a cell list:")
+        for n_atoms, build_seconds, pairs_seconds, n_pairs in bench_contacts(args.contact_sizes, args.cutoff):
+            print(f"{n_atoms:>8} atoms  build {build_seconds:6.3f} s  pairs {pairs_seconds:7.3f} s  "
+                  f"{n_pairs:>10,} pairs  {pairs_seconds / n_atoms * 1e6:5.2f} us/atom")
+        return
+
+    if args.benchmark == "backbone":
+        atom_lines = synthetic_backbone_lines(args.residues)
+        print(f"Backbone of {args.residues} residues:")
+        for name, seconds in bench_backbone(atom_lines).items():
+            print(f"{name:<20} {seconds:7.3f} s  {seconds / args.residues * 1e6:6.2f} us/residue")
+        return
+
+    if args.benchmark == "sasa":
+        print(f"Solvent accessible surface area, {args.points} points per atom:")
+        for n_atoms, seconds, parallel_seconds, area in bench_sasa(args.sasa_sizes, args.points, args.workers):
+            parallel = "" if parallel_seconds is None else f"  {args.workers} workers {parallel_seconds:7.3f} s"
+            print(f"{n_atoms:>8} atoms  {seconds:7.3f} s  {seconds / n_atoms * 1e6:6.1f} us/atom{parallel}  "
+                  f"area {area:12.1f} Å²")
+        return
+
+    if args.benchmark == "rmsd":
+        n_models, n_residues = args.ensemble
+        print(f"RMSD of {n_models} models of {n_residues} residues (CA):")
+        for name, seconds in bench_rmsd(n_models, n_residues, args.workers).items():
+            unit, count = ("pair", n_models * (n_models - 1) // 2) if name.startswith("all vs all") \
+                else ("model", n_models)
+            print(f"{name:<24} {seconds:8.3f} s  {seconds / count * 1e6:8.1f} us/{unit}")
+        return
+
+    if args.benchmark == "service":
+        with tempfile.TemporaryDirectory() as directory:
+            pdb_files = [write_synthetic_pdb(os.path.join(directory, f"synthetic_{index}.pdb"),
+                                             args.atoms // args.files, args.chains, seed=index)
+                         for index in range(args.files)]
+            print(f"{args.files} structures of {args.atoms // args.files} atoms:")
+            for name, (seconds, latency) in bench_service(pdb_files).items():
+                latency = "" if latency is None else "  " + "  ".join(f"{point} {value:8.1f} ms"
+                                                                      for point, value in latency.items())
+                print(f"{name:<18} {seconds:8.3f} s  {seconds / args.files * 1000:8.1f} ms/structure{latency}")
+        return
+
+    if args.benchmark == "most-distant":
+        print("most_distant_residue_finder, exhaustive vs fast:")
+        for shape, size, exhaustive_seconds, fast_seconds, identical in bench_most_distant(args.ca_sizes,
+                                                                                            args.max_exhaustive):
+            exhaustive = "skipped" if exhaustive_seconds is None else f"{exhaustive_seconds:.3f} s"
+            print(f"{shape:<5} {size:>7} CA  exhaustive {exhaustive:>10}  fast {fast_seconds:8.3f} s  "
+                  f"identical: {identical}")
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.benchmark == "cache":
+            pdb_files = [write_synthetic_pdb(os.path.join(directory, f"synthetic_{index}.pdb"),
+                                             args.atoms // args.files, args.chains, seed=index)
+                         for index in range(args.files)]
+            results = bench_cache(pdb_files, os.path.join(directory, "cache"))
+            print(f"analysis_record on {args.files} files of {args.atoms // args.files} atoms:")
+            for name in ["no cache", "cold cache", "warm cache"]:
+                print(f"{name:<12} {results[name]:8.3f} s")
+            print("hits/misses: %d/%d" % results["hits/misses"])
+            return
+
+        if args.benchmark == "suite":
+            pdb_file = write_synthetic_pdb(os.path.join(directory, "synthetic.pdb"), args.atoms, args.chains,
+                                           models=args.models, hetatm_fraction=args.hetatm_fraction)
+            results = bench_suite(pdb_file, args.repeat, args.max_exhaustive)
+            for name, seconds in results.items():
+                print(f"{name:<60} {seconds:9.4f} s")
+            entry = {"label": args.label, "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+                     "parser_version": parser_version, "python": platform.python_version(),
+                     "parameters": {"atoms": args.atoms, "chains": args.chains, "models": args.models,
+                                    "hetatm_fraction": args.hetatm_fraction, "repeat": args.repeat},
+                     "results": results}
+            history = record_history(args.history, entry)
+            print(f"Entry {len(history)} written to {args.history}")
+            return
+
+        pdb_file = write_synthetic_pdb(os.path.join(directory, "synthetic.pdb"), args.atoms, args.chains)
+
+        if args.benchmark == "extractor":
+            atom_lines = pdb_file_reader(pdb_file)
+            print(f"Column extraction on {len(atom_lines)} atoms:")
+            results = bench_extractor(atom_lines)
+            baseline = results["eval per line"]
+            for name, lines_per_second in results.items():
+                print(f"{name:<22} {lines_per_second:>14,.0f} lines/sec  {lines_per_second / baseline:6.1f}x")
+
+        elif args.benchmark == "memory":
+            print(f"Memory per atom on {args.atoms} atoms:")
+            for name, bytes_per_atom in bench_memory(pdb_file).items():
+                print(f"{name:<24} {bytes_per_atom:>8.1f} bytes/atom")
+
+        elif args.benchmark == "binary":
+            results = bench_binary(pdb_file, os.path.join(directory, "synthetic.pdbcol"))
+            print(f"Structure of {args.atoms} atoms, text {results['text bytes']:,} bytes, "
+                  f"binary {results['binary bytes']:,} bytes:")
+            for name in ["text parse", "binary save", "binary load"]:
+                print(f"{name:<12} {results[name]:8.3f} s")
+            print(f"load speedup {results['text parse'] / results['binary load']:.1f}x")
+
+        elif args.benchmark == "rg":
+            atom_lines = pdb_file_reader(pdb_file)
+            print(f"radius_of_gyration_calculator on {len(atom_lines)} atoms:")
+            for name, (seconds, value) in bench_rg(atom_lines).items():
+                value = ", ".join(f"{chain}: {rg:.4f}" for chain, rg in value.items()) if isinstance(value, dict) \
+                    else f"{value:.4f}"
+                print(f"{name:<20} {seconds:8.3f} s  Rg {value}")
+
+        elif args.benchmark == "compressed":
+            print(f"Structure.from_file on {args.atoms} atoms:")
+            for name, (seconds, size) in bench_compressed(pdb_file).items():
+                print(f"{name:<16} {seconds:7.2f} s  {args.atoms / seconds:>12,.0f} atoms/sec  {size:>13,} bytes")
+
+        elif args.benchmark == "profile":
+            results = bench_profile(pdb_file, args.repeat)
+            print(f"print_function on {args.atoms} atoms:")
+            for name, seconds in results.items():
+                print(f"profiling {name:<18} {seconds:8.3f} s  overhead {seconds / results['off'] - 1:7.1%}")
+
+        elif args.benchmark == "lazy":
+            atom_lines = pdb_file_reader(pdb_file)
+            print(f"Table building and calculator on {len(atom_lines)} atoms, all columns vs used columns:")
+            for name, (full_seconds, lazy_seconds, decoded) in bench_lazy(atom_lines).items():
+                print(f"{name:<28} full {full_seconds:7.3f} s  lazy {lazy_seconds:7.3f} s  "
+                      f"{full_seconds / lazy_seconds:5.1f}x  decoded: {', '.join(decoded)}")
+
+        elif args.benchmark == "select":
+            atom_lines = pdb_file_reader(pdb_file)
+            print(f"Selections on {len(atom_lines)} atoms, Python filtering vs compiled masks:")
+            for query, (python_seconds, first_seconds, cached_seconds, n) in bench_select(atom_lines).items():
+                print(f"{query:<32} python {python_seconds:7.3f} s  mask {first_seconds:7.3f} s  "
+                      f"cached {cached_seconds:7.4f} s  {python_seconds / first_seconds:5.1f}x  {n:>9,} atoms")
+
+        elif args.benchmark == "mmap":
+            print(f"atomic_composition_calculator on {args.atoms} atoms ({os.path.getsize(pdb_file):,} bytes):")
+            for name, (peak, seconds) in bench_mmap(pdb_file).items():
+                print(f"{name:<16} peak {peak / 2 ** 20:8.1f} MiB  {seconds:7.2f} s")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,433 @@
+import math
+import itertools
+from array import array
+from bisect import bisect_left, bisect_right
+from operator import add, sub, mul, truediv, le
+
+from pdb_parser import AtomTable, _as_atom_table, _structure_cached
+
+"""
+Backbone dihedrals and DSSP-like secondary structure
+
+The N, CA, C and O atoms of every chain are gathered once into flat coordinate arrays (one row per residue),
+and the dihedrals are computed over whole chains at a time, one pass over the x, y and z columns per operation
+(operator functions mapped over the columns run in C). Residues missing N, CA or
+C are left out, a residue whose N is not within peptide_bond_cutoff of the C before it starts a new segment (a
+gap), and of atoms with alternate locations the first location of the residue is kept.
+
+The secondary structure follows DSSP (Kabsch & Sander, 1983): backbone hydrogen bonds from the electrostatic
+energy of the C=O and N-H groups, helices from consecutive n-turns and strands from ladders of bridges. Unlike DSSP,
+ladders are not joined over beta bulges and bends (S) are not assigned.
+"""
+
+# largest C-N distance (Å) of two residues joined by a peptide bond
+peptide_bond_cutoff = 2.0
+# DSSP hydrogen bond energy, E = f * (1/rON + 1/rCH - 1/rOH - 1/rCN) kcal/mol with f = 0.42 * 0.20 * 332
+hbond_factor = 27.888
+hbond_energy_cutoff = -0.5
+# with the bond lengths of a peptide, an O-N distance above this can not reach hbond_energy_cutoff
+hbond_distance_cutoff = 5.4
+
+
+def _axes(flat):
+    # x, y and z columns of a flat coordinate array
+    return flat[0::3], flat[1::3], flat[2::3]
+
+
+def _interleave(x, y, z):
+    # flat coordinate array (x0, y0, z0, x1, ...) of three columns
+    x, y, z = array("d", x), array("d", y), array("d", z)
+    flat = array("d", bytes(24 * len(x)))
+    flat[0::3], flat[1::3], flat[2::3] = x, y, z
+    return flat
+
+
+def _difference(u, v):
+    return [list(map(sub, a, b)) for a, b in zip(u, v)]
+
+
+def _cross(u, v):
+    ux, uy, uz = u
+    vx, vy, vz = v
+    return [list(map(sub, map(mul, uy, vz), map(mul, uz, vy))), list(map(sub, map(mul, uz, vx), map(mul, ux, vz))),
+            list(map(sub, map(mul, ux, vy), map(mul, uy, vx)))]
+
+
+def _dot(u, v):
+    return list(map(add, map(add, map(mul, u[0], v[0]), map(mul, u[1], v[1])), map(mul, u[2], v[2])))
+
+
+class Backbone:
+    # N, CA, C and O coordinates of the residues of one chain, in file order
+    # every coordinate column is a flat array (x0, y0, z0, x1, ...) with one point per residue, a missing O is
+    # stored as NaN; bonded[i] is 1 when residue i is joined to residue i - 1 by a peptide bond
+
+    def __init__(self, chain, residues, names, n, ca, c, o):
+        """
+            Parameters
+            ----------
+            chain : str
+                chain identifier
+
+            residues : list
+                (residue sequence number, insertion code) of every residue
+
+            names : list
+                residue name of every residue
+
+            n, ca, c, o : array
+                flat coordinate arrays of the atoms, one point per residue
+        """
+        self.chain = chain
+        self.residues = residues
+        self.names = names
+        self.n = n
+        self.ca = ca
+        self.c = c
+        self.o = o
+        # the C-N distance of every residue to the one before it, in one pass over the columns
+        gaps = _difference([axis[1:] for axis in _axes(n)], [axis[:-1] for axis in _axes(c)])
+        self.bonded = bytearray(min(len(residues), 1)) + bytearray(map(le, _dot(gaps, gaps),
+                                                                       itertools.repeat(peptide_bond_cutoff ** 2)))
+
+    def __len__(self):
+        return len(self.residues)
+
+
+def _gather(axes, indices):
+    # flat coordinates of the atoms at indices from the x, y and z columns, the index -1 is their last value
+    return _interleave(*(map(axis.__getitem__, indices) for axis in axes))
+
+
+@_structure_cached
+def backbone_chains(atom_lines):
+    """
+        Function to gather the backbone atoms of every chain
+
+        Parameters
+        ----------
+        atom_lines : list
+            list of atomic lines, an AtomTable or a Structure (its ATOM records)
+
+        Return
+        ----------
+        chains : dictionary
+            key: chain identifier
+            value: Backbone of the residues having N, CA and C
+
+    """
+    table = _as_atom_table(atom_lines)
+    if table is None:
+        table = AtomTable.from_lines(atom_lines)
+    # slot of every atom: 0 N, 1 CA, 2 C, 3 O, 4 any other atom, and 1 for atoms with an alternate location
+    slot_of = [("N", "CA", "C", "O", name.strip()).index(name.strip()) for name in table.name.categories]
+    slots = bytes(map(slot_of.__getitem__, table.name.codes))
+    altlocs = [altloc.strip() for altloc in table.altloc.categories]
+    alternate = bytes(map([bool(altloc) for altloc in altlocs].__getitem__, table.altloc.codes))
+    index = table.residues()
+
+    # key: chain, value: (residues, names, N, CA, C and O atom indices)
+    chains = {}
+    for (chain, number, insertion_code), residue_name, runs in index.runs():
+        if len(runs) == 1 and alternate.find(1, runs[0].start, runs[0].stop) < 0:
+            atoms = [slots.find(slot, runs[0].start, runs[0].stop) for slot in range(4)]
+        else:
+            # the runs of a residue split by other atoms are one residue,
+            # the first alternate location met in the residue is the one kept
+            atoms = [-1] * 4
+            location = ""
+            for i in itertools.chain.from_iterable(runs):
+                slot = slots[i]
+                if slot == 4 or atoms[slot] >= 0:
+                    continue
+                altloc = altlocs[table.altloc.codes[i]]
+                if altloc:
+                    location = location or altloc
+                    if altloc != location:
+                        continue
+                atoms[slot] = i
+        if min(atoms[:3]) < 0:
+            continue
+        columns = chains.get(chain)
+        if columns is None:
+            columns = chains[chain] = ([], [], [], [], [], [])
+        columns[0].append((number, insertion_code))
+        columns[1].append(residue_name)
+        for column, atom in zip(columns[2:], atoms):
+            column.append(atom)
+    # the coordinate columns end with NaN, which missing O atoms (index -1) pick up
+    axes = [axis + array("d", [math.nan]) for axis in _axes(table.coordinates)]
+    return {chain: Backbone(chain, residues, names, *(_gather(axes, atoms) for atoms in columns))
+            for chain, (residues, names, *columns) in chains.items()}
+
+
+def _torsions(bonds):
+    # dihedral angles in degrees of consecutive bond vectors, angle k is made of bonds k, k + 1 and k + 2
+    normals = _cross([axis[:-1] for axis in bonds], [axis[1:] for axis in bonds])
+    n1 = [axis[:-1] for axis in normals]
+    n2 = [axis[1:] for axis in normals]
+    b2 = [axis[1:-1] for axis in bonds]
+    # the angle has the cosine n1 . n2 and the sine (n1 x n2) . b2 / |b2|
+    lengths = [length or math.nan for length in map(math.sqrt, _dot(b2, b2))]
+    sines = map(truediv, _dot(_cross(n1, n2), b2), lengths)
+    return array("d", map(mul, map(math.atan2, sines, _dot(n1, n2)), itertools.repeat(180.0 / math.pi)))
+
+
+def dihedrals(a, b, c, d):
+    """
+        Function to compute the dihedral angles of rows of four points
+
+        Parameters
+        ----------
+        a, b, c, d : array
+            flat coordinate arrays (x0, y0, z0, x1, ...) of the same length, row i gives the points of angle i
+
+        Return
+        ----------
+        angles : array
+            dihedral angles in degrees between -180 and 180, NaN where a point is NaN
+
+    """
+    # the points of every row as a path a b c d, so the angles are every third torsion of the path
+    path = [[0.0] * (4 * (len(a) // 3)) for _ in range(3)]
+    for offset, points in enumerate((a, b, c, d)):
+        for axis, values in zip(path, _axes(points)):
+            axis[offset::4] = values
+    return _torsions(_difference([axis[1:] for axis in path], [axis[:-1] for axis in path]))[0::4]
+
+
+def _chain_dihedrals(backbone):
+    # (phi, psi, omega) arrays of a chain, NaN where the neighbor residue is missing or not bonded
+    # omega(i) is the CA(i), C(i), N(i + 1), CA(i + 1) angle of the peptide bond after residue i
+    # the angles are the torsions of the N, CA, C, N, ... path: psi(i) from N(i), omega(i) from CA(i) and phi(i + 1)
+    # from C(i)
+    n = len(backbone)
+    nan = math.nan
+    path = [[0.0] * (3 * n) for _ in range(3)]
+    for offset, points in enumerate((backbone.n, backbone.ca, backbone.c)):
+        for axis, values in zip(path, _axes(points)):
+            axis[offset::3] = values
+    torsions = _torsions(_difference([axis[1:] for axis in path], [axis[:-1] for axis in path]))
+    phi = array("d", [nan]) + torsions[2::3]
+    psi = torsions[0::3] + array("d", [nan])
+    omega = torsions[1::3] + array("d", [nan])
+    for i in itertools.compress(range(1, n), (not bonded for bonded in backbone.bonded[1:])):
+        phi[i] = psi[i - 1] = omega[i - 1] = nan
+    return phi, psi, omega
+
+
+@_structure_cached
+def backbone_dihedrals(atom_lines):
+    """
+        Function to compute the phi, psi and omega angles of every residue
+
+        Parameters
+        ----------
+        atom_lines : list
+            list of atomic lines, an AtomTable or a Structure
+
+        Return
+        ----------
+        dihedrals : dictionary
+            key: chain identifier
+            value: list of (residue sequence number, insertion code, residue name, phi, psi, omega) in degrees,
+            None at the chain ends and gaps; omega is the peptide bond after the residue
+
+    """
+    result = {}
+    for chain, backbone in backbone_chains(atom_lines).items():
+        angles = zip(*_chain_dihedrals(backbone))
+        result[chain] = [(number, insertion_code, name) + tuple(None if angle != angle else angle
+                                                                 for angle in residue_angles)
+                         for (number, insertion_code), name, residue_angles in
+                         zip(backbone.residues, backbone.names, angles)]
+    return result
+
+
+def hydrogen_bonds(backbones):
+    """
+        Function to find the backbone hydrogen bonds of chains
+
+        Parameters
+        ----------
+        backbones : list
+            list of Backbone, residues are numbered over all of them in order
+
+        Return
+        ----------
+        hbonds : dictionary
+            key: (acceptor, donor) residue numbers, the C=O of the acceptor bonded to the N-H of the donor
+            value: energy in kcal/mol, below hbond_energy_cutoff
+
+    """
+    N, C, O = array("d"), array("d"), array("d")
+    names, bonded = [], bytearray()
+    for backbone in backbones:
+        N.extend(backbone.n)
+        C.extend(backbone.c)
+        O.extend(backbone.o)
+        names += backbone.names
+        bonded += backbone.bonded
+    N, C, O = _axes(N), _axes(C), _axes(O)
+    n = len(names)
+    nan = math.nan
+
+    # amide hydrogens, 1 Å from N opposite the C=O of the residue before as in DSSP; the first residue of a
+    # segment and prolines have none
+    carbonyl = _difference([axis[:-1] for axis in C], [axis[:-1] for axis in O])
+    lengths = [length or nan for length in map(math.sqrt, _dot(carbonyl, carbonyl))]
+    H = [[nan] + list(map(add, axis[1:], map(truediv, direction, lengths))) for axis, direction in zip(N, carbonyl)]
+    donors = [i for i in itertools.compress(range(n), bonded) if names[i] != "PRO" and H[0][i] == H[0][i]]
+    acceptors = [i for i, x in enumerate(O[0]) if x == x]
+
+    # donors binned in columns along z as wide as the cutoff and sorted by z, every acceptor looks at the
+    # z window of the 9 columns around it
+    inverse = 1.0 / hbond_distance_cutoff
+    floor = math.floor
+    sqrt = math.sqrt
+    Nx, Ny, Nz = N
+    Hx, Hy, Hz = H
+    columns = {}
+    for donor in sorted(donors, key=Nz.__getitem__):
+        x, y = Nx[donor], Ny[donor]
+        column = columns.get((floor(x * inverse), floor(y * inverse)))
+        if column is None:
+            column = columns[floor(x * inverse), floor(y * inverse)] = ([], [])
+        column[0].append(Nz[donor])
+        column[1].append((donor, x, y, Nz[donor], Hx[donor], Hy[donor], Hz[donor]))
+    offsets = list(itertools.product((-1, 0, 1), repeat=2))
+    cutoff = hbond_distance_cutoff
+    cutoff2 = cutoff * cutoff
+
+    hbonds = {}
+    Ox, Oy, Oz = O
+    Cx, Cy, Cz = C
+    for acceptor in acceptors:
+        ox, oy, oz = Ox[acceptor], Oy[acceptor], Oz[acceptor]
+        cx, cy, cz = Cx[acceptor], Cy[acceptor], Cz[acceptor]
+        i, j = floor(ox * inverse), floor(oy * inverse)
+        for di, dj in offsets:
+            column = columns.get((i + di, j + dj))
+            if column is None:
+                continue
+            heights, members = column
+            for donor, x, y, z, hx, hy, hz in members[bisect_left(heights, oz - cutoff):
+                                                      bisect_right(heights, oz + cutoff)]:
+                dx = x - ox
+                dy = y - oy
+                if dx * dx + dy * dy > cutoff2:
+                    continue
+                r_on = dx * dx + dy * dy + (z - oz) * (z - oz)
+                if r_on > cutoff2 or donor - acceptor in (0, 1):
+                    continue
+                r_ch = sqrt((cx - hx) ** 2 + (cy - hy) ** 2 + (cz - hz) ** 2)
+                r_oh = sqrt((ox - hx) ** 2 + (oy - hy) ** 2 + (oz - hz) ** 2)
+                r_cn = sqrt((cx - x) ** 2 + (cy - y) ** 2 + (cz - z) ** 2)
+                if not (r_on and r_ch and r_oh and r_cn):
+                    continue
+                energy = hbond_factor * (1 / sqrt(r_on) + 1 / r_ch - 1 / r_oh - 1 / r_cn)
+                if energy < hbond_energy_cutoff:
+                    hbonds[acceptor, donor] = max(energy, -9.9)
+    return hbonds
+
+
+def _assign(segments, hbonds):
+    # DSSP codes of residues numbered 0 .. len(segments) - 1, segments[i] is the segment of residue i (residues
+    # of one segment are consecutive and bonded)
+    n = len(segments)
+    codes = ["-"] * n
+
+    def hbond(acceptor, donor):
+        return (acceptor, donor) in hbonds
+
+    def linked(i, j):
+        # residues i <= j are in the same segment
+        return 0 <= i and j < n and segments[i] == segments[j]
+
+    # n-turns at i: hbond(i, i + n) within a segment
+    turns = {span: bytearray(n) for span in (3, 4, 5)}
+    for acceptor, donor in hbonds:
+        span = donor - acceptor
+        if span in turns and linked(acceptor, donor):
+            turns[span][acceptor] = 1
+
+    # bridges: candidate (i, j) pairs come from the hydrogen bonds of their patterns
+    candidates = set()
+    for a, b in hbonds:
+        for i, j in ((a + 1, b), (b - 1, a), (b, a + 1), (a, b - 1), (a, b), (a + 1, b - 1), (b - 1, a + 1)):
+            if abs(i - j) > 2:
+                candidates.add((min(i, j), max(i, j)))
+    bridges = {}
+    for i, j in candidates:
+        if not (linked(i - 1, i + 1) and linked(j - 1, j + 1)):
+            continue
+        if (hbond(i - 1, j) and hbond(j, i + 1)) or (hbond(j - 1, i) and hbond(i, j + 1)):
+            bridges[i, j] = "parallel"
+        elif (hbond(i, j) and hbond(j, i)) or (hbond(i - 1, j + 1) and hbond(j - 1, i + 1)):
+            bridges[i, j] = "antiparallel"
+
+    # ladders: bridges of the same kind between consecutive residues, residues of a ladder are E and the
+    # residues of isolated bridges B
+    ladder = set()
+    for (i, j), kind in bridges.items():
+        step = 1 if kind == "parallel" else -1
+        if bridges.get((i + 1, j + step)) == kind or bridges.get((i - 1, j - step)) == kind:
+            ladder.update((i, j))
+    for i, j in bridges:
+        for residue in (i, j):
+            codes[residue] = "E" if residue in ladder else "B"
+
+    # helices from two consecutive n-turns, H before the bridges, G and I only on unassigned residues
+    for span, code in ((4, "H"), (3, "G"), (5, "I")):
+        turn = turns[span]
+        for i in itertools.compress(range(1, n), turn[1:]):
+            if turn[i - 1]:
+                residues = range(i, i + span)
+                if code == "H" or all(codes[residue] == "-" for residue in residues):
+                    for residue in residues:
+                        codes[residue] = code
+    # turns on what is left
+    for span, turn in turns.items():
+        for i in itertools.compress(range(n), turn):
+            for residue in range(i + 1, i + span):
+                if codes[residue] == "-":
+                    codes[residue] = "T"
+    return codes
+
+
+@_structure_cached
+def secondary_structure(atom_lines):
+    """
+        Function to assign the secondary structure of every residue, DSSP-like
+
+        Parameters
+        ----------
+        atom_lines : list
+            list of atomic lines, an AtomTable or a Structure
+
+        Return
+        ----------
+        secondary_structure : dictionary
+            key: chain identifier
+            value: (list of (residue sequence number, insertion code), string of one code per residue)
+            codes: H alpha helix, B isolated bridge, E strand, G 3-10 helix, I pi helix, T turn, - none
+
+    """
+    chains = backbone_chains(atom_lines)
+    backbones = list(chains.values())
+    segments = array("i")
+    segment = -1
+    for backbone in backbones:
+        for i, bonded in enumerate(backbone.bonded):
+            if not bonded:
+                segment += 1
+            segments.append(segment)
+    codes = _assign(segments, hydrogen_bonds(backbones))
+
+    result = {}
+    start = 0
+    for chain, backbone in chains.items():
+        result[chain] = (list(backbone.residues), "".join(codes[start:start + len(backbone)]))
+        start += len(backbone)
+    return result
+
@@ -0,0 +1,365 @@
+import io
+import os
+import sys
+import csv
+import glob
+import fnmatch
+import json
+import time
+import argparse
+import functools
+import multiprocessing
+
+from pdb_parser import Structure, AnalysisResult, analysis_record, binding_site_finder, result_columns
+from pdb_cache import ResultCache
+
+"""
+Batch analysis of many PDB files over a process pool
+
+Usage: python pdb_batch.py <directory|glob|manifest> [...] -o results.jsonl [--workers N] [--chunksize K]
+                           [--binding-sites [CUTOFF]]
+"""
+
+# columns of the CSV output, nested values are stored as JSON text
+csv_columns = ["file", "error"] + [name for name, _ in AnalysisResult.fields]
+# extra columns of the columnar output, in front of the metrics
+columnar_keys = ("file", "error", "cache")
+
+# columns of the CSV output of binding sites, one row per ligand
+binding_site_columns = ["file", "error", "ligands", "ligand", "chain", "residue_number", "insertion_code", "atoms",
+                        "residues", "min_distance"]
+
+# file name patterns collected from a directory, plain or compressed
+pdb_extensions = [".pdb", ".ent"]
+pdb_patterns = ["*" + extension + compression for extension in pdb_extensions
+                for compression in ["", ".gz", ".bz2", ".xz"]]
+
+
+def collect_pdb_files(sources):
+    """
+        Function to expand directories, glob patterns and manifests into a list of PDB files
+
+        Parameters
+        ----------
+        sources : list
+            directories (their *.pdb and *.ent files, also gzip, bz2 or xz compressed), glob patterns or manifest files
+            (one path per line, blank lines and lines starting with # are skipped)
+
+        Return
+        ----------
+        pdb_files : list
+            list of paths, in order and without duplicates
+
+    """
+    pdb_files = []
+    for source in sources:
+        if os.path.isdir(source):
+            # the extensions are matched in any case (etc: 1ABC.PDB, 1abc.ent.GZ), like the explicit paths
+            found = [os.path.join(source, name) for name in os.listdir(source) if not name.startswith(".")
+                     and any(fnmatch.fnmatch(name.lower(), pattern) for pattern in pdb_patterns)]
+            pdb_files += sorted(found)
+        elif glob.has_magic(source):
+            pdb_files += sorted(glob.glob(source, recursive=True))
+        elif any(fnmatch.fnmatch(os.path.basename(source).lower(), pattern) for pattern in pdb_patterns):
+            pdb_files.append(source)
+        else:
+            # manifest, relative paths are relative to the manifest itself
+            base = os.path.dirname(source)
+            with open(source, "r") as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith("#"):
+                        pdb_files.append(os.path.join(base, line))
+    return list(dict.fromkeys(pdb_files))
+
+
+# one ResultCache per cache directory in every worker process
+_caches = {}
+
+
+def analyze_file(pdb_file, cache_directory=None, cache_max_bytes=1 << 30, binding_site_cutoff=None):
+    # analysis record of a single file, a failing file becomes an error record instead of stopping the batch
+    # with a cache directory unchanged files are answered from the cache and the record tells "hit" or "miss"
+    # with a binding site cutoff the record holds the atom count and the binding_sites of every ligand instead
+    try:
+        if cache_directory is None:
+            if binding_site_cutoff is None:
+                return {"file": pdb_file, **analysis_record(pdb_file)}
+            structure = Structure.from_file(pdb_file)
+            return {"file": pdb_file, "atoms": len(structure),
+                    "binding_sites": binding_site_finder(structure, cutoff=binding_site_cutoff)}
+        cache = _caches.get(cache_directory)
+        if cache is None:
+            cache = _caches[cache_directory] = ResultCache(cache_directory, cache_max_bytes)
+        hits = cache.hits
+        structure, record = cache.analyze(pdb_file)
+        if binding_site_cutoff is not None:
+            record = {"atoms": record["atoms"],
+                      "binding_sites": binding_site_finder(structure, cutoff=binding_site_cutoff)}
+        return {"file": pdb_file, **record, "cache": "hit" if cache.hits > hits else "miss"}
+    except Exception as error:
+        return {"file": pdb_file, "error": f"{type(error).__name__}: {error}"}
+
+
+def binding_site_records(record):
+    # split the record of a file into one record per ligand, a file without ligands keeps a single record
+    # with ligand None so a resumed batch knows it is done
+    # every record tells the number of ligands of its file, so a resumed batch sees whether all of them were written
+    if "error" in record:
+        return [record]
+    sites = record["binding_sites"]
+    if not sites:
+        return [{"file": record["file"], "ligands": 0, "ligand": None}]
+    return [{"file": record["file"], "ligands": len(sites), **site} for site in sites]
+
+
+def drop_partial_record(output):
+    # cut a record left unfinished by an interruption off the end of the output, so the output ends with a newline
+    # and the next record starts on a line of its own
+    if not os.path.exists(output):
+        return
+    with open(output, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - (1 << 16))
+            f.seek(start)
+            newline = f.read(position - start).rfind(b"\n")
+            if newline >= 0:
+                position = start + newline + 1
+                break
+            position = start
+        if position < end:
+            f.truncate(position)
+
+
+def drop_partial_binding_sites(output, output_format="jsonl"):
+    # the records of the ligands of a file are written at once, but an interruption within that write can leave
+    # the first of them behind: the records of the last file are cut off the output unless all of its ligands are
+    # there, so the resumed batch analyzes the file again instead of skipping it
+    if not os.path.exists(output):
+        return
+    with open(output, "rb+") as f:
+        position = 0
+        header = None
+        if output_format == "csv":
+            line = f.readline()
+            header = next(csv.reader([line.decode("utf-8")]), None)
+            position = len(line)
+        last_file, start, rows, ligands = None, position, 0, None
+        for line in f:
+            if header is None:
+                record = json.loads(line)
+            else:
+                record = dict(zip(header, next(csv.reader([line.decode("utf-8")]))))
+            if record["file"] != last_file:
+                last_file, start, rows = record["file"], position, 0
+            rows += 1
+            ligands = record.get("ligands")
+            position += len(line)
+        if ligands not in (None, "") and rows < max(int(ligands), 1):
+            f.truncate(start)
+
+
+def completed_files(output, output_format="jsonl"):
+    # files that already have a record in the output, so an interrupted batch can be resumed
+    if not os.path.exists(output):
+        return set()
+    done = set()
+    with open(output, "r", newline="") as f:
+        if output_format == "csv":
+            for row in csv.DictReader(f):
+                done.add(row["file"])
+        elif output_format == "columnar":
+            for line in f:
+                try:
+                    done.update(json.loads(line)["columns"]["file"])
+                except (ValueError, KeyError):
+                    # a batch cut off by an interruption is analyzed again
+                    continue
+        else:
+            for line in f:
+                try:
+                    done.add(json.loads(line)["file"])
+                except (ValueError, KeyError):
+                    # a record cut off by an interruption is analyzed again
+                    continue
+    return done
+
+
+class RecordWriter:
+    # Writes one record per structure as soon as it is ready, in JSON lines or CSV format
+    # the columnar format holds batch_size records and writes them as one record batch (see
+    # pdb_parser.result_columns), so at most one batch is in memory
+
+    def __init__(self, output, output_format="jsonl", columns=None, batch_size=256):
+        self.output_format = output_format
+        self.batch_size = batch_size
+        self._batch = []
+        drop_partial_record(output)
+        new_file = not os.path.exists(output) or os.path.getsize(output) == 0
+        self._file = open(output, "a", newline="")
+        if output_format == "csv":
+            self._writer = csv.DictWriter(self._file, columns or csv_columns, extrasaction="ignore")
+            if new_file:
+                self._writer.writeheader()
+
+    def write(self, record):
+        self.write_many([record])
+
+    def write_many(self, records):
+        # write records that belong together, etc: the ligands of a file, with a single write and flush
+        if self.output_format == "columnar":
+            self._batch.extend(records)
+            if len(self._batch) >= self.batch_size:
+                self.flush()
+            return
+        if self.output_format == "csv":
+            text = io.StringIO(newline="")
+            writer = csv.DictWriter(text, self._writer.fieldnames, extrasaction="ignore")
+            for record in records:
+                writer.writerow({key: json.dumps(value) if isinstance(value, (dict, list)) else value
+                                 for key, value in record.items()})
+            text = text.getvalue()
+        else:
+            text = "".join(json.dumps(record) + "\n" for record in records)
+        self._file.write(text)
+        self._file.flush()
+
+    def flush(self):
+        # write the held columnar records as one batch
+        if self._batch:
+            self._file.write(json.dumps(result_columns(self._batch, columnar_keys)) + "\n")
+            self._file.flush()
+            self._batch = []
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+
+def batch_analyze(sources, output, workers=None, chunksize=8, output_format="jsonl", progress=None,
+                  cache_directory=None, cache_max_bytes=1 << 30, binding_site_cutoff=None):
+    """
+        Function to analyze many PDB files over a process pool
+
+        Parameters
+        ----------
+        sources : list
+            directories, glob patterns or manifests, see collect_pdb_files
+
+        output : str
+            path of the result file, records are appended and files already in it are skipped
+
+        workers : int
+            number of worker processes, None for one per CPU, 1 runs in the current process
+
+        chunksize : int
+            number of files handed to a worker at once
+
+        output_format : str
+            "jsonl", "csv" or "columnar" (record batches, see pdb_parser.result_columns)
+
+        progress : callable
+            optional callback called with every record
+
+        cache_directory : str
+            optional ResultCache directory, unchanged files are then answered without parsing
+
+        cache_max_bytes : int
+            size limit of the cache directory
+
+        binding_site_cutoff : float
+            if given, one record per ligand with its binding site residues within this cutoff (Å) is written
+            instead of the analysis record of every file, see pdb_parser.binding_site_finder
+
+        Return
+        ----------
+        summary : dictionary
+            counts of analyzed, failed and skipped files, atoms and the throughput
+
+    """
+    if output_format == "columnar" and binding_site_cutoff is not None:
+        raise ValueError("binding sites are written as jsonl or csv")
+    pdb_files = collect_pdb_files(sources)
+    drop_partial_record(output)
+    if binding_site_cutoff is not None:
+        drop_partial_binding_sites(output, output_format)
+    done = completed_files(output, output_format)
+    pending = [pdb_file for pdb_file in pdb_files if pdb_file not in done]
+
+    summary = {"files": 0, "errors": 0, "skipped": len(pdb_files) - len(pending), "atoms": 0,
+               "cache_hits": 0, "cache_misses": 0}
+    analyze = functools.partial(analyze_file, cache_directory=cache_directory, cache_max_bytes=cache_max_bytes,
+                                binding_site_cutoff=binding_site_cutoff)
+    writer = RecordWriter(output, output_format, None if binding_site_cutoff is None else binding_site_columns)
+    start = time.perf_counter()
+    try:
+        if workers == 1 or len(pending) <= 1:
+            records = map(analyze, pending)
+            pool = None
+        else:
+            pool = multiprocessing.Pool(workers)
+            records = pool.imap_unordered(analyze, pending, chunksize)
+        try:
+            for record in records:
+                if binding_site_cutoff is None:
+                    writer.write(record)
+                else:
+                    writer.write_many(binding_site_records(record))
+                summary["files"] += 1
+                if "error" in record:
+                    summary["errors"] += 1
+                else:
+                    summary["atoms"] += record["atoms"]
+                if "cache" in record:
+                    summary["cache_hits" if record["cache"] == "hit" else "cache_misses"] += 1
+                if progress is not None:
+                    progress(record)
+        finally:
+            if pool is not None:
+                pool.terminate()
+    finally:
+        writer.close()
+
+    seconds = time.perf_counter() - start
+    summary["seconds"] = seconds
+    summary["files_per_second"] = summary["files"] / seconds if seconds else 0.0
+    summary["atoms_per_second"] = summary["atoms"] / seconds if seconds else 0.0
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze many PDB files and write one record per structure")
+    parser.add_argument("sources", nargs="+", help="directories, glob patterns or manifest files")
+    parser.add_argument("-o", "--output", required=True, help="result file, an existing one is resumed")
+    parser.add_argument("--format", dest="output_format", choices=["jsonl", "csv", "columnar"], default=None,
+                        help="output format, by default taken from the output file extension")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--chunksize", type=int, default=8, help="files handed to a worker at once")
+    parser.add_argument("--cache", dest="cache_directory", default=None,
+                        help="directory of a persistent result cache keyed by file content")
+    parser.add_argument("--cache-max-bytes", type=int, default=1 << 30, help="size limit of the result cache")
+    parser.add_argument("--binding-sites", dest="binding_site_cutoff", type=float, nargs="?", const=4.0,
+                        default=None, metavar="CUTOFF",
+                        help="write one record per ligand with the residues within CUTOFF Å (default 4.0)")
+    args = parser.parse_args(argv)
+    if args.output_format == "columnar" and args.binding_site_cutoff is not None:
+        parser.error("binding sites are written as jsonl or csv")
+
+    output_format = args.output_format or ("csv" if args.output.lower().endswith(".csv") else "jsonl")
+    summary = batch_analyze(args.sources, args.output, args.workers, args.chunksize, output_format,
+                            cache_directory=args.cache_directory, cache_max_bytes=args.cache_max_bytes,
+                            binding_site_cutoff=args.binding_site_cutoff)
+
+    print(f"Analyzed {summary['files']} files ({summary['errors']} failed, {summary['skipped']} already done) "
+          f"in {summary['seconds']:.2f} s", file=sys.stderr)
+    print(f"Throughput: {summary['files_per_second']:.1f} files/sec, {summary['atoms_per_second']:,.0f} atoms/sec",
+          file=sys.stderr)
+    if args.cache_directory is not None:
+        print(f"Cache: {summary['cache_hits']} hits, {summary['cache_misses']} misses", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+import sys
+import mmap
+import json
+import struct
+from array import array
+
+from pdb_parser import AtomTable, Categorical, Structure
+
+"""
+Compact binary format for parsed structures
+
+Layout, little-endian, every block aligned to 8 bytes:
+    header      32 bytes
+        char[8] magic, "PDBCOL" and two zero bytes
+        uint32  format version
+        uint32  reserved, 0 (aligns the counts to 8 bytes)
+        uint64  number of atoms, number of heteroatoms
+    per table   (atoms first, then heteroatoms)
+        char    array typecode of the codes of every categorical column ("B", "H" or "I")
+        int32   serial, residue_number
+        float64 coordinates (N,3) row-major, occupancy, b_factor
+        uint8/16/32 codes of every categorical column, in AtomTable.fields order, as narrow as the
+                number of categories allows
+        uint64 length + UTF-8 JSON of the interned string table of every categorical column
+"""
+
+magic = b"PDBCOL\x00\x00"
+format_version = 1
+# magic, format version, reserved, number of atoms, number of heteroatoms
+_header = struct.Struct("<8sIIQQ")
+_length = struct.Struct("<Q")
+
+# numeric columns: (attribute, typecode, values per atom)
+_numeric_columns = [("serial", "i", 1), ("residue_number", "i", 1), ("coordinates", "d", 3),
+                    ("occupancy", "d", 1), ("b_factor", "d", 1)]
+_categorical_columns = [attribute for attribute, kind in AtomTable.fields.values() if kind == "category"]
+
+
+def _padding(size):
+    return -size % 8
+
+
+def _to_little_endian(values):
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+
+def _write_block(f, data):
+    f.write(data)
+    f.write(b"\x00" * _padding(len(data)))
+
+
+def _code_typecode(categorical):
+    # narrowest unsigned typecode for the codes of a categorical column
+    if len(categorical.categories) <= 1 << 8:
+        return "B"
+    if len(categorical.categories) <= 1 << 16:
+        return "H"
+    return "I"
+
+
+def _write_table(f, table):
+    typecodes = [_code_typecode(getattr(table, attribute)) for attribute in _categorical_columns]
+    _write_block(f, "".join(typecodes).encode("ascii"))
+    for attribute, _, _ in _numeric_columns:
+        _write_block(f, _to_little_endian(getattr(table, attribute)).tobytes())
+    for attribute, typecode in zip(_categorical_columns, typecodes):
+        codes = array(typecode, getattr(table, attribute).codes)
+        _write_block(f, _to_little_endian(codes).tobytes())
+    strings = json.dumps({attribute: getattr(table, attribute).categories
+                          for attribute in _categorical_columns}).encode("utf-8")
+    f.write(_length.pack(len(strings)))
+    _write_block(f, strings)
+
+
+def save_structure(structure, path):
+    """
+        Function to save a parsed structure in the binary format
+
+        Parameters
+        ----------
+        structure : Structure or AtomTable
+            parsed structure, an AtomTable is saved as a structure without heteroatoms
+
+        path : str
+            path of the binary file
+
+    """
+    if isinstance(structure, AtomTable):
+        structure = Structure(structure)
+    with open(path, "wb") as f:
+        f.write(_header.pack(magic, format_version, 0, len(structure.atoms), len(structure.heteroatoms)))
+        _write_table(f, structure.atoms)
+        _write_table(f, structure.heteroatoms)
+
+
+def _read_array(view, offset, typecode, count):
+    values = array(typecode)
+    end = offset + values.itemsize * count
+    values.frombytes(view[offset:end])
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values, end + _padding(end - offset)
+
+
+def _read_table(view, offset, n_atoms):
+    table = AtomTable()
+    typecodes = str(view[offset:offset + len(_categorical_columns)], "ascii")
+    offset += len(_categorical_columns) + _padding(len(_categorical_columns))
+    for attribute, typecode, width in _numeric_columns:
+        values, offset = _read_array(view, offset, typecode, n_atoms * width)
+        setattr(table, attribute, values)
+    codes = {}
+    for attribute, typecode in zip(_categorical_columns, typecodes):
+        narrow, offset = _read_array(view, offset, typecode, n_atoms)
+        codes[attribute] = array("I", narrow)
+    (length,) = _length.unpack_from(view, offset)
+    offset += _length.size
+    strings = json.loads(str(view[offset:offset + length], "utf-8"))
+    offset += length + _padding(length)
+    for attribute in _categorical_columns:
+        categorical = Categorical()
+        categorical.codes = codes[attribute]
+        categorical.categories = strings[attribute]
+        categorical._index = {category: code for code, category in enumerate(categorical.categories)}
+        setattr(table, attribute, categorical)
+    table._bind()
+    return table, offset
+
+
+def load_structure(path):
+    """
+        Function to load a structure saved with save_structure through a single memory map
+
+        Parameters
+        ----------
+        path : str
+            path of the binary file
+
+        Return
+        ----------
+        structure : Structure
+            parsed structure, accepted by every calculator
+
+    """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        view = memoryview(mapped)
+        try:
+            file_magic, version, _reserved, n_atoms, n_heteroatoms = _header.unpack_from(view, 0)
+            if file_magic != magic:
+                raise ValueError(f"{path} is not a binary structure file")
+            if version != format_version:
+                raise ValueError(f"{path} has format version {version}, expected {format_version}")
+            atoms, offset = _read_table(view, _header.size, n_atoms)
+            heteroatoms, _ = _read_table(view, offset, n_heteroatoms)
+        finally:
+            view.release()
+    return Structure(atoms, heteroatoms)
@@ -0,0 +1,129 @@
+import os
+import pickle
+import hashlib
+import tempfile
+
+from pdb_parser import Structure, analysis_record, parser_version
+
+"""
+Persistent on-disk cache of parsed structures and their metrics
+
+Entries are keyed by the SHA-256 of the file content and parser_version, so an unchanged file is answered
+without parsing it again, and a new parser version never reads results of an old one.
+The entries are pickles, only point the cache at a directory you trust.
+"""
+
+
+def content_hash(pdb_file, chunk_size=1 << 20):
+    # SHA-256 hex digest of the file content, read in chunks
+    digest = hashlib.sha256()
+    with open(pdb_file, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    # Size bounded LRU cache on disk
+    # every entry is one file holding the parsed Structure (with its memoized metrics) and the analysis record,
+    # the modification time of an entry is its last use and the least recently used entries are evicted first
+
+    suffix = ".pkl"
+
+    def __init__(self, directory, max_bytes=1 << 30):
+        """
+            Parameters
+            ----------
+            directory : str
+                cache directory, created if missing
+
+            max_bytes : int
+                the oldest entries are evicted when the entries take more than this
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size = sum(entry.stat().st_size for entry in self._entries())
+
+    def _entries(self):
+        return [entry for entry in os.scandir(self.directory) if entry.name.endswith(self.suffix)]
+
+    def key(self, pdb_file):
+        return f"{content_hash(pdb_file)}-v{parser_version}"
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def get(self, key):
+        # (structure, record) of a key or None, a hit marks the entry as recently used
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+        os.utime(path)
+        self.hits += 1
+        return value
+
+    def put(self, key, structure, record):
+        # write the entry atomically, then evict least recently used entries over the size limit
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(descriptor, "wb") as f:
+            pickle.dump((structure, record), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, self._path(key))
+        self._size += os.path.getsize(self._path(key))
+        if self._size > self.max_bytes:
+            self._evict(keep=self._path(key))
+
+    def _evict(self, keep=None):
+        # other processes may share the directory, so the real sizes are read again before evicting
+        entries = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime)
+        self._size = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if self._size <= self.max_bytes:
+                break
+            if entry.path == keep:
+                continue
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+            except OSError:
+                continue
+            self._size -= size
+            self.evictions += 1
+
+    def analyze(self, pdb_file):
+        """
+            Function to get the analysis record of a file, parsing it only on a cache miss
+
+            Parameters
+            ----------
+            pdb_file : str
+                path to pdb file
+
+            Return
+            ----------
+            structure : Structure
+                parsed structure, its metrics attribute holds every memoized calculator result
+
+            record : dictionary
+                same as pdb_parser.analysis_record
+
+        """
+        key = self.key(pdb_file)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        structure = Structure.from_file(pdb_file)
+        record = analysis_record(structure)
+        self.put(key, structure, record)
+        return structure, record
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "bytes": self._size}
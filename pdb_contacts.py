@@ -0,0 +1,231 @@
+import os
+import sys
+import ast
+import math
+import mmap
+import struct
+from array import array
+
+from pdb_parser import _ca_groups
+from pdb_spatial import CellList
+
+"""
+CA distance matrices and residue contact maps
+
+The matrices are computed in square float32 tiles of at most tile_size x tile_size distances, only the tiles on
+and above the diagonal are computed and mirrored, so the memory in use is one tile plus the output. The output
+is either an array in memory or a .npy file filled through a memory map, which keeps even 20k residue chains
+(1.6 GB of distances) out of memory. Sparse contact maps only hold the pairs within the cutoff.
+"""
+
+_npy_magic = b"\x93NUMPY\x01\x00"
+# .npy type descriptions of the written arrays, in native byte order
+_npy_descr = {"f": ("<" if sys.byteorder == "little" else ">") + "f4", "B": "|u1"}
+
+
+def ca_coordinates(atom_lines):
+    """
+        Function to collect the CA atoms of every chain
+
+        Parameters
+        ----------
+        atom_lines : list
+            list of atomic lines, an AtomTable or a Structure
+
+        Return
+        ----------
+        chains : dictionary
+            key: chain identifier
+            value: (residue sequence numbers, list of (x, y, z) of the CA atoms) in file order
+
+    """
+    chains = {}
+    for chain, atoms in _ca_groups(atom_lines).items():
+        chains[chain] = ([atom["number"] for atom in atoms],
+                         [(float(atom["X"]), float(atom["Y"]), float(atom["Z"])) for atom in atoms])
+    return chains
+
+
+def distance_tiles(points, tile_size=1024):
+    """
+        Function to compute the distance matrix of points tile by tile
+
+        Parameters
+        ----------
+        points : list
+            list of (x, y, z)
+
+        tile_size : int
+            largest number of rows and columns of a tile
+
+        Return
+        ----------
+        tiles : generator
+            generator of (row start, column start, rows, columns, float32 array of rows x columns distances)
+            for the tiles on and above the diagonal, the others are their transposes
+
+    """
+    n = len(points)
+    dist = math.dist
+    for row_start in range(0, n, tile_size):
+        rows = points[row_start:row_start + tile_size]
+        for column_start in range(row_start, n, tile_size):
+            columns = points[column_start:column_start + tile_size]
+            tile = array("f")
+            for point in rows:
+                tile.extend([dist(point, other) for other in columns])
+            yield row_start, column_start, len(rows), len(columns), tile
+
+
+def _fill(target, n, tiles, transform=None):
+    # write upper tiles and their transposes into a flat row-major n x n memoryview
+    for row_start, column_start, n_rows, n_columns, tile in tiles:
+        if transform is not None:
+            tile = transform(tile)
+        for r in range(n_rows):
+            start = (row_start + r) * n + column_start
+            target[start:start + n_columns] = tile[r * n_columns:(r + 1) * n_columns]
+        if column_start != row_start:
+            for c in range(n_columns):
+                start = (column_start + c) * n + row_start
+                target[start:start + n_rows] = tile[c::n_columns]
+
+
+def _npy_header(typecode, shape):
+    # version 1.0 .npy header, padded so the data starts at a multiple of 64 bytes
+    header = "{'descr': '%s', 'fortran_order': False, 'shape': %s, }" % (_npy_descr[typecode], repr(tuple(shape)))
+    padding = -(len(_npy_magic) + 2 + len(header) + 1) % 64
+    header = (header + " " * padding + "\n").encode("latin1")
+    return _npy_magic + struct.pack("<H", len(header)) + header
+
+
+def _matrix_output(typecode, n, output):
+    # (flat memoryview to fill, finish function) of an n x n matrix in memory or in a memory-mapped .npy file
+    if output is None:
+        matrix = array(typecode, bytes(array(typecode).itemsize * n * n))
+        return memoryview(matrix), lambda: matrix
+    header = _npy_header(typecode, (n, n))
+    size = array(typecode).itemsize * n * n
+    f = open(output, "w+b")
+    f.write(header)
+    f.truncate(len(header) + size)
+    if not size:
+        f.close()
+        return memoryview(array(typecode)), lambda: output
+    mapped = mmap.mmap(f.fileno(), 0)
+    view = memoryview(mapped)[len(header):].cast(typecode)
+
+    def finish():
+        view.release()
+        mapped.flush()
+        mapped.close()
+        f.close()
+        return output
+    return view, finish
+
+
+def read_npy(path):
+    """
+        Function to open a .npy file written by this module without loading it
+
+        Parameters
+        ----------
+        path : str
+            path to the .npy file
+
+        Return
+        ----------
+        shape : tuple
+            shape of the array
+
+        values : memoryview
+            flat row-major values, backed by a memory map (an empty view for an empty array)
+
+    """
+    with open(path, "rb") as f:
+        if f.read(len(_npy_magic)) != _npy_magic:
+            raise ValueError(f"{path} is not a version 1.0 .npy file")
+        header_length, = struct.unpack("<H", f.read(2))
+        header = ast.literal_eval(f.read(header_length).decode("latin1"))
+        typecode = {descr: typecode for typecode, descr in _npy_descr.items()}[header["descr"]]
+        offset = f.tell()
+        if os.path.getsize(path) == offset:
+            return header["shape"], memoryview(array(typecode))
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return header["shape"], memoryview(mapped)[offset:].cast(typecode)
+
+
+def distance_matrix(atom_lines, chain, tile_size=1024, output=None):
+    """
+        Function to compute the CA-CA distance matrix of a chain
+
+        Parameters
+        ----------
+        atom_lines : list
+            list of atomic lines, an AtomTable or a Structure
+
+        chain : str
+            chain identifier
+
+        tile_size : int
+            largest number of rows and columns computed at once
+
+        output : str
+            optional path of a .npy file (float32, shape (n, n)) the tiles are written to through a memory map
+
+        Return
+        ----------
+        numbers : list
+            residue sequence numbers of the rows and columns
+
+        matrix : array or str
+            flat row-major float32 array of n x n distances, or the output path
+
+    """
+    numbers, points = ca_coordinates(atom_lines)[chain]
+    target, finish = _matrix_output("f", len(points), output)
+    _fill(target, len(points), distance_tiles(points, tile_size))
+    return numbers, finish()
+
+
+def contact_map(atom_lines, chain, cutoff=8.0, sparse=False, tile_size=1024, output=None):
+    """
+        Function to compute the CA contact map of a chain
+
+        Parameters
+        ----------
+        atom_lines : list
+            list of atomic lines, an AtomTable or a Structure
+
+        chain : str
+            chain identifier
+
+        cutoff : float
+            two residues are in contact when their CA atoms are at most this far apart (Å)
+
+        sparse : bool
+            if True only the contacts are returned, found through a spatial index instead of every pair
+
+        tile_size : int
+            largest number of rows and columns computed at once (dense map)
+
+        output : str
+            optional path of a .npy file (uint8, shape (n, n)) the dense map is written to through a memory map
+
+        Return
+        ----------
+        numbers : list
+            residue sequence numbers of the rows and columns
+
+        contacts : bytearray, array, str or list
+            dense: flat row-major n x n array of 0 and 1 (the diagonal included), or the output path
+            sparse: list of (i, j, distance) with i < j in increasing order
+
+    """
+    numbers, points = ca_coordinates(atom_lines)[chain]
+    if sparse:
+        return numbers, sorted(CellList(points, cutoff).pairs_within(cutoff))
+    target, finish = _matrix_output("B", len(points), output)
+    _fill(target, len(points), distance_tiles(points, tile_size),
+          lambda tile: array("B", [distance <= cutoff for distance in tile]))
+    return numbers, finish()
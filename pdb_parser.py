@@ -1,16 +1,135 @@
+import re
 import sys
+import csv
+import json
+import bz2
+import gzip
+import lzma
 import math
+import mmap
+import copy
+import queue
+import functools
+import itertools
+import operator
+import threading
+import contextlib
+from array import array
 from tempfile import template
 
+from pdb_spatial import CellList
+from pdb_profile import Profiler, null_profiler
+
 """
 PDB Parser for Structural Bioinformatics
 """
 
+# version of the parsing and the metrics, stored with cached results and bumped whenever either changes
+# (4: single structure readers stop at the first ENDMDL instead of merging the models)
+parser_version = 4
+
 Kyte_Doolittle_scale = {'ALA': 1.8, 'ARG': -4.5, 'ASN': -3.5, 'ASP': -3.5, 'CYS': 2.5,
                         'GLN': -3.5, 'GLU': -3.5, 'GLY': -0.4, 'HIS': -3.2, 'ILE': 4.5,
                         'LEU': 3.8, 'LYS': -3.9, 'MET': 1.9, 'PHE': 2.8, 'PRO': -1.6,
                         'SER': -0.8, 'THR': -0.7, 'TRP': -0.9, 'TYR': -1.3, 'VAL': 4.2}
 
+# atomic masses by element symbol, used for the center of mass and the radius of gyration
+atomic_mass = {"H": 1.00794, "He": 4.00260, "Li": 6.94100, "Be": 9.01218, "B": 10.81100,
+               "C": 12.01070, "N": 14.00670, "O": 15.99940, "F": 18.99840, "Ne": 20.17970,
+               "Na": 22.98977, "Mg": 24.30500, "Al": 26.98154, "Si": 28.08550, "P": 30.97376,
+               "S": 32.06500, "Cl": 35.45300, "Ar": 39.94800, "K": 39.09830, "Ca": 40.07800,
+               "Sc": 44.95591, "Ti": 47.86700, "V": 50.94150, "Cr": 51.99610, "Mn": 54.93805,
+               "Fe": 55.84500, "Co": 58.93320, "Ni": 58.69340, "Cu": 63.54600, "Zn": 65.40900,
+               "Ga": 69.72300, "Ge": 72.64000, "As": 74.92160, "Se": 78.96000, "Br": 79.90400,
+               "Kr": 83.79800, "Rb": 85.46780, "Sr": 87.62000, "Y": 88.90585, "Zr": 91.22400,
+               "Nb": 92.90638, "Mo": 95.94000, "Tc": 98.00000, "Ru": 101.07000, "Rh": 102.90550,
+               "Pd": 106.42000, "Ag": 107.86820, "Cd": 112.41100, "In": 114.81800, "Sn": 118.71000,
+               "Sb": 121.76000, "Te": 127.60000, "I": 126.90447, "Xe": 131.29300, "Cs": 132.90545,
+               "Ba": 137.32700, "La": 138.90550, "Ce": 140.11600, "Pr": 140.90765, "Nd": 144.24000,
+               "Pm": 145.00000, "Sm": 150.36000, "Eu": 151.96400, "Gd": 157.25000, "Tb": 158.92534,
+               "Dy": 162.50000, "Ho": 164.93032, "Er": 167.25900, "Tm": 168.93421, "Yb": 173.04000,
+               "Lu": 174.96700, "Hf": 178.49000, "Ta": 180.94790, "W": 183.84000, "Re": 186.20700,
+               "Os": 190.23000, "Ir": 192.21700, "Pt": 195.07800, "Au": 196.96655, "Hg": 200.59000,
+               "Tl": 204.38330, "Pb": 207.20000, "Bi": 208.98038, "Po": 209.00000, "At": 210.00000,
+               "Rn": 222.00000, "Fr": 223.00000, "Ra": 226.00000, "Ac": 227.00000, "Th": 232.03810,
+               "Pa": 231.03588, "U": 238.02891, "Np": 237.00000, "Pu": 244.00000, "Am": 243.00000,
+               "Cm": 247.00000, "Bk": 247.00000, "Cf": 251.00000, "Es": 252.00000, "Fm": 257.00000,
+               "Md": 258.00000, "No": 259.00000, "Lr": 262.00000, "Rf": 261.00000, "Db": 262.00000,
+               "Sg": 266.00000, "Bh": 264.00000, "Hs": 277.00000, "Mt": 268.00000, "Ds": 281.00000,
+               "Rg": 272.00000, "Cn": 285.00000, "Uuq": 289.00000, "Uuh": 292.00000, "D": 2.01410}
+
+
+class ColumnExtractor:
+    # Precompiled column extractor for fixed-width PDB lines
+    # it is built once from a template generated by RaminCalc.get_template_pdb, every column is turned into
+    # an index/slice object with a strip flag and an optional type converter, so applying it to a line is
+    # only slicing and there is no per-line string building or eval()
+
+    # template values look like "[0:6].strip()", "[17:20]" or "[16].strip()"
+    _column_pattern = re.compile(r"^\[(\d+)(?::(\d+))?\](\.strip\(\))?$")
+
+    def __init__(self, template_get, converters=None):
+        """
+            Parameters
+            ----------
+            template_get : dictionary
+                template from RaminCalc.get_template_pdb
+                key: column name etc: Atom name
+                value: slice expression etc: [12:16].strip()
+
+            converters : dictionary
+                optional type conversion per column etc: {"Atom serial number": int}
+        """
+        converters = converters or {}
+        columns = []
+        spans = []
+        for key, value in template_get.items():
+            match = self._column_pattern.match(value)
+            if match is None:
+                raise ValueError(f"Unsupported column template for {key!r}: {value!r}")
+            start, stop, strip = match.groups()
+            position = int(start) if stop is None else slice(int(start), int(stop))
+            columns.append((position, strip is not None, converters.get(key)))
+            spans.append((int(start), int(start) + 1 if stop is None else int(stop), strip is not None,
+                          converters.get(key)))
+
+        self.keys = tuple(template_get.keys())
+        self._columns = tuple(columns)
+        # (start, stop, strip, converter) of every column, for readers working on raw buffers
+        self.spans = tuple(spans)
+
+    def values(self, pdb_line):
+        # extract the columns of a single line as a tuple in the order of the template
+        result = []
+        for position, strip, convert in self._columns:
+            value = pdb_line[position]
+            if strip:
+                value = value.strip()
+            if convert is not None:
+                value = convert(value)
+            result.append(value)
+        return tuple(result)
+
+    def __call__(self, pdb_line):
+        # extract the columns of a single line as a dictionary just like get_custom_data_pdb does
+        return dict(zip(self.keys, self.values(pdb_line)))
+
+    def extract(self, pdb_line, simple=False):
+        # same contract as RaminCalc.get_custom_data_pdb, with simple=True a single column is returned as a bare value
+        if simple and len(self.keys) == 1:
+            return self.values(pdb_line)[0]
+        return self(pdb_line)
+
+    def iter_values(self, pdb_lines):
+        # lazily extract tuples for many lines
+        values = self.values
+        for pdb_line in pdb_lines:
+            yield values(pdb_line)
+
+
+# compiled extractors for get_custom_data_pdb, keyed by the template items
+_compiled_templates = {}
+
 
 class RaminCalc:
     # Base self designed Class for implementing statics method for extracting relevant data from PDB lines
@@ -57,24 +176,27 @@ class RaminCalc:
     def get_custom_data_pdb(pdb_line, template_get, simple=False):
 
         # get custom template design in arguments and accordingly extract the data from the pdb_line
-        result_temp = "{"
-        for key, value in template_get.items():
-            result_temp += "'" + key + "'" + ":pdb_line" + str(value) + ",\n"
-        result_temp += "}"
-
-        # for one time evaluating , the result temp is string formated command for creating a dictionary
-        result_temp = eval(result_temp)
+        # the template is compiled only the first time it is seen, after that the cached extractor is reused
+        key = tuple(template_get.items())
+        extractor = _compiled_templates.get(key)
+        if extractor is None:
+            extractor = _compiled_templates[key] = RaminCalc.compile_template_pdb(template_get)
 
         # if simple argument TRUE given to the function , instead of returning the dictionary it will only return the data value extracted
         # if there are multiple items in template to get from pdb lines , it will not return single data
-        if simple == True and len(result_temp.items()) == 1:
-            return list(result_temp.values())[0]
-        return result_temp
+        return extractor.extract(pdb_line, simple)
+
+    @staticmethod
+    def compile_template_pdb(template_get, converters=None):
+
+        # compile a template from get_template_pdb once into a reusable ColumnExtractor
+        # converters optionally maps column names to a type etc: {"X orthogonal Å coordinate": float}
+        return ColumnExtractor(template_get, converters)
 
     @staticmethod
     def get_template_pdb(items):
 
-        # this is a function to generate a string template only for get_custom_data_pdb staticmethod for further eval() inside that function
+        # this is a function to generate a string template for get_custom_data_pdb and compile_template_pdb staticmethods
         # it gets a list of items and returns the dictionary converted to key,value format of the pdb line docs
         template_columns = {
             "Type": "[0:6].strip()",
@@ -101,6 +223,922 @@ class RaminCalc:
         return return_temp
 
 
+class Categorical:
+    # Text column stored as integer codes into a list of categories
+    # categories are numbered in order of first appearance, so iterating them keeps the file order
+
+    def __init__(self):
+        self.codes = array("I")
+        self.categories = []
+        self._index = {}
+
+    def append(self, value):
+        code = self._index.get(value)
+        if code is None:
+            code = self._index[value] = len(self.categories)
+            self.categories.append(value)
+        self.codes.append(code)
+
+    def code_of(self, value):
+        # code of a category or None if the value never occurs
+        return self._index.get(value)
+
+    def decode(self):
+        # list of the original values
+        categories = self.categories
+        return [categories[code] for code in self.codes]
+
+    def __getitem__(self, index):
+        return self.categories[self.codes[index]]
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def nbytes(self):
+        return self.codes.itemsize * len(self.codes) + sum(sys.getsizeof(c) for c in self.categories)
+
+
+def _to_int(value):
+    # blank numeric fields are stored as 0, serials and residue numbers past the decimal width of their columns in
+    # hybrid-36 (etc: A0000 is 100000) and anything else that is not a number (etc: *****) as -1
+    if not value:
+        return 0
+    try:
+        return int(value)
+    except ValueError:
+        return _hybrid36(value)
+
+
+def _hybrid36(value):
+    # hybrid-36 number of a full width field, upper case digits first and then lower case ones, -1 if it is not one
+    width = len(value)
+    if value.isalnum() and value.isascii() and (value.isupper() or value.islower()) and value[0].isalpha():
+        offset = 10 * 36 ** (width - 1) - 10 ** width
+        if value.islower():
+            offset -= 26 * 36 ** (width - 1)
+        return int(value, 36) - offset
+    return -1
+
+
+def _to_float(value):
+    return float(value) if value else 0.0
+
+
+class AtomTable:
+    # Columnar in-memory table of atoms
+    # numeric columns are typed arrays, the coordinates are one flat row-major (N,3) double array and text
+    # columns are Categorical codes, which keeps the memory per atom at a few dozen bytes
+
+    # get_data_pdb column name -> (attribute, kind), kind is "category", "int", "float" or the coordinate axis
+    fields = {
+        "Type": ("record_type", "category"),
+        "Atom serial number": ("serial", "int"),
+        "Atom name": ("name", "category"),
+        "Alternate location indicator": ("altloc", "category"),
+        "Residue name": ("residue_name", "category"),
+        "Chain identifier": ("chain", "category"),
+        "Residue sequence number": ("residue_number", "int"),
+        "Code for insertions of residues": ("insertion_code", "category"),
+        "X orthogonal Å coordinate": ("coordinates", 0),
+        "Y orthogonal Å coordinate": ("coordinates", 1),
+        "Z orthogonal Å coordinate": ("coordinates", 2),
+        "Occupancy": ("occupancy", "float"),
+        "Temperature factor": ("b_factor", "float"),
+        "Segment identifier": ("segment", "category"),
+        "Element symbol": ("element", "category"),
+        "Charge": ("charge", "category"),
+    }
+    _converters = {"Atom serial number": _to_int, "Residue sequence number": _to_int,
+                   "X orthogonal Å coordinate": float, "Y orthogonal Å coordinate": float,
+                   "Z orthogonal Å coordinate": float, "Occupancy": _to_float, "Temperature factor": _to_float}
+
+    def __init__(self):
+        self.serial = array("i")
+        self.residue_number = array("i")
+        self.coordinates = array("d")
+        self.occupancy = array("d")
+        self.b_factor = array("d")
+        for attribute, kind in self.fields.values():
+            if kind == "category":
+                setattr(self, attribute, Categorical())
+        self._bind()
+
+    def _bind(self):
+        # one compiled extractor for all the columns, values come out in the order of self.fields
+        self._extractor = RaminCalc.compile_template_pdb(RaminCalc.get_template_pdb(self.fields), self._converters)
+        self._appenders = [getattr(self, attribute).append for attribute, _ in self.fields.values()]
+
+    def __getstate__(self):
+        # only the columns are pickled, the extractor is compiled again when loading
+        state = dict(self.__dict__)
+        del state["_extractor"], state["_appenders"]
+        state.pop("_derived", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._bind()
+
+    @classmethod
+    def from_lines(cls, pdb_lines):
+        """
+            Function to build an AtomTable from ATOM or HETATM lines
+
+            Parameters
+            ----------
+            pdb_lines : list
+                list of atomic lines
+
+            Return
+            ----------
+            table : AtomTable
+
+        """
+        table = cls()
+        for pdb_line in pdb_lines:
+            table.append_line(pdb_line)
+        return table
+
+    def append_line(self, pdb_line):
+        # parse a single line once and append every column
+        for append, value in zip(self._appenders, self._extractor.values(pdb_line)):
+            append(value)
+        self.__dict__.pop("_derived", None)
+
+    def derived(self):
+        # cache of the data derived from the columns (residue index, selections), emptied when an atom is appended
+        # and never pickled
+        return self.__dict__.setdefault("_derived", {})
+
+    def residues(self):
+        # ResidueIndex of the table, built on first use and kept until an atom is appended
+        derived = self.derived()
+        index = derived.get("residues")
+        if index is None:
+            index = derived["residues"] = ResidueIndex(self)
+        return index
+
+    def take(self, indices):
+        """
+            Function to copy a subset of the atoms into a new table
+
+            Parameters
+            ----------
+            indices : iterable
+                atom indices, in the order they are wanted
+
+            Return
+            ----------
+            table : AtomTable
+                the selected atoms, accepted by every calculator
+
+        """
+        indices = array("q", indices)
+        table = AtomTable()
+        for attribute in {attribute for attribute, _ in self.fields.values()}:
+            column = getattr(self, attribute)
+            if isinstance(column, Categorical):
+                subset = getattr(table, attribute)
+                subset.categories = list(column.categories)
+                subset._index = dict(column._index)
+                subset.codes = array("I", map(column.codes.__getitem__, indices))
+            elif attribute == "coordinates":
+                for index in indices:
+                    table.coordinates.extend(column[3 * index:3 * index + 3])
+            else:
+                getattr(table, attribute).extend(map(column.__getitem__, indices))
+        return table
+
+    @classmethod
+    def concatenate(cls, tables):
+        # one table with the atoms of every table in order, the categories are merged
+        table = cls()
+        for other in tables:
+            for attribute in {attribute for attribute, _ in cls.fields.values()}:
+                column = getattr(other, attribute)
+                if isinstance(column, Categorical):
+                    merged = getattr(table, attribute)
+                    remap = []
+                    for category in column.categories:
+                        code = merged._index.get(category)
+                        if code is None:
+                            code = merged._index[category] = len(merged.categories)
+                            merged.categories.append(category)
+                        remap.append(code)
+                    merged.codes.extend(map(remap.__getitem__, column.codes))
+                else:
+                    getattr(table, attribute).extend(column)
+        return table
+
+    def __len__(self):
+        return len(self.serial)
+
+    def column(self, name):
+        # decoded values of a column, by its get_data_pdb name
+        attribute, kind = self.fields[name]
+        if kind == "category":
+            return getattr(self, attribute).decode()
+        if attribute == "coordinates":
+            return self.coordinates[kind::3].tolist()
+        return getattr(self, attribute).tolist()
+
+    def record(self, index):
+        # fields of a single atom as text, in the same format RaminCalc.get_data_pdb returns them
+        # blank numeric fields come back as zeros
+        x, y, z = self.coordinates[3 * index:3 * index + 3]
+        record = {}
+        for name, (attribute, kind) in self.fields.items():
+            if kind == "category":
+                record[name] = getattr(self, attribute)[index].strip()
+            elif kind == "int":
+                record[name] = str(getattr(self, attribute)[index])
+            elif kind == "float":
+                record[name] = "%.2f" % getattr(self, attribute)[index]
+            else:
+                record[name] = "%.3f" % (x, y, z)[kind]
+        return record
+
+    def xyz(self):
+        # iterate (x, y, z) tuples of every atom
+        coordinates = self.coordinates
+        return zip(coordinates[0::3], coordinates[1::3], coordinates[2::3])
+
+    def coordinates_view(self):
+        # zero-copy (N,3) view of the coordinates
+        return memoryview(self.coordinates).cast("B").cast("d", (len(self), 3))
+
+    @property
+    def nbytes(self):
+        # memory held by the columns
+        total = 0
+        for attribute in {attribute for attribute, _ in self.fields.values()}:
+            column = getattr(self, attribute)
+            total += column.nbytes if isinstance(column, Categorical) else column.itemsize * len(column)
+        return total
+
+
+class ResidueIndex:
+    # Residues of an AtomTable keyed by (chain, residue sequence number, insertion code)
+    # a residue is a run of consecutive atoms with the same key, built in one linear pass over the columns,
+    # the key of every residue maps to its position and every position to its atom index range
+
+    def __init__(self, table):
+        """
+            Parameters
+            ----------
+            table : AtomTable
+                parsed atoms, the index refers to their positions in it
+        """
+        self.keys = []
+        self.names = []
+        self.starts = array("q")
+        self.stops = array("q")
+        # key: (chain, residue number, insertion code), value: position of the residue
+        self._positions = {}
+        # key: residue split by other atoms, value: positions of its later runs
+        self._splits = {}
+
+        chains = [chain.strip() for chain in table.chain.categories]
+        insertion_codes = [code.strip() for code in table.insertion_code.categories]
+        residue_names = table.residue_name.categories
+        previous = None
+        for index, run in enumerate(zip(table.chain.codes, table.residue_number, table.insertion_code.codes)):
+            if run == previous:
+                continue
+            if previous is not None:
+                self.stops.append(index)
+            previous = run
+            key = (chains[run[0]], run[1], insertion_codes[run[2]])
+            if key in self._positions:
+                # a residue split by other atoms is one residue, the new run still gets its own range
+                self._splits.setdefault(key, []).append(len(self.keys))
+            else:
+                self._positions[key] = len(self.keys)
+            self.keys.append(key)
+            self.names.append(residue_names[table.residue_name.codes[index]].strip())
+            self.starts.append(index)
+        if previous is not None:
+            self.stops.append(len(table))
+
+    def __len__(self):
+        # number of unique residues
+        return len(self._positions)
+
+    def __contains__(self, key):
+        return self._key(key) in self._positions
+
+    def __iter__(self):
+        # unique residue keys in file order
+        return iter(self._positions)
+
+    def __getitem__(self, key):
+        # atom index range of a residue, residue numbers may be given as text
+        return self.atoms(key)
+
+    def _key(self, key):
+        chain, number, insertion_code = key if len(key) == 3 else (key[0], key[1], "")
+        return chain, int(number), insertion_code
+
+    def atoms(self, key):
+        """
+            Function to find the atoms of a residue
+
+            Parameters
+            ----------
+            key : tuple
+                (chain, residue sequence number, insertion code) or (chain, residue sequence number)
+
+            Return
+            ----------
+            atoms : range
+                atom indices of the residue, a residue split by other atoms also spans them
+
+        """
+        key = self._key(key)
+        position = self._positions[key]
+        stop = self.stops[position]
+        for split in self._splits.get(key, ()):
+            stop = self.stops[split]
+        return range(self.starts[position], stop)
+
+    def name(self, key):
+        return self.names[self._positions[self._key(key)]]
+
+    def runs(self):
+        # (key, residue name, atom index ranges) of every unique residue in file order, a residue split by other
+        # atoms has one range per run, unlike keys, starts and stops which hold one entry per run
+        for key, position in self._positions.items():
+            positions = [position] + self._splits[key] if key in self._splits else (position,)
+            yield key, self.names[position], [range(self.starts[p], self.stops[p]) for p in positions]
+
+    def slice(self, first, last):
+        """
+            Function to find the atoms from one residue to another
+
+            Parameters
+            ----------
+            first : tuple
+                key of the first residue
+
+            last : tuple
+                key of the last residue, included
+
+            Return
+            ----------
+            atoms : range
+                atom indices from the start of the first residue to the end of the last one
+
+        """
+        return range(self.atoms(first).start, self.atoms(last).stop)
+
+    def residue_counts(self):
+        # number of unique residues per residue name, in first seen order
+        counts = {}
+        for position in self._positions.values():
+            name = self.names[position]
+            counts[name] = counts.get(name, 0) + 1
+        return counts
+
+
+class LazyAtomTable(AtomTable):
+    # AtomTable that keeps the raw lines and decodes a column only when it is first used
+    # every attribute of AtomTable is decoded for all the atoms at once on first access and then cached, so a
+    # calculator only pays for the columns it touches (etc: the element symbols for atomic_composition_calculator)
+
+    def __init__(self, lines=()):
+        self.lines = list(lines)
+
+    def __getattr__(self, attribute):
+        # only called for attributes that are not decoded yet
+        names = self._columns().get(attribute)
+        if names is None:
+            raise AttributeError(attribute)
+        spans = [RaminCalc.compile_template_pdb(RaminCalc.get_template_pdb([name]), self._converters).spans[0]
+                 for name in names]
+        if attribute == "coordinates":
+            (x0, x1, _, _), (y0, y1, _, _), (z0, z1, _, _) = spans
+            column = array("d")
+            for line in self.lines:
+                column.append(float(line[x0:x1]))
+                column.append(float(line[y0:y1]))
+                column.append(float(line[z0:z1]))
+        else:
+            start, stop, strip, convert = spans[0]
+            values = (line[start:stop] for line in self.lines)
+            if strip:
+                values = (value.strip() for value in values)
+            if convert is not None:
+                values = map(convert, values)
+            kind = self.fields[names[0]][1]
+            column = Categorical() if kind == "category" else array("i" if kind == "int" else "d")
+            if kind == "category":
+                for value in values:
+                    column.append(value)
+            else:
+                column.extend(values)
+        setattr(self, attribute, column)
+        return column
+
+    @classmethod
+    def _columns(cls):
+        # attribute -> get_data_pdb names it is decoded from
+        columns = {}
+        for name, (attribute, _) in cls.fields.items():
+            columns.setdefault(attribute, []).append(name)
+        return columns
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state.pop("_derived", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    def decoded(self):
+        # names of the attributes decoded so far
+        return [attribute for attribute in self._columns() if attribute in self.__dict__]
+
+    def append_line(self, pdb_line):
+        # decoded columns are dropped and decoded again with the new line when used
+        self.lines.append(pdb_line)
+        for attribute in self.decoded():
+            del self.__dict__[attribute]
+        self.__dict__.pop("_derived", None)
+
+    def __len__(self):
+        return len(self.lines)
+
+    @property
+    def nbytes(self):
+        # memory held by the lines and the decoded columns
+        total = sum(sys.getsizeof(line) for line in self.lines)
+        for attribute in self.decoded():
+            column = self.__dict__[attribute]
+            total += column.nbytes if isinstance(column, Categorical) else column.itemsize * len(column)
+        return total
+
+
+def lazy_table_reader(pdb_file):
+    """
+        Function to read the ATOM records of PDB files into a table decoding its columns on demand
+
+        Parameters
+        ----------
+        pdb_file : str
+            path to pdb file (plain or compressed) or "-" for stdin
+
+        Return
+        ----------
+        atom_table : LazyAtomTable
+            table of the atom lines, accepted by the calculators, which decode only the columns they use
+
+    """
+    return LazyAtomTable(pdb_file_reader(pdb_file))
+
+
+class Structure:
+    # Parsed structure built in a single pass over a PDB file
+    # every ATOM and HETATM line is parsed exactly once into an AtomTable, the calculators accept a Structure
+    # instead of atom_lines and memoize their results on it, so derived metrics are computed only once (and are
+    # shared by every caller, they must not be changed)
+
+    def __init__(self, atoms=None, heteroatoms=None):
+        """
+            Parameters
+            ----------
+            atoms : AtomTable
+                parsed ATOM records
+
+            heteroatoms : AtomTable
+                parsed HETATM records (water excluded)
+        """
+        self.atoms = atoms if atoms is not None else AtomTable()
+        self.heteroatoms = heteroatoms if heteroatoms is not None else AtomTable()
+
+        # memoized results of the calculators, key: calculator name, read-only
+        self.metrics = {}
+
+    @classmethod
+    def from_lines(cls, atom_lines, heteroatom_lines=()):
+        return cls(AtomTable.from_lines(atom_lines), AtomTable.from_lines(heteroatom_lines))
+
+    @classmethod
+    def from_file(cls, pdb_file):
+        """
+            Function to build a Structure reading the PDB file only once
+
+            Parameters
+            ----------
+            pdb_file : str or file object
+                path to pdb file or an open text stream
+
+            Return
+            ----------
+            structure : Structure
+                parsed ATOM and HETATM (without water) records
+
+        """
+        structure = cls()
+
+        # the same criteria as pdb_file_reader and hetero_atom_pdb_reader in a single pass
+        for line in pdb_file_stream(pdb_file, ("ATOM", "HETATM")):
+            if line.startswith("ATOM"):
+                structure.atoms.append_line(line)
+            else:
+                structure.heteroatoms.append_line(line)
+        return structure
+
+    def __len__(self):
+        return len(self.atoms)
+
+    def all_atoms(self):
+        # the ATOM and then the HETATM records as one table, built on first use
+        table = self.__dict__.get("_all_atoms")
+        if table is None or len(table) != len(self.atoms) + len(self.heteroatoms):
+            table = self.__dict__["_all_atoms"] = AtomTable.concatenate([self.atoms, self.heteroatoms])
+        return table
+
+    def __getstate__(self):
+        # the combined table is built again when needed
+        state = dict(self.__dict__)
+        state.pop("_all_atoms", None)
+        return state
+
+
+class Trajectory:
+    # Models of an NMR ensemble or the frames of a trajectory sharing a single topology
+    # the atoms of the first model are parsed once into an AtomTable, the later models only contribute their
+    # coordinates, which are kept in one flat array of shape (frames, atoms, 3)
+
+    def __init__(self, topology, coordinates=None):
+        """
+            Parameters
+            ----------
+            topology : AtomTable
+                parsed ATOM records of the first model, its coordinates are the first frame
+
+            coordinates : array
+                flat double array of the coordinates of every frame, frame after frame
+                (default: the topology coordinates as the only frame)
+        """
+        self.topology = topology
+        self.coordinates = coordinates if coordinates is not None else array("d", topology.coordinates)
+        if len(topology) and len(self.coordinates) % (3 * len(topology)):
+            raise ValueError("the coordinates do not hold whole frames of the topology")
+
+    @classmethod
+    def from_file(cls, pdb_file):
+        """
+            Function to read every model of a PDB file
+
+            Parameters
+            ----------
+            pdb_file : str or file object
+                path to pdb file or an open text stream
+
+            Return
+            ----------
+            trajectory : Trajectory
+                the first model as topology, every model (the first one included) as a frame
+
+        """
+        if isinstance(pdb_file, str):
+            with open_pdb(pdb_file) as f:
+                return cls.from_file(f)
+
+        topology = AtomTable()
+        coordinates = array("d")
+        model = 0
+        n_atoms = 0
+        for line in pdb_file:
+            if line.startswith("ATOM"):
+                if model == 0:
+                    topology.append_line(line.strip())
+                else:
+                    # later models: the coordinate columns only, the topology is never parsed again
+                    coordinates.append(float(line[30:38]))
+                    coordinates.append(float(line[38:46]))
+                    coordinates.append(float(line[46:54]))
+                n_atoms += 1
+            elif line.startswith("ENDMDL"):
+                if model and n_atoms != len(topology):
+                    raise ValueError(f"model {model + 1} has {n_atoms} atoms, the first model has {len(topology)}")
+                if model == 0:
+                    coordinates.extend(topology.coordinates)
+                model += 1
+                n_atoms = 0
+        if model == 0:
+            # a single structure without MODEL records
+            coordinates.extend(topology.coordinates)
+        elif n_atoms:
+            raise ValueError(f"atoms after the last ENDMDL record of {model} models")
+        return cls(topology, coordinates)
+
+    def __len__(self):
+        # number of frames
+        return len(self.coordinates) // (3 * len(self.topology)) if len(self.topology) else 0
+
+    def frames_view(self):
+        # zero-copy (frames, atoms, 3) view of the coordinates
+        return memoryview(self.coordinates).cast("B").cast("d", (len(self), len(self.topology), 3))
+
+    def frame(self, index):
+        """
+            Function to get a single frame as an AtomTable
+
+            Parameters
+            ----------
+            index : int
+                frame number, 0 is the first model
+
+            Return
+            ----------
+            table : AtomTable
+                table sharing the topology columns, with the coordinates of the frame
+                accepted by every calculator
+
+        """
+        size = 3 * len(self.topology)
+        if not 0 <= index < len(self):
+            raise IndexError("frame index out of range")
+        table = copy.copy(self.topology)
+        table.coordinates = self.coordinates[index * size:(index + 1) * size]
+        return table
+
+    def _frame_slices(self):
+        # x, y and z arrays of every frame
+        size = 3 * len(self.topology)
+        for index in range(len(self)):
+            frame = self.coordinates[index * size:(index + 1) * size]
+            yield frame[0::3], frame[1::3], frame[2::3]
+
+    def radius_of_gyration(self):
+        """
+            Function to find the radius of gyration of every frame
+
+            Return
+            ----------
+            radius_of_gyration : list
+                radius of gyration of every frame
+
+        """
+        # the masses are looked up once for the topology, then every frame is reduced with C level sums
+        # over whole columns, Rg^2 = sum(m * r^2) / M - |sum(m * r) / M|^2
+        categories = [element_mass(element) for element in self.topology.element.categories]
+        masses = array("d", map(categories.__getitem__, self.topology.element.codes))
+        total_mass = math.fsum(masses)
+        if total_mass == 0:
+            raise ValueError("no atoms with a known element mass")
+        mul = operator.mul
+        result = []
+        for xs, ys, zs in self._frame_slices():
+            cx = math.fsum(map(mul, masses, xs)) / total_mass
+            cy = math.fsum(map(mul, masses, ys)) / total_mass
+            cz = math.fsum(map(mul, masses, zs)) / total_mass
+            mr2 = math.fsum(map(mul, masses, map(mul, xs, xs))) + math.fsum(map(mul, masses, map(mul, ys, ys))) \
+                + math.fsum(map(mul, masses, map(mul, zs, zs)))
+            result.append(math.sqrt(max(mr2 / total_mass - (cx * cx + cy * cy + cz * cz), 0.0)))
+        return result
+
+    def most_distant_residues(self):
+        """
+            Function to find the most distant CA pair of every frame
+
+            Return
+            ----------
+            most_distant_residues : list
+                ((residue number 1, residue number 2), distance) of every frame,
+                like most_distant_residue_finder on that frame
+
+        """
+        # the CA atoms of every chain are selected once on the topology
+        ca_code = self.topology.name.code_of("CA")
+        chains = {}
+        for index, (chain_code, name_code) in enumerate(zip(self.topology.chain.codes, self.topology.name.codes)):
+            atoms = chains.setdefault(chain_code, [])
+            if name_code == ca_code:
+                atoms.append(index)
+        numbers = self.topology.residue_number
+
+        result = []
+        for xs, ys, zs in self._frame_slices():
+            best = ((None, None), None)
+            for atoms in chains.values():
+                if len(atoms) < 2:
+                    continue
+                i, j, distance = _farthest_pair([(xs[atom], ys[atom], zs[atom]) for atom in atoms])
+                if best[1] is None or distance > best[1]:
+                    best = ((str(numbers[atoms[i]]), str(numbers[atoms[j]])), distance)
+            result.append(best)
+        return result
+
+    def composition(self):
+        # amino acid composition, the same for every frame since the topology is shared
+        return amino_acid_composition_calculator(self.topology)
+
+
+def trajectory_reader(pdb_file):
+    """
+        Function to read every model (MODEL/ENDMDL) of a PDB file
+
+        Parameters
+        ----------
+        pdb_file : str or file object
+            path to pdb file or an open text stream
+
+        Return
+        ----------
+        trajectory : Trajectory
+            shared topology and the coordinates of every frame
+
+    """
+    return Trajectory.from_file(pdb_file)
+
+
+def _structure_cached(calculator):
+    # calculators decorated with this memoize their result on a Structure argument under the calculator name
+    # (and the keyword options, if any are given), every later call returns the same object, so the results of a
+    # Structure are read-only: copy one before changing it
+    @functools.wraps(calculator)
+    def wrapper(atom_lines, *args, **options):
+        if args or not isinstance(atom_lines, Structure):
+            return calculator(atom_lines, *args, **options)
+        key = (calculator.__name__,) + tuple(sorted(options.items())) if options else calculator.__name__
+        try:
+            cached = key in atom_lines.metrics
+        except TypeError:
+            # options that can not be a dictionary key (etc: a set of residues) are not memoized
+            return calculator(atom_lines, **options)
+        if not cached:
+            atom_lines.metrics[key] = calculator(atom_lines, **options)
+        return atom_lines.metrics[key]
+    return wrapper
+
+
+def _as_atom_table(atom_lines, hetero=False):
+    # the AtomTable behind a Structure or AtomTable argument, None when atom_lines is a list of lines
+    if isinstance(atom_lines, Structure):
+        return atom_lines.heteroatoms if hetero else atom_lines.atoms
+    if isinstance(atom_lines, AtomTable):
+        return atom_lines
+    return None
+
+
+def _iter_rows(atom_lines, columns, converters=None):
+    # extract tuples of the requested columns from atomic lines with a compiled template
+    # mapped records decode only the requested columns from the mapped file
+    if isinstance(atom_lines, MappedRecords):
+        return atom_lines.iter_values(columns, converters)
+    extractor = RaminCalc.compile_template_pdb(RaminCalc.get_template_pdb(columns), converters)
+    return extractor.iter_values(atom_lines)
+
+
+def _category_counts(categorical, keys=None):
+    # count occurrences per category, keys optionally gives the code of every counted item
+    counts = [0] * len(categorical.categories)
+    for code in (categorical.codes if keys is None else keys):
+        counts[code] += 1
+    return {category: counts[code] for code, category in enumerate(categorical.categories) if counts[code]}
+
+
+def _residue_counts(table):
+    # count unique (chain, residue sequence number, insertion code) residues per residue name of a table
+    return table.residues().residue_counts()
+
+
+# leading bytes of the supported compressed formats and their openers
+compressed_formats = [(b"\x1f\x8b", gzip.open), (b"BZh", bz2.open), (b"\xfd7zXZ\x00", lzma.open)]
+
+
+class _ThreadedLines:
+    # Lines of a text stream read by a background thread into a bounded queue
+    # the thread reads (and so decompresses) chunks of lines ahead while the caller parses the previous ones,
+    # zlib, bz2 and lzma release the GIL while decompressing so the two overlap
+
+    _end = object()
+
+    def __init__(self, stream, buffer_chunks=64, chunk_bytes=1 << 16):
+        self._stream = stream
+        self._chunk_bytes = chunk_bytes
+        self._queue = queue.Queue(buffer_chunks)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._read, daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        # wait for room in the queue unless the reader was closed
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _read(self):
+        try:
+            while True:
+                chunk = self._stream.readlines(self._chunk_bytes)
+                if not chunk or not self._put(chunk):
+                    break
+        except Exception as error:
+            # handed over to the caller and raised there
+            self._put(error)
+        self._put(self._end)
+
+    def __iter__(self):
+        while True:
+            chunk = self._queue.get()
+            if chunk is self._end:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield from chunk
+
+    def close(self):
+        # stop the thread even when the caller did not read every line
+        self._stop.set()
+        while self._thread.is_alive():
+            try:
+                self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        self._thread.join()
+
+
+@contextlib.contextmanager
+def open_pdb(pdb_file, threaded=None, buffer_chunks=64):
+    """
+        Function to open a plain or compressed PDB file, or stdin, as a text stream
+
+        Parameters
+        ----------
+        pdb_file : str or file object
+            path to pdb file (plain, gzip, bz2 or xz, recognized by the content not the name),
+            "-" for stdin (plain or compressed) or an already open text stream (used as it is and not closed)
+
+        threaded : bool
+            read the lines in a background thread, by default only compressed files are
+
+        buffer_chunks : int
+            number of chunks of lines (64 KiB each) the background thread may read ahead
+
+        Return
+        ----------
+        lines : context manager
+            iterable of the lines of the file
+
+    """
+    if not isinstance(pdb_file, str):
+        yield pdb_file
+        return
+    if pdb_file == "-":
+        # compressed data on stdin is recognized by peeking at its first bytes
+        source = getattr(sys.stdin, "buffer", None)
+        head = source.peek(6)[:6] if hasattr(source, "peek") else b""
+    else:
+        source = pdb_file
+        with open(pdb_file, "rb") as f:
+            head = f.read(6)
+    opener = next((opener for magic, opener in compressed_formats if head.startswith(magic)), None)
+    if opener is None and pdb_file == "-":
+        yield sys.stdin
+        return
+    if threaded is None:
+        threaded = opener is not None
+    stream = opener(source, "rt") if opener is not None else open(pdb_file, "r")
+    try:
+        if not threaded:
+            yield stream
+            return
+        lines = _ThreadedLines(stream, buffer_chunks)
+        try:
+            yield lines
+        finally:
+            lines.close()
+    finally:
+        stream.close()
+
+
+def _residue_counts_of_lines(atom_lines):
+    # count unique residues per residue name of atomic lines in a single pass, like ResidueIndex.residue_counts
+    # a residue is a (Chain identifier, Residue sequence number, Code for insertions of residues) key, it is
+    # counted under the name of its first atom, without padding (" ZN" is "ZN") as in a ResidueIndex
+    needed_cols_temp = ["Residue name", "Chain identifier", "Residue sequence number",
+                        "Code for insertions of residues"]
+    seen = set()
+    counts = {}
+    for residue_name, *key in _iter_rows(atom_lines, needed_cols_temp, {"Residue sequence number": _to_int}):
+        key = tuple(key)
+        if key not in seen:
+            seen.add(key)
+            residue_name = residue_name.strip()
+            counts[residue_name] = counts.get(residue_name, 0) + 1
+    return counts
+
+
 def pdb_file_reader(pdb_file):
     """
         Function to read PDB files
@@ -108,7 +1146,7 @@ def pdb_file_reader(pdb_file):
         Parameters
         ----------
         pdb_file : str
-            path to pdb file
+            path to pdb file (plain or compressed) or "-" for stdin, see open_pdb
 
         Return
         ----------
@@ -119,13 +1157,179 @@ def pdb_file_reader(pdb_file):
 
     atom_lines = []
 
-    with open(pdb_file, "r") as f:
-        for line in f.readlines():
+    with open_pdb(pdb_file) as f:
+        for line in f:
             if line.startswith("ATOM"):
                 atom_lines.append(line.strip())
+            elif line.startswith("ENDMDL"):
+                # only the first model of an ensemble, see trajectory_reader for all of them
+                break
     return atom_lines
 
 
+def atom_table_reader(pdb_file):
+    """
+        Function to read the ATOM records of PDB files into a columnar table
+
+        Parameters
+        ----------
+        pdb_file : str
+            path to pdb file (plain or compressed) or "-" for stdin
+
+        Return
+        ----------
+        atom_table : AtomTable
+            columnar table of the atoms, accepted by the calculators instead of atom_lines
+
+    """
+
+    atom_table = AtomTable()
+
+    # same criteria as pdb_file_reader, but every line is parsed straight into the columns instead of being kept
+    with open_pdb(pdb_file) as f:
+        for line in f:
+            if line.startswith("ATOM"):
+                atom_table.append_line(line.strip())
+            elif line.startswith("ENDMDL"):
+                break
+    return atom_table
+
+
+class MappedRecords:
+    # ATOM or HETATM records of a memory mapped PDB file
+    # the record prefixes are searched directly in the mapped bytes and the fixed-width fields are handed out
+    # as memoryview slices, only the columns a calculator asks for are ever decoded, so no line strings are
+    # created and the memory stays near the size of the extracted columns
+    # the calculators accept it instead of atom_lines
+
+    def __init__(self, pdb_file, hetero=False):
+        """
+            Parameters
+            ----------
+            pdb_file : str
+                path to pdb file
+
+            hetero : bool
+                if True the HETATM records without water are selected, like hetero_atom_pdb_reader
+                otherwise the ATOM records, like pdb_file_reader
+        """
+        self.hetero = hetero
+        self._file = open(pdb_file, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files can not be mapped
+            self._map = b""
+        self._view = memoryview(self._map)
+        self._starts = None
+        self._ends = None
+
+    def _scan(self):
+        # offsets of the selected records, found by searching "\nATOM" or "\nHETATM" in the mapped bytes
+        starts, ends = array("q"), array("q")
+        data = self._map
+        prefix = b"HETATM" if self.hetero else b"ATOM"
+        marker = b"\n" + prefix
+        # only the records of the first model of an ensemble
+        limit = data.find(b"\nENDMDL")
+        if limit < 0:
+            limit = len(data)
+        if data[:len(prefix)] == prefix:
+            position = 0
+        else:
+            position = data.find(marker)
+            if position >= 0:
+                position += 1
+        while 0 <= position < limit:
+            end = data.find(b"\n", position)
+            next_position = end + 1 if end >= 0 else -1
+            if end < 0:
+                end = len(data)
+            if end > position and data[end - 1:end] == b"\r":
+                end -= 1
+            if not self.hetero or data[position + 17:position + 20] != b"HOH":
+                starts.append(position)
+                ends.append(end)
+            if next_position < 0:
+                break
+            position = data.find(marker, next_position - 1)
+            if position >= 0:
+                position += 1
+        self._starts, self._ends = starts, ends
+
+    def _offsets(self):
+        if self._starts is None:
+            self._scan()
+        return zip(self._starts, self._ends)
+
+    def __len__(self):
+        self._offsets()
+        return len(self._starts)
+
+    def __iter__(self):
+        # the selected records as stripped lines, like pdb_file_reader returns them
+        view = self._view
+        for start, end in self._offsets():
+            yield str(view[start:end], "latin-1").strip()
+
+    def iter_fields(self, columns):
+        # tuples of memoryview slices of the requested columns, nothing is copied or decoded
+        spans = RaminCalc.compile_template_pdb(RaminCalc.get_template_pdb(columns)).spans
+        view = self._view
+        for start, end in self._offsets():
+            yield tuple(view[start + first:min(start + last, end)] for first, last, _, _ in spans)
+
+    def iter_values(self, columns, converters=None):
+        # tuples of the requested columns decoded like ColumnExtractor.iter_values does for lines
+        spans = RaminCalc.compile_template_pdb(RaminCalc.get_template_pdb(columns), converters).spans
+        view = self._view
+        for start, end in self._offsets():
+            row = []
+            for first, last, strip, convert in spans:
+                value = str(view[start + first:min(start + last, end)], "latin-1")
+                if strip:
+                    value = value.strip()
+                if convert is not None:
+                    value = convert(value)
+                row.append(value)
+            yield tuple(row)
+
+    def close(self):
+        self._view.release()
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def mmap_pdb_reader(pdb_file, hetero=False):
+    """
+        Function to read PDB files through a memory map
+
+        Parameters
+        ----------
+        pdb_file : str
+            path to pdb file
+
+        hetero : bool
+            select the HETATM records without water instead of the ATOM records
+
+        Return
+        ----------
+        records : MappedRecords
+            mapped records, accepted by the calculators instead of atom_lines or heteroatom_lines
+            close it (or use it as a context manager) when done
+
+    """
+    return MappedRecords(pdb_file, hetero)
+
+
+@_structure_cached
 def amino_acid_composition_calculator(atom_lines):
     """
         Function to find amino acid composition
@@ -133,7 +1337,7 @@ def amino_acid_composition_calculator(atom_lines):
         Parameters
         ----------
         atom_lines : str
-            list of atomic lines
+            list of atomic lines or a Structure
 
         Return
         ----------
@@ -144,25 +1348,18 @@ def amino_acid_composition_calculator(atom_lines):
 
     """
 
-    amino_acid_composition = {}
-
-    # needed columns to generate template from
-    needed_cols_temp = ["Residue name", "Residue sequence number"]
-    # generating a template for my RaminCalc statics method class
-    temp_template = RaminCalc.get_template_pdb(needed_cols_temp)
+    # residues are unique (Chain identifier, Residue sequence number, Code for insertions of residues) keys, a
+    # parsed table counts them from its residue index
+    table = _as_atom_table(atom_lines)
+    if table is not None:
+        amino_acid_composition = _residue_counts(table)
+        return dict(sorted(amino_acid_composition.items(),key=lambda x: x[1], reverse=True))
 
-    for line in atom_lines:
-        # parsing the template for each line to get the desired data from each line
-        data = RaminCalc.get_custom_data_pdb(line, temp_template)
-        # creating a key equal to Residue name and values are storing in a list format and stores the Residue sequence number for further removing the duplicates
-        amino_acid_composition[data["Residue name"]] = amino_acid_composition.get(data["Residue name"], []) + [
-            data["Residue sequence number"]]
-    # removing duplicates and count each residue
-    for key, value in amino_acid_composition.items():
-        amino_acid_composition[key] = len(set(value))
+    amino_acid_composition = _residue_counts_of_lines(atom_lines)
     return dict(sorted(amino_acid_composition.items(),key=lambda x: x[1], reverse=True))
 
 
+@_structure_cached
 def amino_acid_composition_percentage_calculator(atom_lines):
     """
         Function to find amino acid composition percentage
@@ -170,7 +1367,7 @@ def amino_acid_composition_percentage_calculator(atom_lines):
         Parameters
         ----------
         atom_lines : str
-            list of atomic lines
+            list of atomic lines or a Structure
 
         Return
         ----------
@@ -196,6 +1393,7 @@ def amino_acid_composition_percentage_calculator(atom_lines):
     return dict(sorted(amino_acid_composition_percentage.items(),key=lambda x: x[1], reverse=True))
 
 
+@_structure_cached
 def atomic_composition_calculator(atom_lines):
     """
         Function to find atomic composition
@@ -203,7 +1401,7 @@ def atomic_composition_calculator(atom_lines):
         Parameters
         ----------
         atom_lines : str
-            list of atomic lines
+            list of atomic lines or a Structure
 
         Return
         ----------
@@ -214,19 +1412,23 @@ def atomic_composition_calculator(atom_lines):
 
     """
 
+    # a parsed table only counts the element codes
+    table = _as_atom_table(atom_lines)
+    if table is not None:
+        atomic_composition = _category_counts(table.element)
+        return dict(sorted(atomic_composition.items(),key=lambda x: x[1], reverse=True))
+
     atomic_composition = {}
 
     # defining which columns we need
     needed_cols_temp = ["Element symbol"]
-    # generating a template for needed columns
-    temp_template = RaminCalc.get_template_pdb(needed_cols_temp)
-    for line in atom_lines:
-        # extract only the ELEMENT symbol which is atomic code and count the occurrence
-        data = RaminCalc.get_custom_data_pdb(line, temp_template, True)
+    for data, in _iter_rows(atom_lines, needed_cols_temp):
+        # only the ELEMENT symbol which is atomic code is extracted, count the occurrence
         atomic_composition[data] = atomic_composition.get(data, 0) + 1
     return dict(sorted(atomic_composition.items(),key=lambda x: x[1], reverse=True))
 
 
+@_structure_cached
 def atomic_composition_percentage_calculator(atom_lines):
     """
         Function to find atomic composition percentage
@@ -234,7 +1436,7 @@ def atomic_composition_percentage_calculator(atom_lines):
         Parameters
         ----------
         atom_lines : str
-            list of atomic lines
+            list of atomic lines or a Structure
 
         Return
         ----------
@@ -385,7 +1587,7 @@ def hetero_atom_pdb_reader(pdb_file):
         Parameters
         ----------
         pdb_file : str
-            path to pdb file
+            path to pdb file (plain or compressed) or "-" for stdin
 
         Return
         ----------
@@ -397,14 +1599,17 @@ def hetero_atom_pdb_reader(pdb_file):
     heteroatom_lines = []
     # reading heteroatom lines like reading the ATOM lines
     # criteria is starting of the line
-    with open(pdb_file, "r") as f:
-        for line in f.readlines():
+    with open_pdb(pdb_file) as f:
+        for line in f:
             if line.startswith("HETATM") and line[17:20]!="HOH":
                 heteroatom_lines.append(line.strip())
+            elif line.startswith("ENDMDL"):
+                break
 
     return heteroatom_lines
 
 
+@_structure_cached
 def hetero_atom_residue_counter(heteroatom_lines):
     """
         Function to count heteroatom residues
@@ -412,7 +1617,7 @@ def hetero_atom_residue_counter(heteroatom_lines):
         Parameters
         ----------
         heteroatom_lines : list
-            list of heteroatom lines
+            list of heteroatom lines or a Structure (its HETATM records are counted)
 
         Return
         ----------
@@ -424,21 +1629,11 @@ def hetero_atom_residue_counter(heteroatom_lines):
 
     """
 
-    hetero_atom_composition = {}
-
-    needed_cols_temp = ["Residue name", "Residue sequence number"]
-    # generating a template for my RaminCalc statics method class
-    temp_template = RaminCalc.get_template_pdb(needed_cols_temp)
+    table = _as_atom_table(heteroatom_lines, hetero=True)
+    if table is not None:
+        return _residue_counts(table)
 
-    for line in heteroatom_lines:
-        # parsing the template for each line to get the desired data from each line
-        data = RaminCalc.get_custom_data_pdb(line, temp_template)
-        # creating a key equal to Residue name and values are storing in a list format and stores the Residue sequence number for further removing the duplicates
-        hetero_atom_composition[data["Residue name"]] = hetero_atom_composition.get(data["Residue name"], []) + [
-            data["Residue sequence number"]]
-    # removing duplicates and count each residue
-    for key, value in hetero_atom_composition.items():
-        hetero_atom_composition[key] = len(set(value))
+    hetero_atom_composition = _residue_counts_of_lines(heteroatom_lines)
 
     return hetero_atom_composition
 
@@ -450,38 +1645,279 @@ def distance_calculator(x1, y1, z1, x2, y2, z2):
     return distance
 
 
-def most_distant_residue_finder(atom_lines):
+def spatial_index(atom_lines, cell_size=4.0, hetero=False):
     """
-        Function to find amino acid composition
+        Function to build a spatial index over the atom coordinates
 
         Parameters
         ----------
         atom_lines : str
-            list of atomic lines
+            list of atomic lines, an AtomTable or a Structure
+
+        cell_size : float
+            edge of the grid cells in Å, best close to the cutoff of the queries
+
+        hetero : bool
+            with a Structure, index the HETATM records instead of the ATOM records
 
         Return
         ----------
-        most_distant_residues : tuple
-            tuple of most distant residues
+        index : pdb_spatial.CellList
+            radius, nearest neighbor and pairs within cutoff queries, point i is atom i of the table
+
+    """
+    table = _as_atom_table(atom_lines, hetero)
+    if table is None:
+        table = AtomTable.from_lines(atom_lines)
+    return CellList(table.coordinates, cell_size)
 
+
+def _residue_keys(table):
+    # (chain, residue name, residue sequence number, insertion code) of every atom of a table
+    chain = table.chain.categories
+    name = table.residue_name.categories
+    insertion = table.insertion_code.categories
+    return [(chain[c].strip(), name[n].strip(), number, insertion[i].strip()) for c, n, number, i in
+            zip(table.chain.codes, table.residue_name.codes, table.residue_number, table.insertion_code.codes)]
+
+
+@_structure_cached
+def binding_site_finder(atom_lines, heteroatom_lines=None, cutoff=4.0):
     """
+        Function to find the protein residues around every hetero residue (ligand)
+
+        Parameters
+        ----------
+        atom_lines : list
+            list of atomic lines or a Structure (its ATOM and HETATM records are used)
+
+        heteroatom_lines : list
+            list of heteroatom lines, etc: from hetero_atom_pdb_reader, not needed with a Structure
+
+        cutoff : float
+            largest distance in Å between a ligand atom and an atom of a binding site residue
+
+        Return
+        ----------
+        binding_sites : list
+            one dictionary per ligand in file order with the keys
+            ligand, chain, residue_number, insertion_code: the hetero residue
+            atoms: number of ligand atoms
+            residues: list of dictionaries (chain, residue_name, residue_number, insertion_code, min_distance)
+            of the ATOM residues within the cutoff, in file order
+            min_distance: closest protein atom distance, None for a ligand without binding site residues
+
+    """
+    if isinstance(atom_lines, Structure):
+        atoms, heteroatoms = atom_lines.atoms, atom_lines.heteroatoms
+    else:
+        atoms = _as_atom_table(atom_lines)
+        if atoms is None:
+            atoms = AtomTable.from_lines(atom_lines)
+        heteroatoms = _as_atom_table(heteroatom_lines)
+        if heteroatoms is None:
+            heteroatoms = AtomTable.from_lines(heteroatom_lines or [])
+
+    # the ligand atoms are queried against an index of the protein atoms instead of every atom pair
+    index = spatial_index(atoms, cell_size=cutoff)
+    residue_keys = _residue_keys(atoms)
+
+    # key: ligand residue, value: [number of atoms, {protein residue: [first atom index, min distance]}]
+    ligands = {}
+    for ligand, point in zip(_residue_keys(heteroatoms), heteroatoms.xyz()):
+        found = ligands.get(ligand)
+        if found is None:
+            found = ligands[ligand] = [0, {}]
+        found[0] += 1
+        residues = found[1]
+        for atom, distance in index.query_radius(point, cutoff, distances=True):
+            residue = residues.get(residue_keys[atom])
+            if residue is None:
+                residues[residue_keys[atom]] = [atom, distance]
+            else:
+                residue[0] = min(residue[0], atom)
+                residue[1] = min(residue[1], distance)
+
+    binding_sites = []
+    for (chain, name, number, insertion_code), (n_atoms, residues) in ligands.items():
+        site = [{"chain": key[0], "residue_name": key[1], "residue_number": key[2], "insertion_code": key[3],
+                 "min_distance": round(distance, 3)}
+                for key, (_, distance) in sorted(residues.items(), key=lambda item: item[1][0])]
+        binding_sites.append({"ligand": name, "chain": chain, "residue_number": number,
+                              "insertion_code": insertion_code, "atoms": n_atoms, "residues": site,
+                              "min_distance": min((residue["min_distance"] for residue in site), default=None)})
+    return binding_sites
+
+
+def _ca_groups(atom_lines):
+    # group the CA atoms by chain, every CA is stored as {"number", "X", "Y", "Z"}
+    # chains without any CA are kept as empty groups
 
     groups = {}
     # select needed columns for further process
     temp_data_get = ["Chain identifier", "Atom name", "Residue sequence number", "X orthogonal Å coordinate",
                      "Y orthogonal Å coordinate", "Z orthogonal Å coordinate"]
-    # generate the template needed for required columns
-    temp_template = RaminCalc.get_template_pdb(temp_data_get)
-    for l in atom_lines:
-        data_temp = RaminCalc.get_custom_data_pdb(l, temp_template)
+    table = _as_atom_table(atom_lines)
+    if table is not None:
+        # on a parsed table the CA atoms are found by comparing codes, the residue numbers are reported as text
+        # like the values extracted from lines
+        ca_code = table.name.code_of("CA")
+        rows = ((table.chain.categories[chain_code], name_code == ca_code, str(number), x, y, z)
+                for chain_code, name_code, number, (x, y, z) in
+                zip(table.chain.codes, table.name.codes, table.residue_number, table.xyz()))
+    else:
+        rows = ((chain, atom_name == "CA", number, x, y, z)
+                for chain, atom_name, number, x, y, z in _iter_rows(atom_lines, temp_data_get))
+
+    for chain, is_ca, number, x, y, z in rows:
 
         # grouping the chains with their CA storing in values alongside X,Y,Z
-        if data_temp["Chain identifier"] not in groups:
-            groups[data_temp["Chain identifier"]] = []
-        if data_temp["Atom name"] == "CA":
-            groups[data_temp["Chain identifier"]].append(
-                {"number": data_temp["Residue sequence number"], "X": data_temp["X orthogonal Å coordinate"],
-                 "Y": data_temp["Y orthogonal Å coordinate"], "Z": data_temp["Z orthogonal Å coordinate"]})
+        if chain not in groups:
+            groups[chain] = []
+        if is_ca:
+            groups[chain].append({"number": number, "X": x, "Y": y, "Z": z})
+    return groups
+
+
+def _sphere_center(points):
+    # center of the least squares sphere through the points, None when they lie on a plane or a line
+    # x² + y² + z² = 2ax + 2by + 2cz + d is linear in (a, b, c, d), solved through its 4x4 normal equations
+    n = len(points)
+    mx = sum(p[0] for p in points) / n
+    my = sum(p[1] for p in points) / n
+    mz = sum(p[2] for p in points) / n
+    # augmented normal equations, the coordinates are taken relative to the centroid for the conditioning
+    system = [[0.0] * 5 for _ in range(4)]
+    for x, y, z in points:
+        x, y, z = x - mx, y - my, z - mz
+        row = (2 * x, 2 * y, 2 * z, 1.0, x * x + y * y + z * z)
+        for a in range(4):
+            for b in range(5):
+                system[a][b] += row[a] * row[b]
+    scale = max(system[a][a] for a in range(4))
+    for column in range(4):
+        pivot = max(range(column, 4), key=lambda row: abs(system[row][column]))
+        if abs(system[pivot][column]) <= 1e-12 * scale:
+            return None
+        system[column], system[pivot] = system[pivot], system[column]
+        for row in range(column + 1, 4):
+            factor = system[row][column] / system[column][column]
+            for b in range(column, 5):
+                system[row][b] -= factor * system[column][b]
+    solution = [0.0] * 4
+    for row in range(3, -1, -1):
+        solution[row] = (system[row][4] - sum(system[row][b] * solution[b] for b in range(row + 1, 4))) \
+            / system[row][row]
+    return solution[0] + mx, solution[1] + my, solution[2] + mz
+
+
+def _farthest_pair(points):
+    # exact farthest pair of a list of (x, y, z) points, returns (i, j, distance) with i < j
+    # on ties the first pair in (i, j) order wins, like the exhaustive double loop in most_distant_residue_finder
+
+    n = len(points)
+    # slack for rounding, so the bounds never prune a pair that ties with the best distance
+    slack = 1e-6
+
+    def pair_distance(i, j):
+        # same arithmetic as distance_calculator, so the result is bit-identical to the exhaustive search
+        x1, y1, z1 = points[i]
+        x2, y2, z2 = points[j]
+        return math.sqrt(((x2 - x1) * (x2 - x1)) + ((y2 - y1) * (y2 - y1)) + ((z2 - z1) * (z2 - z1)))
+
+    # a lower bound of the answer from a few farthest point sweeps, starting at the point farthest from the centroid
+    centroid = tuple(sum(p[axis] for p in points) / n for axis in range(3))
+    a = max(range(n), key=lambda k: math.dist(points[k], centroid))
+    lower, sweep_pair = -1.0, None
+    for _ in range(3):
+        distances = [pair_distance(min(a, k), max(a, k)) for k in range(n)]
+        b = max(range(n), key=distances.__getitem__)
+        if distances[b] > lower:
+            lower, sweep_pair = distances[b], (points[a], points[b])
+        a = b
+
+    # every pair is bounded by the distances of its points from a center c and by the angle between their
+    # directions: |p - q|² = r_p² + r_q² - 2 r_p r_q cos θ, so the center enclosing the points in the smallest
+    # sphere prunes the most. Of the centroid, the least squares sphere and the middle of the sweep pair the one
+    # with the smallest largest radius is kept, on a spherical shell the fitted sphere finds the true center.
+    centers = [centroid, tuple((sweep_pair[0][axis] + sweep_pair[1][axis]) / 2 for axis in range(3))]
+    fitted = _sphere_center(points)
+    if fitted is not None:
+        centers.append(fitted)
+    center = min(centers, key=lambda center: max(math.dist(point, center) for point in points))
+    radii = [math.dist(point, center) for point in points]
+    r_max = max(radii)
+
+    # only points far enough from the center can reach the lower bound with any partner
+    candidates = [k for k in range(n) if radii[k] + r_max + slack >= lower]
+    directions = []
+    for k in candidates:
+        r = radii[k]
+        directions.append(tuple((points[k][axis] - center[axis]) / r for axis in range(3)) if r else (0.0, 0.0, 0.0))
+    # the candidates are split into shells of radii, a partner of a small radius has to be closer to the antipodal
+    # direction than one of a large radius. Every shell looks its partners up around the antipodal direction in a
+    # cell list of the directions, about one direction per cell.
+    r_min = min(radii[k] for k in candidates)
+    width = (r_max - r_min) / 4 or 1.0
+    shells = [[] for _ in range(4)]
+    for position, k in enumerate(candidates):
+        shells[min(3, int((radii[k] - r_min) / width))].append(position)
+    shells = [(max(radii[candidates[position]] for position in positions), positions,
+               CellList([directions[position] for position in positions],
+                        cell_size=math.sqrt(4 * math.pi / len(positions))))
+              for positions in shells if positions]
+
+    best, best_pair = -1.0, None
+    for position, i in enumerate(candidates):
+        r = radii[i]
+        ux, uy, uz = directions[position]
+        point = points[i]
+        for r_shell, positions, cells in shells:
+            target = lower - slack
+            if r + r_shell < target:
+                continue
+            if r == 0 or r + slack >= lower:
+                # a partner at the center is as far as the point itself, the antipodal bound does not hold
+                chord = 2.0
+            else:
+                # a partner reaches the target only if cos θ <= (r² + r_shell² - target²) / (2 r r_shell), so its
+                # direction lies within the chord 2 sin(ψ / 2) of the antipodal direction, with cos ψ = -cos θ
+                cosine = (r * r + r_shell * r_shell - target * target) / (2 * r * r_shell)
+                chord = min(2.0, math.sqrt(max(0.0, 2.0 + 2.0 * cosine)) + 1e-9)
+            for other in cells.query_radius((-ux, -uy, -uz), chord):
+                j = candidates[positions[other]]
+                if j == i or math.dist(point, points[j]) + slack < lower:
+                    continue
+                pair = (i, j) if i < j else (j, i)
+                distance_temp = pair_distance(*pair)
+                if distance_temp > best or (distance_temp == best and pair < best_pair):
+                    best, best_pair = distance_temp, pair
+                    lower = max(lower, best)
+    return best_pair[0], best_pair[1], best
+
+
+@_structure_cached
+def most_distant_residue_finder(atom_lines, fast=False):
+    """
+        Function to find amino acid composition
+
+        Parameters
+        ----------
+        atom_lines : str
+            list of atomic lines or a Structure
+
+        fast : bool
+            if True the farthest CA pair of every chain is found with a bounded candidate search
+            instead of comparing every pair, the result is identical
+
+        Return
+        ----------
+        most_distant_residues : tuple
+            tuple of most distant residues
+
+    """
+
+    groups = _ca_groups(atom_lines)
 
     resid_1 = None
     resid_2 = None
@@ -490,7 +1926,14 @@ def most_distant_residue_finder(atom_lines):
     # calculating distance for each group
     for chain, CAs in groups.items():
         # if there are fewer CA than 2 , it will continue
-        if len(CAs) >= 2:
+        if len(CAs) >= 2 and fast:
+            i, j, distance_temp = _farthest_pair([(float(CA["X"]), float(CA["Y"]), float(CA["Z"])) for CA in CAs])
+            # across chains the first chain keeps ties, like below
+            if distance is None or distance_temp > distance:
+                resid_1 = CAs[i]["number"]
+                resid_2 = CAs[j]["number"]
+                distance = distance_temp
+        elif len(CAs) >= 2:
             for i in range(len(CAs)):
                 for j in range(i + 1, len(CAs)):
                     distance_temp = distance_calculator(CAs[i]["X"], CAs[i]["Y"], CAs[i]["Z"], CAs[j]["X"], CAs[j]["Y"],
@@ -519,20 +1962,85 @@ def most_distant_residue_finder(atom_lines):
     return most_distant_residues
 
 
+def element_mass(element):
+    """
+        Function to find the atomic mass of an element symbol
+
+        Parameters
+        ----------
+        element : str
+            element symbol as written in the PDB columns 77-78, etc: C, FE, Zn
+
+        Return
+        ----------
+        mass : float
+            atomic mass, 0.0 for unknown or blank symbols so those atoms carry no weight
+
+    """
+    mass = atomic_mass.get(element)
+    if mass is None:
+        # PDB files write two letter symbols in upper case, etc: FE, ZN
+        mass = atomic_mass.get(element.capitalize(), 0.0)
+    return mass
+
+
+class _GyrationSums:
+    # running mass weighted sums giving the total mass, the center of mass and the radius of gyration in one pass
+    # Rg^2 = sum(m * |r - r0|^2) / M - |sum(m * (r - r0)) / M|^2, the coordinates are taken relative to the
+    # first atom r0 to keep the sums small and the subtraction accurate
+
+    __slots__ = ("origin", "total_mass", "mx", "my", "mz", "mr2")
+
+    def __init__(self):
+        self.origin = None
+        self.total_mass = self.mx = self.my = self.mz = self.mr2 = 0.0
+
+    def add(self, m, x, y, z):
+        if self.origin is None:
+            self.origin = (x, y, z)
+        x, y, z = x - self.origin[0], y - self.origin[1], z - self.origin[2]
+        self.total_mass += m
+        self.mx += m * x
+        self.my += m * y
+        self.mz += m * z
+        self.mr2 += m * (x * x + y * y + z * z)
+
+    def center_of_mass(self):
+        M = self.total_mass
+        if M == 0:
+            raise ValueError("no atoms with a known element mass")
+        return (self.origin[0] + self.mx / M, self.origin[1] + self.my / M, self.origin[2] + self.mz / M)
+
+    def result(self):
+        M = self.total_mass
+        if M == 0:
+            raise ValueError("no atoms with a known element mass")
+        cx, cy, cz = self.mx / M, self.my / M, self.mz / M
+        return math.sqrt(max(self.mr2 / M - (cx * cx + cy * cy + cz * cz), 0.0))
+
+
 ### Bonus Point
-def radius_of_gyration_calculator(atom_lines):
+@_structure_cached
+def radius_of_gyration_calculator(atom_lines, by_chain=False, residues=None):
     """
         Function to find amino acid composition
 
         Parameters
         ----------
         atom_lines : str
-            list of atomic lines
+            list of atomic lines or a Structure
+
+        by_chain : bool
+            if True the radius of gyration of every chain is returned
+
+        residues : set
+            optional selection of (Chain identifier, Residue sequence number) pairs, only their atoms are used
 
         Return
         ----------
         radius_of_gyration : float
             radius of gyration value of protein
+            with by_chain a dictionary, key: chain identifier, value: radius of gyration
 
     """
     # the Radius of gyration explanation :
@@ -544,123 +2052,538 @@ def radius_of_gyration_calculator(atom_lines):
     # RG is  essential for understanding protein behavior, stability
     # RG is essential for thes too : interactions with ligands or environmental factors
 
-
-    radius_of_gyration = 0.0
-
-
-    # for calculation of radius of gyraction first we need to find the center of mass of our protein
-    mass = {"H": 1.00794, "He": 4.00260, "Li": 6.94100, "Be": 9.01218, "B": 10.81100,
-            "C": 12.01070, "N": 14.00670, "O": 15.99940, "F": 18.99840, "Ne": 20.17970,
-            "Na": 22.98977, "Mg": 24.30500, "Al": 26.98154, "Si": 28.08550, "P": 30.97376,
-            "S": 32.06500, "Cl": 35.45300, "Ar": 39.94800, "K": 39.09830, "Ca": 40.07800,
-            "Sc": 44.95591, "Ti": 47.86700, "V": 50.94150, "Cr": 51.99610, "Mn": 54.93805,
-            "Fe": 55.84500, "Co": 58.93320, "Ni": 58.69340, "Cu": 63.54600, "Zn": 65.40900,
-            "Ga": 69.72300, "Ge": 72.64000, "As": 74.92160, "Se": 78.96000, "Br": 79.90400,
-            "Kr": 83.79800, "Rb": 85.46780, "Sr": 87.62000, "Y": 88.90585, "Zr": 91.22400,
-            "Nb": 92.90638, "Mo": 95.94000, "Tc": 98.00000, "Ru": 101.07000, "Rh": 102.90550,
-            "Pd": 106.42000, "Ag": 107.86820, "Cd": 112.41100, "In": 114.81800, "Sn": 118.71000,
-            "Sb": 121.76000, "Te": 127.60000, "I": 126.90447, "Xe": 131.29300, "Cs": 132.90545,
-            "Ba": 137.32700, "La": 138.90550, "Ce": 140.11600, "Pr": 140.90765, "Nd": 144.24000,
-            "Pm": 145.00000, "Sm": 150.36000, "Eu": 151.96400, "Gd": 157.25000, "Tb": 158.92534,
-            "Dy": 162.50000, "Ho": 164.93032, "Er": 167.25900, "Tm": 168.93421, "Yb": 173.04000,
-            "Lu": 174.96700, "Hf": 178.49000, "Ta": 180.94790, "W": 183.84000, "Re": 186.20700,
-            "Os": 190.23000, "Ir": 192.21700, "Pt": 195.07800, "Au": 196.96655, "Hg": 200.59000,
-            "Tl": 204.38330, "Pb": 207.20000, "Bi": 208.98038, "Po": 209.00000, "At": 210.00000,
-            "Rn": 222.00000, "Fr": 223.00000, "Ra": 226.00000, "Ac": 227.00000, "Th": 232.03810,
-            "Pa": 231.03588, "U": 238.02891, "Np": 237.00000, "Pu": 244.00000, "Am": 243.00000,
-            "Cm": 247.00000, "Bk": 247.00000, "Cf": 251.00000, "Es": 252.00000, "Fm": 257.00000,
-            "Md": 258.00000, "No": 259.00000, "Lr": 262.00000, "Rf": 261.00000, "Db": 262.00000,
-            "Sg": 266.00000, "Bh": 264.00000, "Hs": 277.00000, "Mt": 268.00000, "Ds": 281.00000,
-            "Rg": 272.00000, "Cn": 285.00000, "Uuq": 289.00000, "Uuh": 292.00000}
-
-    atoms = []
-
-    # set the required columns for template
-    temp_need = ["Element symbol", "X orthogonal Å coordinate", "Y orthogonal Å coordinate",
-                 "Z orthogonal Å coordinate"]
-    # generate the template for further calculations
-    template_temp = RaminCalc.get_template_pdb(temp_need)
-
-    # iterate over each atom
-    for l in atom_lines:
-        d_temp = RaminCalc.get_custom_data_pdb(l, template_temp)
-        temp_atom = {"name":d_temp["Element symbol"],"mass":mass[d_temp["Element symbol"]],"x":float(d_temp["X orthogonal Å coordinate"]),"y":float(d_temp["Y orthogonal Å coordinate"]),"z":float(d_temp["Z orthogonal Å coordinate"])}
-        atoms.append(temp_atom)
-
-    # calculate the center of mass in three x,y,z
-    center_of_mass = {"x":sum([x["x"]*x["mass"] for x in atoms])/sum([x["mass"] for x in atoms])
-                      ,"y":sum([x["y"]*x["mass"] for x in atoms])/sum([x["mass"] for x in atoms])
-                      ,"z":sum([x["z"]*x["mass"] for x in atoms])/sum([x["mass"] for x in atoms])}
-    # calculate the total mass of atoms
-    total_mass = sum([x["mass"] for x in atoms])
-
     # to calculate radius of gyration we need to follow the formula
     # the formula in format of [latex] =: R_\mathrm{gyr}^2 = \frac{1}{M}\sum_{i=1}^{N} m_i(\mathbf{r}_i - \mathbf{R})^2
-    for t in atoms:
-        atome_mass = t["mass"]
-        radius_of_gyration+=atome_mass*((t["x"]-center_of_mass["x"])**2+(t["y"]-center_of_mass["y"])**2+(t["z"]-center_of_mass["z"])**2)
-    # the division for 1/M
-    radius_of_gyration /= total_mass
-    # final sqrt
-    radius_of_gyration = math.sqrt(radius_of_gyration)
+    # which is expanded so the total mass, the center of mass R and Rg come out of a single pass, see _GyrationSums
+
+    if residues is not None:
+        residues = {(str(chain), str(number)) for chain, number in residues}
+    need_chain = by_chain or residues is not None
+
+    table = _as_atom_table(atom_lines)
+    if table is not None:
+        # on a parsed table the mass is looked up once per element category and the columns are walked as arrays
+        masses = [element_mass(element) for element in table.element.categories]
+        rows = zip(map(masses.__getitem__, table.element.codes),
+                   map(table.chain.categories.__getitem__, table.chain.codes) if need_chain
+                   else itertools.repeat(None),
+                   map(str, table.residue_number) if residues is not None else itertools.repeat(None),
+                   table.xyz())
+    else:
+        # set the required columns for template, coordinates are converted to float while extracting
+        temp_need = ["Element symbol", "Chain identifier", "Residue sequence number", "X orthogonal Å coordinate",
+                     "Y orthogonal Å coordinate", "Z orthogonal Å coordinate"]
+        rows = ((element_mass(element), chain, number, (x, y, z)) for element, chain, number, x, y, z in
+                _iter_rows(atom_lines, temp_need, {"X orthogonal Å coordinate": float,
+                                                   "Y orthogonal Å coordinate": float,
+                                                   "Z orthogonal Å coordinate": float}))
 
-    return radius_of_gyration
+    groups = {}
+    for m, chain, number, (x, y, z) in rows:
+        if residues is not None and (chain, number) not in residues:
+            continue
+        key = chain if by_chain else None
+        sums = groups.get(key)
+        if sums is None:
+            sums = groups[key] = _GyrationSums()
+        sums.add(m, x, y, z)
 
+    if by_chain:
+        return {chain: sums.result() for chain, sums in groups.items()}
+    return groups.get(None, _GyrationSums()).result()
 
-# Nothing to do here
-def print_function(pdb_file):
-    atom_lines = pdb_file_reader(pdb_file)
 
-    amino_acid_composition = amino_acid_composition_calculator(atom_lines)
-    amino_acid_composition_percentage = amino_acid_composition_percentage_calculator(atom_lines)
+def pdb_file_stream(pdb_file, record_types=("ATOM",)):
+    """
+        Generator variant of pdb_file_reader
 
-    amino_acid_hydrophobicity_composition = amino_acid_hydrophobicity_composition_calculator(amino_acid_composition,
-                                                                                             Kyte_Doolittle_scale)
-    amino_acid_hydrophobicity_composition_percentage = amino_acid_hydrophobicity_composition_percentage_calculator(
-        amino_acid_composition, Kyte_Doolittle_scale)
+        Parameters
+        ----------
+        pdb_file : str or file object
+            path to pdb file (plain or compressed), "-" for stdin, or an already open text stream
+
+        record_types : tuple
+            record types to yield, etc: ("ATOM", "HETATM"), water HETATM lines are skipped
+            like hetero_atom_pdb_reader does
+
+        Return
+        ----------
+        atom_lines : generator
+            generator of stripped atomic lines, read one at a time
+
+    """
+    record_types = tuple(record_types)
+    if isinstance(pdb_file, str):
+        with open_pdb(pdb_file) as f:
+            yield from pdb_file_stream(f, record_types)
+        return
+
+    for line in pdb_file:
+        if line.startswith(record_types):
+            if line.startswith("HETATM") and line[17:20] == "HOH":
+                continue
+            yield line.strip()
+        elif line.startswith("ENDMDL"):
+            # only the first model of an ensemble
+            return
+
+
+class StreamAccumulator:
+    # Base of the incremental calculators: lines are fed one by one with update() and result() gives the value
+    # the same calculator would return for all the lines seen so far
+    # every accumulator only looks at its own record type, so one stream of ATOM and HETATM lines can feed all of them
+
+    record_type = "ATOM"
+    columns = []
+    converters = None
+
+    def __init__(self):
+        self._extractor = RaminCalc.compile_template_pdb(RaminCalc.get_template_pdb(self.columns), self.converters)
+
+    def update(self, pdb_line):
+        if pdb_line.startswith(self.record_type):
+            self._add(*self._extractor.values(pdb_line))
+
+    def _add(self, *values):
+        raise NotImplementedError
+
+    def result(self):
+        raise NotImplementedError
+
+
+def stream_accumulate(atom_lines, accumulators):
+    """
+        Function to feed every accumulator in a single pass over a stream of lines
+
+        Parameters
+        ----------
+        atom_lines : iterable
+            atomic (and heteroatom) lines, etc: pdb_file_stream(path, ("ATOM", "HETATM"))
+
+        accumulators : list
+            list of StreamAccumulator
+
+        Return
+        ----------
+        results : list
+            result() of every accumulator, in the same order
+
+    """
+    updates = [accumulator.update for accumulator in accumulators]
+    for line in atom_lines:
+        for update in updates:
+            update(line)
+    return [accumulator.result() for accumulator in accumulators]
+
+
+class AminoAcidCompositionAccumulator(StreamAccumulator):
+    # incremental amino_acid_composition_calculator, keeps the set of residue keys and a count per residue name
+
+    columns = ["Residue name", "Chain identifier", "Residue sequence number", "Code for insertions of residues"]
+    converters = {"Residue sequence number": _to_int}
+
+    def __init__(self):
+        super().__init__()
+        self._seen = set()
+        self._counts = {}
+
+    def _add(self, residue_name, *key):
+        if key not in self._seen:
+            self._seen.add(key)
+            residue_name = residue_name.strip()
+            self._counts[residue_name] = self._counts.get(residue_name, 0) + 1
+
+    def result(self):
+        return dict(sorted(self._counts.items(), key=lambda x: x[1], reverse=True))
+
+    def percentage(self):
+        # same as amino_acid_composition_percentage_calculator
+        composition = self.result()
+        sum_all = sum(composition.values())
+        return {key: value * 100 / sum_all for key, value in composition.items()}
+
+
+class HeteroAtomResidueAccumulator(AminoAcidCompositionAccumulator):
+    # incremental hetero_atom_residue_counter, water is skipped
+
+    record_type = "HETATM"
+
+    def update(self, pdb_line):
+        if pdb_line.startswith("HETATM") and pdb_line[17:20] != "HOH":
+            self._add(*self._extractor.values(pdb_line))
+
+    def result(self):
+        return dict(self._counts)
+
+
+class AminoAcidChargeCompositionAccumulator(AminoAcidCompositionAccumulator):
+    # incremental amino_acid_charge_composition_calculator on top of the amino acid composition
+
+    def result(self):
+        return amino_acid_charge_composition_calculator(super().result())
+
+
+class AtomicCompositionAccumulator(StreamAccumulator):
+    # incremental atomic_composition_calculator
+
+    columns = ["Element symbol"]
+
+    def __init__(self):
+        super().__init__()
+        self._counts = {}
+
+    def _add(self, element):
+        self._counts[element] = self._counts.get(element, 0) + 1
+
+    def result(self):
+        return dict(sorted(self._counts.items(), key=lambda x: x[1], reverse=True))
+
+    def percentage(self):
+        # same as atomic_composition_percentage_calculator
+        sum_all = sum(self._counts.values())
+        return {key: value * 100 / sum_all for key, value in self.result().items()}
 
-    atomic_composition = atomic_composition_calculator(atom_lines)
-    atomic_composition_percentage = atomic_composition_percentage_calculator(atom_lines)
 
-    amino_acid_charge_compostion = amino_acid_charge_composition_calculator(amino_acid_composition)
+class RadiusOfGyrationAccumulator(StreamAccumulator):
+    # incremental radius_of_gyration_calculator in constant memory, on the same running sums
 
-    hetero_atom_composition = hetero_atom_residue_counter(hetero_atom_pdb_reader(pdb_file))
+    columns = ["Element symbol", "X orthogonal Å coordinate", "Y orthogonal Å coordinate",
+               "Z orthogonal Å coordinate"]
+    converters = {"X orthogonal Å coordinate": float, "Y orthogonal Å coordinate": float,
+                  "Z orthogonal Å coordinate": float}
 
-    most_distant_residues = most_distant_residue_finder(atom_lines)
+    def __init__(self):
+        super().__init__()
+        self._sums = _GyrationSums()
 
-    radius_of_gyration = radius_of_gyration_calculator(atom_lines)
+    def _add(self, element, x, y, z):
+        self._sums.add(element_mass(element), x, y, z)
 
-    print(f"Amino acid composition:")
+    def result(self):
+        return self._sums.result()
+
+
+def _parse_profiled(pdb_file, profiler):
+    # Structure.from_file as the "parse" stage, counting the lines read and the atoms parsed
+    with profiler.stage("parse"):
+        with open_pdb(pdb_file) as lines:
+            structure = Structure.from_file(profiler.counted(lines, "lines"))
+    profiler.count("atoms", len(structure.atoms))
+    profiler.count("heteroatoms", len(structure.heteroatoms))
+    return structure
+
+
+class AnalysisResult:
+    # Every metric print_function prints, as a typed record
+    # fields lists the (name, type) of the metrics in output order, the names are the calculator names without
+    # "_calculator" and the keys of analysis_record, a metric that can not be computed (etc: the most distant
+    # residues of a structure with a single CA atom) is None whatever its type
+
+    fields = (("atoms", int), ("amino_acid_composition", dict), ("amino_acid_composition_percentage", dict),
+              ("amino_acid_hydrophobicity_composition", dict),
+              ("amino_acid_hydrophobicity_composition_percentage", dict), ("atomic_composition", dict),
+              ("atomic_composition_percentage", dict), ("amino_acid_charge_composition", dict),
+              ("hetero_atom_composition", dict), ("most_distant_residues", list),
+              ("most_distant_residues_distance", float), ("radius_of_gyration", float))
+    __slots__ = tuple(name for name, _ in fields)
+
+    def __init__(self, **values):
+        for name, kind in self.fields:
+            value = values.pop(name)
+            setattr(self, name, float(value) if kind is float and value is not None else value)
+        if values:
+            raise TypeError(f"unknown fields: {', '.join(values)}")
+
+    @classmethod
+    def from_dict(cls, record):
+        # the result of an analysis_record, extra keys (etc: "file") are ignored
+        return cls(**{name: record[name] for name, _ in cls.fields})
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __eq__(self, other):
+        return isinstance(other, AnalysisResult) and self.as_dict() == other.as_dict()
+
+    def __repr__(self):
+        return (f"AnalysisResult(atoms={self.atoms}, most_distant_residues={self.most_distant_residues}, "
+                f"radius_of_gyration={self.radius_of_gyration!r})")
+
+    def to_json(self):
+        return json.dumps(self.as_dict())
+
+
+def analyze(pdb_file, profiler=None):
+    """
+        Function to compute every metric print_function prints
+
+        Parameters
+        ----------
+        pdb_file : str or Structure
+            path to pdb file or an already parsed Structure (or list of atomic lines, or AtomTable)
+
+        profiler : pdb_profile.Profiler
+            optional profiler recording the time of every stage
+
+        Return
+        ----------
+        result : AnalysisResult
+            the metrics, see write_results to serialize them
+
+    """
+    profiler = profiler or null_profiler
+    atom_lines = _parse_profiled(pdb_file, profiler) if isinstance(pdb_file, str) else pdb_file
+
+    with profiler.stage("composition"):
+        amino_acid_composition = amino_acid_composition_calculator(atom_lines)
+        amino_acid_composition_percentage = amino_acid_composition_percentage_calculator(atom_lines)
+        amino_acid_hydrophobicity_composition = amino_acid_hydrophobicity_composition_calculator(
+            amino_acid_composition, Kyte_Doolittle_scale)
+        amino_acid_hydrophobicity_composition_percentage = amino_acid_hydrophobicity_composition_percentage_calculator(
+            amino_acid_composition, Kyte_Doolittle_scale)
+
+    with profiler.stage("atomic composition"):
+        atomic_composition = atomic_composition_calculator(atom_lines)
+        atomic_composition_percentage = atomic_composition_percentage_calculator(atom_lines)
+
+    with profiler.stage("composition"):
+        amino_acid_charge_composition = amino_acid_charge_composition_calculator(amino_acid_composition)
+
+    with profiler.stage("hetero atoms"):
+        hetero_atom_composition = hetero_atom_residue_counter(atom_lines)
+
+    with profiler.stage("most distant residues"):
+        most_distant_residues = most_distant_residue_finder(atom_lines, fast=True)
+
+    with profiler.stage("radius of gyration"):
+        radius_of_gyration = radius_of_gyration_calculator(atom_lines)
+
+    return AnalysisResult(
+        atoms=len(atom_lines),
+        amino_acid_composition=amino_acid_composition,
+        amino_acid_composition_percentage=amino_acid_composition_percentage,
+        amino_acid_hydrophobicity_composition=amino_acid_hydrophobicity_composition,
+        amino_acid_hydrophobicity_composition_percentage=amino_acid_hydrophobicity_composition_percentage,
+        atomic_composition=atomic_composition,
+        atomic_composition_percentage=atomic_composition_percentage,
+        amino_acid_charge_composition=amino_acid_charge_composition,
+        hetero_atom_composition=hetero_atom_composition,
+        most_distant_residues=list(most_distant_residues[0]),
+        most_distant_residues_distance=most_distant_residues[1],
+        radius_of_gyration=radius_of_gyration)
+
+
+def analysis_record(pdb_file, profiler=None):
+    """
+        Function to compute every metric print_function prints as one machine-readable record
+
+        Parameters
+        ----------
+        pdb_file : str or Structure
+            path to pdb file or an already parsed Structure
+
+        profiler : pdb_profile.Profiler
+            optional profiler recording the time of every stage
+
+        Return
+        ----------
+        record : dictionary
+            JSON serializable dictionary of the metrics, keys are the calculator names without "_calculator"
+
+    """
+    return analyze(pdb_file, profiler).as_dict()
+
+
+# output formats of write_results and of the command line (--format)
+output_formats = ["text", "json", "csv", "columnar"]
+
+
+def _column_type(kind):
+    # Arrow-style type name of a result field
+    return {int: "int64", float: "float64", dict: "map<string, number>", list: "list<string>"}[kind]
+
+
+def result_columns(results, keys=("file",)):
+    """
+        Function to turn results into columns
+
+        Parameters
+        ----------
+        results : list
+            list of AnalysisResult or of analysis records (dictionaries)
+
+        keys : tuple
+            extra record keys put in front of the metric columns, missing ones are None
+
+        Return
+        ----------
+        batch : dictionary
+            {"schema": [{"name", "type"}], "length": number of results, "columns": {name: list of values}}
+
+    """
+    names = list(keys) + [name for name, _ in AnalysisResult.fields]
+    columns = {name: [] for name in names}
+    length = 0
+    for result in results:
+        record = result.as_dict() if isinstance(result, AnalysisResult) else result
+        for name in names:
+            columns[name].append(record.get(name))
+        length += 1
+    schema = [{"name": name, "type": "string"} for name in keys] + \
+             [{"name": name, "type": _column_type(kind)} for name, kind in AnalysisResult.fields]
+    return {"schema": schema, "length": length, "columns": columns}
+
+
+def write_results(results, file=None, output_format="json", batch_size=1024):
+    """
+        Function to serialize results one by one as they come
+
+        Parameters
+        ----------
+        results : iterable
+            AnalysisResult objects or analysis records (dictionaries, etc: with a "file" key), a generator is
+            consumed lazily and never held in memory
+
+        file : file object
+            text stream written to, stdout by default
+
+        output_format : str
+            "text" (the print_function report), "json" (one JSON object per line), "csv" (a header and one row
+            per result, nested values as JSON text) or "columnar" (one JSON record batch of at most batch_size
+            results per line, see result_columns)
+
+        batch_size : int
+            results per record batch of the columnar format
+
+        Return
+        ----------
+        count : int
+            number of results written
+
+    """
+    file = file if file is not None else sys.stdout
+    count = 0
+    if output_format == "columnar":
+        iterator = iter(results)
+        while True:
+            batch = list(itertools.islice(iterator, batch_size))
+            if not batch:
+                return count
+            file.write(json.dumps(result_columns(batch)) + "\n")
+            count += len(batch)
+    writer = None
+    for result in results:
+        if output_format == "text":
+            if count:
+                print(file=file)
+            if not isinstance(result, AnalysisResult):
+                if "file" in result:
+                    print(f"{result['file']}:", file=file)
+                result = AnalysisResult.from_dict(result)
+            _print_results(result.amino_acid_composition, result.amino_acid_composition_percentage,
+                           result.amino_acid_hydrophobicity_composition,
+                           result.amino_acid_hydrophobicity_composition_percentage, result.atomic_composition,
+                           result.atomic_composition_percentage, result.amino_acid_charge_composition,
+                           result.hetero_atom_composition,
+                           (result.most_distant_residues, result.most_distant_residues_distance),
+                           result.radius_of_gyration, file)
+        elif output_format == "json":
+            file.write((result.to_json() if isinstance(result, AnalysisResult) else json.dumps(result)) + "\n")
+        elif output_format == "csv":
+            if writer is None:
+                writer = csv.writer(file)
+                writer.writerow(["file"] + [name for name, _ in AnalysisResult.fields])
+            record = result.as_dict() if isinstance(result, AnalysisResult) else result
+            writer.writerow([json.dumps(value) if isinstance(value, (dict, list)) else value
+                             for value in map(record.get, ["file"] + list(AnalysisResult.__slots__))])
+        else:
+            raise ValueError(f"unknown output format {output_format!r}, expected one of {output_formats}")
+        count += 1
+    return count
+
+
+# Nothing to do here
+def print_function(pdb_file, profiler=None, output_format="text"):
+    # the file is read and parsed once, every calculator shares the parsed structure and its memoized results
+    # with a profiler (see pdb_profile.Profiler) the time of every stage and the lines and atoms are recorded
+    # output_format is one of output_formats, see write_results
+    result = analyze(pdb_file, profiler)
+    with (profiler or null_profiler).stage("output"):
+        if output_format == "text":
+            write_results([result], output_format="text")
+        else:
+            write_results([{"file": pdb_file if isinstance(pdb_file, str) else None, **result.as_dict()}],
+                          output_format=output_format)
+
+
+def _print_results(amino_acid_composition, amino_acid_composition_percentage, amino_acid_hydrophobicity_composition,
+                   amino_acid_hydrophobicity_composition_percentage, atomic_composition,
+                   atomic_composition_percentage, amino_acid_charge_compostion, hetero_atom_composition,
+                   most_distant_residues, radius_of_gyration, file=None):
+    print(f"Amino acid composition:", file=file)
     for amino_acid in amino_acid_composition.keys():
         print(
-            f"{str(amino_acid)} {str(amino_acid_composition[amino_acid])} {amino_acid_composition_percentage[amino_acid]:.2f}%")
+            f"{str(amino_acid)} {str(amino_acid_composition[amino_acid])} {amino_acid_composition_percentage[amino_acid]:.2f}%", file=file)
 
-    print(f"\nAmino acids composition categorized on the basis of hydrophobicity:")
+    print(f"\nAmino acids composition categorized on the basis of hydrophobicity:", file=file)
     for hydrophobicity in amino_acid_hydrophobicity_composition.keys():
         print(
-            f"{str(hydrophobicity)} {str(amino_acid_hydrophobicity_composition[hydrophobicity])} {amino_acid_hydrophobicity_composition_percentage[hydrophobicity]:.2f}%")
+            f"{str(hydrophobicity)} {str(amino_acid_hydrophobicity_composition[hydrophobicity])} {amino_acid_hydrophobicity_composition_percentage[hydrophobicity]:.2f}%", file=file)
 
-    print(f"\nAtomic composition:")
+    print(f"\nAtomic composition:", file=file)
     for atom in atomic_composition.keys():
-        print(f"{atom} {atomic_composition[atom]} {atomic_composition_percentage[atom]:.2f}%")
+        print(f"{atom} {atomic_composition[atom]} {atomic_composition_percentage[atom]:.2f}%", file=file)
 
-    print("\nCharge composition of protein:")
-    print(f"Positively Charged Residues: {str(amino_acid_charge_compostion['Positive'])}")
-    print(f"Negatively Charged Residues: {str(amino_acid_charge_compostion['Negative'])}")
+    print("\nCharge composition of protein:", file=file)
+    print(f"Positively Charged Residues: {str(amino_acid_charge_compostion['Positive'])}", file=file)
+    print(f"Negatively Charged Residues: {str(amino_acid_charge_compostion['Negative'])}", file=file)
 
-    print(f"\nNumber of heteroatoms: {len(hetero_atom_composition.keys())}")
+    print(f"\nNumber of heteroatoms: {len(hetero_atom_composition.keys())}", file=file)
     for heteroatom in hetero_atom_composition.keys():
-        print(f"{heteroatom} : {hetero_atom_composition[heteroatom]}")
+        print(f"{heteroatom} : {hetero_atom_composition[heteroatom]}", file=file)
 
-    print(
-        f"\nDistance between most distant residues {most_distant_residues[0][0]} and {most_distant_residues[0][1]} is {most_distant_residues[1]:.2f} Angstrom")
+    if most_distant_residues[1] is None:
+        # fewer than two CA atoms
+        print("\nDistance between most distant residues: not available", file=file)
+    else:
+        print(
+            f"\nDistance between most distant residues {most_distant_residues[0][0]} and {most_distant_residues[0][1]} is {most_distant_residues[1]:.2f} Angstrom", file=file)
 
-    print(f"\nRadius of gyration: {radius_of_gyration:.2f}")
+    print(f"\nRadius of gyration: {radius_of_gyration:.2f}", file=file)
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python pdb_parser.py <path_to_pdb_file>")
+    if len(sys.argv) >= 2 and sys.argv[1] == "batch":
+        # batch mode lives in its own module, see pdb_batch.py
+        import pdb_batch
+        sys.exit(pdb_batch.main(sys.argv[2:]))
+    if len(sys.argv) >= 2 and sys.argv[1] == "serve":
+        # long-running JSON service, see pdb_service.py
+        import pdb_service
+        sys.exit(pdb_service.main(sys.argv[2:]))
+    arguments = sys.argv[1:]
+    output_format = "text"
+    for index, argument in enumerate(arguments):
+        if argument.startswith("--format"):
+            output_format = argument.partition("=")[2] or (arguments[index + 1] if index + 1 < len(arguments) else "")
+            del arguments[index:index + (1 if "=" in argument else 2)]
+            break
+    pdb_files = [argument for argument in arguments if not argument.startswith("--")]
+    if not pdb_files or output_format not in output_formats:
+        print("Usage: python pdb_parser.py <path_to_pdb_file|path.pdb.gz|-> [...] [--format text|json|csv|columnar]")
+        print("                            [--profile] [--profile-memory]")
+        print("       python pdb_parser.py batch <directory|glob|manifest> -o <results.jsonl>")
+        print("       python pdb_parser.py serve [--port 8765 | --unix <path.sock>] [--workers N]")
         print("Example: python pdb_parser.py 1FCN.pdb")
         sys.exit(1)
-    print_function(sys.argv[1])
+    options = [argument for argument in arguments if argument.startswith("--profile")]
+    # per-stage timing (and peak memory) on stderr, after the results
+    profiler = Profiler(memory="--profile-memory" in options) if options else None
+    if len(pdb_files) == 1:
+        print_function(pdb_files[0], profiler, output_format)
+    else:
+        # several files are analyzed and written one at a time
+        write_results(({"file": pdb_file, **analysis_record(pdb_file, profiler)} for pdb_file in pdb_files),
+                      output_format=output_format)
+    if profiler is not None:
+        profiler.report()
@@ -0,0 +1,121 @@
+import sys
+import time
+import contextlib
+import tracemalloc
+
+"""
+Lightweight per-stage profiling of the parser
+
+A Profiler collects the wall time (and optionally the peak traced memory) of named stages and named counters,
+etc: lines read and atoms parsed. Code that is profiled takes profiler=None and uses null_profiler instead, whose
+stages and counters do nothing, so profiling costs nothing measurable when it is off.
+"""
+
+
+class Profiler:
+    # Registry of stage timers and counters
+    # stages keep the order they first ran in, a stage that runs again adds to its time and calls
+
+    def __init__(self, memory=False, callback=None):
+        """
+            Parameters
+            ----------
+            memory : bool
+                also record the peak traced memory of every stage (tracemalloc, slows the stages down)
+
+            callback : callable
+                called as callback(name, seconds, peak_bytes) when a stage ends, peak_bytes is None without memory
+        """
+        self.memory = memory
+        self.callback = callback
+        # key: stage name, value: {"seconds", "calls", "peak_bytes"}
+        self.stages = {}
+        # key: counter name, value: count
+        self.counters = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        # time the body of a with block as the named stage
+        started_tracing = False
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            seconds = time.perf_counter() - start
+            peak = None
+            if self.memory:
+                peak = tracemalloc.get_traced_memory()[1] - base
+                if started_tracing:
+                    tracemalloc.stop()
+            record = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0, "peak_bytes": None})
+            record["seconds"] += seconds
+            record["calls"] += 1
+            if peak is not None:
+                record["peak_bytes"] = max(record["peak_bytes"] or 0, peak)
+            if self.callback is not None:
+                self.callback(name, seconds, peak)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def counted(self, iterable, name):
+        # pass the items of iterable through, counting them under name
+        for item in iterable:
+            self.counters[name] = self.counters.get(name, 0) + 1
+            yield item
+
+    def as_dict(self):
+        return {"stages": {name: dict(record) for name, record in self.stages.items()},
+                "counters": dict(self.counters), "max_rss_bytes": max_rss_bytes()}
+
+    def report(self, file=None):
+        # print a table of the stages and the counters
+        file = file if file is not None else sys.stderr
+        total = sum(record["seconds"] for record in self.stages.values()) or 1.0
+        print(f"{'stage':<28} {'seconds':>9} {'share':>6} {'calls':>6} {'peak MiB':>9}", file=file)
+        for name, record in self.stages.items():
+            peak = "" if record["peak_bytes"] is None else f"{record['peak_bytes'] / 2 ** 20:9.1f}"
+            print(f"{name:<28} {record['seconds']:9.4f} {record['seconds'] / total:6.1%} {record['calls']:>6} "
+                  f"{peak:>9}", file=file)
+        for name, count in self.counters.items():
+            print(f"{name:<28} {count:>9,}", file=file)
+        rss = max_rss_bytes()
+        if rss is not None:
+            print(f"{'max resident memory':<28} {rss / 2 ** 20:9.1f} MiB", file=file)
+
+
+class _NullProfiler:
+    # Profiler with the same interface that records nothing
+
+    memory = False
+    callback = None
+    _stage = contextlib.nullcontext()
+
+    def stage(self, name):
+        return self._stage
+
+    def count(self, name, n=1):
+        pass
+
+    def counted(self, iterable, name):
+        return iterable
+
+
+null_profiler = _NullProfiler()
+
+
+def max_rss_bytes():
+    # high-water mark of the resident memory of the process, None where the resource module is missing
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == "darwin" else rss * 1024
@@ -0,0 +1,292 @@
+import math
+import functools
+import itertools
+import concurrent.futures
+from array import array
+
+from pdb_parser import AtomTable, Structure, _as_atom_table, _structure_cached
+from pdb_spatial import CellList
+
+"""
+Solvent accessible surface area (Shrake & Rupley, 1973)
+
+Every atom is a sphere of its van der Waals radius grown by the radius of the solvent probe, covered with evenly
+spread test points. A point is accessible when it lies inside no other grown sphere, and the area of an atom is the
+area of its sphere times the accessible fraction of its points.
+
+The atoms are binned in a cell list with cells as wide as the largest possible overlap, so only the 27 cells around
+an atom are searched for the spheres overlapping it and the cost grows linearly with the atoms. The overlapping
+spheres are tested nearest first and the sphere that covered the previous point is tried first on the next one, as
+neighboring points are mostly covered by the same sphere. The atoms of every chain can be measured in their own
+process, each against the whole structure.
+"""
+
+# radius (Å) of the solvent probe, a water molecule
+probe_radius = 1.4
+# van der Waals radii (Å) by element symbol (Bondi, 1964), other elements get default_radius
+vdw_radii = {"H": 1.10, "C": 1.70, "N": 1.55, "O": 1.52, "F": 1.47, "P": 1.80, "S": 1.80, "Cl": 1.75,
+             "Se": 1.90, "Br": 1.85, "I": 1.98, "Na": 2.27, "K": 2.75, "Mg": 1.73, "Ca": 2.31, "Fe": 2.00,
+             "Zn": 1.39, "Cu": 1.40, "Mn": 2.00}
+default_radius = 1.80
+# largest accessible area (Å²) of every residue in a Gly-X-Gly tripeptide (theoretical values of Tien et al., 2013),
+# the area of a residue is divided by it to give its relative exposure
+max_residue_area = {"ALA": 129.0, "ARG": 274.0, "ASN": 195.0, "ASP": 193.0, "CYS": 167.0, "GLN": 225.0,
+                    "GLU": 223.0, "GLY": 104.0, "HIS": 224.0, "ILE": 197.0, "LEU": 201.0, "LYS": 236.0,
+                    "MET": 224.0, "PHE": 240.0, "PRO": 159.0, "SER": 155.0, "THR": 172.0, "TRP": 285.0,
+                    "TYR": 263.0, "VAL": 174.0}
+
+
+@functools.lru_cache(maxsize=16)
+def sphere_points(n_points=100):
+    """
+        Function to spread points evenly over the unit sphere (golden section spiral)
+
+        Parameters
+        ----------
+        n_points : int
+            number of points
+
+        Return
+        ----------
+        points : tuple
+            tuple of (x, y, z) unit vectors
+
+    """
+    if n_points < 1:
+        raise ValueError("n_points must be positive")
+    increment = math.pi * (3.0 - math.sqrt(5.0))
+    points = []
+    for k in range(n_points):
+        z = 1.0 - (2.0 * k + 1.0) / n_points
+        r = math.sqrt(1.0 - z * z)
+        points.append((r * math.cos(increment * k), r * math.sin(increment * k), z))
+    return tuple(points)
+
+
+def atom_radius(element, atom_name="", radii=None):
+    """
+        Function to find the van der Waals radius of an atom
+
+        Parameters
+        ----------
+        element : str
+            element symbol as written in the PDB columns 77-78, etc: C, FE, Zn
+
+        atom_name : str
+            atom name, its first letter is the element when the element columns are blank
+
+        radii : dictionary
+            radii by element symbol, vdw_radii by default
+
+        Return
+        ----------
+        radius : float
+            radius in Å, default_radius for unknown elements
+
+    """
+    radii = vdw_radii if radii is None else radii
+    element = element.strip() or atom_name.strip().lstrip("0123456789")[:1]
+    radius = radii.get(element)
+    if radius is None:
+        radius = radii.get(element.capitalize(), default_radius)
+    return radius
+
+
+def _atom_areas(coordinates, radii, targets, n_points):
+    # accessible areas of the atoms at targets, radii are the grown radii of all the atoms
+    points = sphere_points(n_points)
+    largest = max(radii)
+    cells = CellList(coordinates, 2.0 * largest)
+    xs, ys, zs = (coordinates[axis::3].tolist() for axis in range(3))
+    wanted = bytearray(len(radii))
+    for index in targets:
+        wanted[index] = 1
+    areas = {}
+    for (ci, cj, ck), members in cells.cells.items():
+        members = [index for index in members if wanted[index]]
+        if not members:
+            continue
+        # every sphere overlapping an atom of this cell has its center in the 27 cells around it
+        block = []
+        for i in (ci - 1, ci, ci + 1):
+            for j in (cj - 1, cj, cj + 1):
+                for k in (ck - 1, ck, ck + 1):
+                    others = cells.cells.get((i, j, k))
+                    if others is not None:
+                        block.extend((other, xs[other], ys[other], zs[other], radii[other]) for other in others)
+        for index in members:
+            x, y, z, radius = xs[index], ys[index], zs[index], radii[index]
+            # centers of the overlapping spheres relative to the atom, nearest first
+            overlapping = []
+            for other, x2, y2, z2, radius2 in block:
+                dx, dy, dz = x2 - x, y2 - y, z2 - z
+                d2 = dx * dx + dy * dy + dz * dz
+                reach = radius + radius2
+                if d2 < reach * reach and other != index:
+                    overlapping.append((d2, dx, dy, dz, radius2 * radius2))
+            overlapping.sort()
+            spheres = [sphere[1:] for sphere in overlapping]
+            accessible = 0
+            last = spheres[0] if spheres else None
+            for ux, uy, uz in points:
+                px, py, pz = ux * radius, uy * radius, uz * radius
+                if last is not None:
+                    dx, dy, dz, r2 = last
+                    dx, dy, dz = px - dx, py - dy, pz - dz
+                    if dx * dx + dy * dy + dz * dz < r2:
+                        continue
+                for sphere in spheres:
+                    dx, dy, dz, r2 = sphere
+                    dx, dy, dz = px - dx, py - dy, pz - dz
+                    if dx * dx + dy * dy + dz * dz < r2:
+                        last = sphere
+                        break
+                else:
+                    accessible += 1
+            areas[index] = 4.0 * math.pi * radius * radius * accessible / n_points
+    return [areas[index] for index in targets]
+
+
+@_structure_cached
+def atom_sasa(atom_lines, n_points=100, probe=probe_radius, radii=None, workers=None):
+    """
+        Function to compute the solvent accessible surface area of every atom (Shrake-Rupley)
+
+        Parameters
+        ----------
+        atom_lines : list
+            list of atomic lines, an AtomTable or a Structure (its ATOM records)
+
+        n_points : int
+            test points on the sphere of every atom, more points give more precise areas
+
+        probe : float
+            radius of the solvent probe in Å
+
+        radii : dictionary
+            van der Waals radii by element symbol, vdw_radii by default
+
+        workers : int
+            processes measuring the chains in parallel, None or 1 measures every chain in this process
+
+        Return
+        ----------
+        areas : array
+            array('d') of the accessible area in Å² of every atom, in the order of the atoms
+
+    """
+    table = _as_atom_table(atom_lines)
+    if table is None:
+        table = AtomTable.from_lines(atom_lines)
+    if not len(table):
+        return array("d")
+    # grown radius of every atom, looked up once per element, atoms without an element symbol get the radius of
+    # the first letter of their name
+    by_element = [atom_radius(element, radii=radii) + probe if element.strip() else None
+                  for element in table.element.categories]
+    names = table.name.categories
+    grown = [by_element[element] if by_element[element] is not None else atom_radius("", names[name], radii) + probe
+             for element, name in zip(table.element.codes, table.name.codes)]
+
+    chains = [range(len(table))]
+    if workers is not None and workers > 1:
+        # atom indices of every chain
+        index = table.residues()
+        members = {}
+        for (chain, _, _), start, stop in zip(index.keys, index.starts, index.stops):
+            members.setdefault(chain, []).extend(range(start, stop))
+        chains = list(members.values())
+    if len(chains) == 1:
+        results = [_atom_areas(table.coordinates, grown, chains[0], n_points)]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(min(workers, len(chains))) as executor:
+            results = list(executor.map(_atom_areas, itertools.repeat(table.coordinates), itertools.repeat(grown),
+                                        chains, itertools.repeat(n_points)))
+    areas = array("d", bytes(8 * len(table)))
+    for targets, values in zip(chains, results):
+        for index, value in zip(targets, values):
+            areas[index] = value
+    return areas
+
+
+@_structure_cached
+def residue_sasa(atom_lines, **options):
+    """
+        Function to compute the solvent accessible surface area of every residue
+
+        Parameters
+        ----------
+        atom_lines : list
+            list of atomic lines, an AtomTable or a Structure (its ATOM records)
+
+        options : keyword arguments
+            n_points, probe, radii and workers of atom_sasa
+
+        Return
+        ----------
+        residue_areas : dictionary
+            key: (chain, residue sequence number, insertion code)
+            value: (residue name, area in Å², relative exposure: area / max_residue_area, None for unknown residues)
+
+    """
+    table = _as_atom_table(atom_lines)
+    if table is None:
+        table = AtomTable.from_lines(atom_lines)
+    # a Structure keeps the atom areas too
+    areas = atom_sasa(atom_lines if isinstance(atom_lines, Structure) else table, **options)
+    index = table.residues()
+    residue_areas = {}
+    for key, name, runs in index.runs():
+        # a residue split by other atoms adds up the areas of all its runs
+        area = sum(sum(areas[run.start:run.stop]) for run in runs)
+        largest = max_residue_area.get(name)
+        residue_areas[key] = (name, area, None if largest is None else area / largest)
+    return residue_areas
+
+
+def surface_hydrophobicity(atom_lines, Kyte_Doolittle_scale, **options):
+    """
+        Function to summarize the hydrophobicity of the solvent exposed residues
+
+        Parameters
+        ----------
+        atom_lines : list
+            list of atomic lines, an AtomTable or a Structure (its ATOM records)
+
+        Kyte_Doolittle_scale : dictionary
+            dictionary of kyte doolittle hydrophobicity values
+
+        options : keyword arguments
+            n_points, probe, radii and workers of atom_sasa
+
+        Return
+        ----------
+        summary : dictionary
+            "total_area": accessible area of all residues (Å²)
+            "Hydrophobic" and "Hydrophilic": accessible area of the residues with a positive and a negative value
+            "mean_hydrophobicity": mean value of the residues of the scale
+            "exposure_weighted_hydrophobicity": mean value weighted by the relative exposure of the residues,
+            None when no residue of the scale is exposed
+
+    """
+    residue_areas = residue_sasa(atom_lines, **options)
+    summary = {"total_area": 0.0, "Hydrophobic": 0.0, "Hydrophilic": 0.0}
+    values = 0.0
+    weighted = 0.0
+    weights = 0.0
+    counted = 0
+    for name, area, exposure in residue_areas.values():
+        summary["total_area"] += area
+        value = Kyte_Doolittle_scale.get(name)
+        if value is None:
+            continue
+        summary["Hydrophobic" if value > 0 else "Hydrophilic"] += area
+        values += value
+        counted += 1
+        # relative exposure above 1 (a terminal residue) counts as fully exposed
+        exposure = min(exposure if exposure is not None else 1.0, 1.0)
+        weighted += value * exposure
+        weights += exposure
+    summary["mean_hydrophobicity"] = values / counted if counted else None
+    summary["exposure_weighted_hydrophobicity"] = weighted / weights if weights else None
+    return summary
@@ -0,0 +1,285 @@
+import re
+import itertools
+import functools
+
+from pdb_parser import AtomTable, Structure
+from pdb_spatial import CellList
+
+"""
+Atom selection mini-language
+
+    chain A and name CA
+    resname LIG around 5
+    element C N O and bfactor < 50
+    not (water or hetero) and resid 10-20 25
+
+A query is parsed once into a tree and evaluated over the columns of an AtomTable into a mask with one byte (0 or
+1) per atom. The masks are combined as big integers, so and, or and not cost one C level operation each, and the
+mask of every query is cached on the table until an atom is appended.
+"""
+
+# text keywords and the AtomTable categorical they compare, several values match any of them
+text_keywords = {"chain": "chain", "name": "name", "resname": "residue_name", "element": "element",
+                 "altloc": "altloc", "icode": "insertion_code", "segid": "segment", "record": "record_type"}
+# numeric keywords, compared with < <= > >= == != or matched against values and ranges (etc: resid 10-20 25)
+numeric_keywords = {"resid": "residue_number", "serial": "serial", "bfactor": "b_factor", "occupancy": "occupancy",
+                    "x": 0, "y": 1, "z": 2}
+# keywords selecting a fixed group of atoms
+group_keywords = {"all": ("all",), "none": ("none",), "protein": ("text", "record_type", frozenset(["ATOM"])),
+                  "hetero": ("text", "record_type", frozenset(["HETATM"])),
+                  "water": ("text", "residue_name", frozenset(["HOH", "WAT"]))}
+_reserved = {"and", "or", "not", "around", "(", ")"}
+_comparisons = {"<": "__gt__", "<=": "__ge__", ">": "__lt__", ">=": "__le__", "==": "__eq__", "=": "__eq__",
+                "!=": "__ne__"}
+_token = re.compile(r"\s*(<=|>=|==|!=|[<>=()]|[^\s<>=!()]+)")
+
+
+def _tokenize(query):
+    tokens = []
+    position = 0
+    query = query.strip()
+    while position < len(query):
+        match = _token.match(query, position)
+        if match is None:
+            raise ValueError(f"can not read the selection at: {query[position:]!r}")
+        tokens.append(match.group(1))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    # recursive descent parser, precedence from loose to tight: or, and, not, around, keyword
+
+    def __init__(self, query):
+        self.query = query
+        self.tokens = _tokenize(query)
+        self.position = 0
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self, expected=None):
+        token = self.peek()
+        if token is None or (expected is not None and token != expected):
+            raise ValueError(f"expected {expected or 'more'} in selection {self.query!r}")
+        self.position += 1
+        return token
+
+    def parse(self):
+        tree = self.parse_or()
+        if self.peek() is not None:
+            raise ValueError(f"unexpected {self.peek()!r} in selection {self.query!r}")
+        return tree
+
+    def parse_or(self):
+        tree = self.parse_and()
+        while self.peek() == "or":
+            self.take()
+            tree = ("or", tree, self.parse_and())
+        return tree
+
+    def parse_and(self):
+        tree = self.parse_not()
+        while self.peek() == "and":
+            self.take()
+            tree = ("and", tree, self.parse_not())
+        return tree
+
+    def parse_not(self):
+        if self.peek() == "not":
+            self.take()
+            return ("not", self.parse_not())
+        tree = self.parse_primary()
+        while self.peek() == "around":
+            self.take()
+            tree = ("around", tree, self.number())
+        return tree
+
+    def number(self):
+        token = self.take()
+        try:
+            return float(token)
+        except ValueError:
+            raise ValueError(f"expected a number, not {token!r} in selection {self.query!r}") from None
+
+    def values(self):
+        # the words up to the next operator or keyword
+        values = []
+        while self.peek() is not None and self.peek() not in _reserved and self.peek() not in _comparisons \
+                and self.peek() not in text_keywords and self.peek() not in numeric_keywords \
+                and self.peek() not in group_keywords:
+            values.append(self.take())
+        if not values:
+            raise ValueError(f"expected values in selection {self.query!r}")
+        return values
+
+    def parse_primary(self):
+        token = self.take()
+        if token == "(":
+            tree = self.parse_or()
+            self.take(")")
+            return tree
+        if token in group_keywords:
+            return group_keywords[token]
+        if token in text_keywords:
+            return ("text", text_keywords[token], frozenset(self.values()))
+        if token in numeric_keywords:
+            column = numeric_keywords[token]
+            if self.peek() in _comparisons:
+                return ("compare", column, _comparisons[self.take()], self.number())
+            # single values and inclusive ranges written as 10-20 or 10:20
+            accepted = set()
+            for value in self.values():
+                # the range separator is ":" or a "-" that is not the sign of the first number
+                head, separator, last = value[1:].partition(":" if ":" in value else "-")
+                try:
+                    if separator:
+                        accepted.update(range(int(value[0] + head), int(last) + 1))
+                    else:
+                        accepted.add(float(value))
+                except ValueError:
+                    raise ValueError(f"expected numbers, not {value!r} in selection {self.query!r}") from None
+            return ("in", column, frozenset(accepted))
+        raise ValueError(f"unknown keyword {token!r} in selection {self.query!r}")
+
+
+def _column(table, column):
+    # numeric column of a table, the coordinate axes are given as 0, 1 and 2
+    return table.coordinates[column::3] if isinstance(column, int) else getattr(table, column)
+
+
+def _evaluate(tree, table, n, ones):
+    # mask of a tree as an integer with one byte (0 or 1) per atom, atom 0 in the lowest byte
+    kind = tree[0]
+    if kind == "all":
+        return ones
+    if kind == "none":
+        return 0
+    if kind == "and":
+        return _evaluate(tree[1], table, n, ones) & _evaluate(tree[2], table, n, ones)
+    if kind == "or":
+        return _evaluate(tree[1], table, n, ones) | _evaluate(tree[2], table, n, ones)
+    if kind == "not":
+        return _evaluate(tree[1], table, n, ones) ^ ones
+    if kind == "text":
+        categorical = getattr(table, tree[1])
+        lookup = [category.strip() in tree[2] for category in categorical.categories]
+        mask = bytes(map(lookup.__getitem__, categorical.codes))
+    elif kind == "compare":
+        _, column, comparison, value = tree
+        mask = bytes(map(getattr(value, comparison), _column(table, column)))
+    elif kind == "in":
+        mask = bytes(map(tree[2].__contains__, _column(table, tree[1])))
+    elif kind == "around":
+        inner = _evaluate(tree[1], table, n, ones)
+        radius = tree[2]
+        cells = table.derived().get(("cells", radius))
+        if cells is None:
+            cells = table.derived()[("cells", radius)] = CellList(table.coordinates, max(radius, 1.0))
+        selected = bytearray(n)
+        for index in itertools.compress(range(n), inner.to_bytes(n, "little")):
+            for neighbor in cells.query_radius(cells.point(index), radius):
+                selected[neighbor] = 1
+        # the atoms around the selection, without the selection itself
+        return int.from_bytes(selected, "little") & (inner ^ ones)
+    else:
+        raise ValueError(f"unknown selection node {kind!r}")
+    return int.from_bytes(mask, "little")
+
+
+def _as_table(atom_lines):
+    # the table a selection is evaluated on, a Structure is searched with its ATOM and HETATM records together
+    if isinstance(atom_lines, Structure):
+        return atom_lines.all_atoms()
+    if isinstance(atom_lines, AtomTable):
+        return atom_lines
+    return AtomTable.from_lines(atom_lines)
+
+
+class Selection:
+    # Compiled selection query, evaluated into masks over any table
+
+    def __init__(self, query):
+        """
+            Parameters
+            ----------
+            query : str
+                selection query, see the module docstring
+        """
+        self.query = query
+        self.tree = _Parser(query).parse()
+
+    def __repr__(self):
+        return f"Selection({self.query!r})"
+
+    def mask(self, atom_lines):
+        """
+            Function to evaluate the selection
+
+            Parameters
+            ----------
+            atom_lines : list
+                list of atomic lines, an AtomTable or a Structure (ATOM and HETATM records in this order)
+
+            Return
+            ----------
+            mask : bytes
+                one byte per atom, 1 for the selected atoms
+
+        """
+        table = _as_table(atom_lines)
+        key = ("selection", self.tree)
+        mask = table.derived().get(key)
+        if mask is None:
+            n = len(table)
+            value = _evaluate(self.tree, table, n, int.from_bytes(b"\x01" * n, "little"))
+            mask = table.derived()[key] = value.to_bytes(n, "little")
+        return mask
+
+    def indices(self, atom_lines):
+        # indices of the selected atoms
+        mask = self.mask(atom_lines)
+        return list(itertools.compress(range(len(mask)), mask))
+
+    def __call__(self, atom_lines):
+        # the selected atoms as a new AtomTable, accepted by every calculator
+        return _as_table(atom_lines).take(self.indices(atom_lines))
+
+
+@functools.lru_cache(maxsize=256)
+def compile_selection(query):
+    """
+        Function to compile a selection query, the same query is compiled only once
+
+        Parameters
+        ----------
+        query : str
+            selection query, etc: "chain A and name CA", "resname LIG around 5"
+
+        Return
+        ----------
+        selection : Selection
+
+    """
+    return Selection(query)
+
+
+def select(atom_lines, query):
+    """
+        Function to select atoms with a query
+
+        Parameters
+        ----------
+        atom_lines : list
+            list of atomic lines, an AtomTable or a Structure
+
+        query : str
+            selection query, etc: "element C N O and bfactor < 50"
+
+        Return
+        ----------
+        table : AtomTable
+            the selected atoms, pass it to any calculator, etc: radius_of_gyration_calculator(select(s, "chain A"))
+
+    """
+    return compile_selection(query)(atom_lines)
@@ -0,0 +1,339 @@
+import io
+import os
+import sys
+import json
+import time
+import hashlib
+import asyncio
+import argparse
+import collections
+import concurrent.futures
+
+from pdb_parser import Structure, analysis_record
+
+"""
+Long-running analysis service
+
+Usage: python pdb_service.py [--host 127.0.0.1] [--port 8765 | --unix path.sock] [--workers N]
+       python pdb_parser.py serve [...]
+
+Keeps the interpreter and the parser loaded and answers HTTP requests with JSON, so a structure costs an
+analysis instead of a process start, the imports and scraping the text of print_function:
+
+    POST /analyze   {"path": "1FCN.pdb"} or {"content": "ATOM ..."}, answers the analysis_record of the structure
+    GET  /stats     request counts, result cache hits and misses, and the latency percentiles
+    GET  /health    {"status": "ok"}
+
+The analyses run in a process pool, at most max_concurrent of them at once, and a request finding more than
+max_pending requests waiting is answered 503 at once. Recent records are kept in an in-memory LRU keyed by the
+path, size and modification time of a file or the SHA-256 of uploaded content, and identical requests in flight
+share a single analysis.
+"""
+
+# largest request body read, uploaded structures included
+max_body_bytes = 256 << 20
+_reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+            422: "Unprocessable Entity", 503: "Service Unavailable"}
+
+
+def analyze_request(path=None, content=None):
+    # analysis record of a file or of uploaded PDB text, run in the worker processes
+    if content is not None:
+        return analysis_record(Structure.from_file(io.StringIO(content)))
+    return analysis_record(path)
+
+
+def percentiles(values, points=(50, 90, 99)):
+    """
+        Function to compute nearest-rank percentiles
+
+        Parameters
+        ----------
+        values : iterable
+            list of numbers
+
+        points : tuple
+            percentiles to compute, between 0 and 100
+
+        Return
+        ----------
+        percentiles : dictionary
+            key: "p50", "p90", ...
+            value: percentile, None without values
+
+    """
+    values = sorted(values)
+    result = {}
+    for point in points:
+        rank = max(1, -(-point * len(values) // 100))
+        result[f"p{point}"] = values[rank - 1] if values else None
+    return result
+
+
+class AnalysisService:
+    # Request handling of the service, independent of the transport
+    # requests are dictionaries {"path": ...} or {"content": ...}, answers are (HTTP status, JSON serializable)
+
+    def __init__(self, workers=None, max_concurrent=None, max_pending=1024, cache_size=256, latency_window=10000):
+        """
+            Parameters
+            ----------
+            workers : int
+                number of worker processes, None for one per CPU, 1 runs the analyses in a thread of this process
+
+            max_concurrent : int
+                analyses running at once, by default the number of workers
+
+            max_pending : int
+                requests allowed to wait for an analysis slot, the others are answered 503
+
+            cache_size : int
+                number of analysis records kept in the LRU, 0 disables it
+
+            latency_window : int
+                number of most recent request latencies the percentiles are computed over
+        """
+        self.workers = workers or os.cpu_count() or 1
+        if self.workers == 1:
+            self.executor = concurrent.futures.ThreadPoolExecutor(1)
+        else:
+            self.executor = concurrent.futures.ProcessPoolExecutor(self.workers)
+        self.max_concurrent = max_concurrent or self.workers
+        self.max_pending = max_pending
+        self.cache_size = cache_size
+        self._slots = None
+        # key: request key, value: analysis record, least recently used first
+        self._cache = collections.OrderedDict()
+        # key: request key, value: future of the analysis in flight
+        self._in_flight = {}
+        self._latencies = collections.deque(maxlen=latency_window)
+        self.started = time.time()
+        self.counters = {"requests": 0, "analyses": 0, "errors": 0, "rejected": 0, "cache_hits": 0,
+                         "cache_misses": 0, "shared": 0, "pending": 0, "running": 0}
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def _key(self, request):
+        # key of the result cache, None when the request does not name an existing file or content
+        if "content" in request:
+            return "sha256:" + hashlib.sha256(request["content"].encode("utf-8")).hexdigest()
+        try:
+            stat = os.stat(request["path"])
+        except OSError:
+            return None
+        return f"{os.path.realpath(request['path'])}:{stat.st_size}:{stat.st_mtime_ns}"
+
+    async def analyze(self, request):
+        """
+            Function to answer an analysis request
+
+            Parameters
+            ----------
+            request : dictionary
+                {"path": path to a pdb file on the service host} or {"content": PDB text}
+
+            Return
+            ----------
+            status : int
+                HTTP status, 200, 400 (bad request), 422 (failed analysis) or 503 (too many requests)
+
+            answer : dictionary
+                analysis record (see pdb_parser.analysis_record) with "file" and "cache" ("hit" or "miss"),
+                or {"error": message}
+
+        """
+        if not isinstance(request, dict) or len({"path", "content"} & request.keys()) != 1 \
+                or not isinstance(request.get("path", request.get("content")), str):
+            return 400, {"error": 'expected a JSON object with a "path" or a "content" string'}
+        file = request.get("path", "<content>")
+        key = self._key(request)
+        if key is not None and key in self._cache:
+            self._cache.move_to_end(key)
+            self.counters["cache_hits"] += 1
+            return 200, {"file": file, **self._cache[key], "cache": "hit"}
+        self.counters["cache_misses"] += 1
+
+        future = self._in_flight.get(key) if key is not None else None
+        if future is not None:
+            # the same structure is already being analyzed
+            self.counters["shared"] += 1
+        else:
+            if self.counters["pending"] >= self.max_pending:
+                self.counters["rejected"] += 1
+                return 503, {"error": f"more than {self.max_pending} requests are waiting"}
+            future = asyncio.ensure_future(self._run(request))
+            if key is not None:
+                self._in_flight[key] = future
+                future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        try:
+            record = await asyncio.shield(future)
+        except Exception as error:
+            self.counters["errors"] += 1
+            return 422, {"file": file, "error": f"{type(error).__name__}: {error}"}
+        if key is not None and self.cache_size:
+            self._cache[key] = record
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return 200, {"file": file, **record, "cache": "miss"}
+
+    async def _run(self, request):
+        # wait for a slot, then run the analysis in the pool
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+        self.counters["pending"] += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.counters["pending"] -= 1
+        self.counters["running"] += 1
+        try:
+            self.counters["analyses"] += 1
+            return await asyncio.get_running_loop().run_in_executor(self.executor, analyze_request,
+                                                                    request.get("path"), request.get("content"))
+        finally:
+            self.counters["running"] -= 1
+            self._slots.release()
+
+    def record_latency(self, seconds):
+        self._latencies.append(seconds)
+
+    def stats(self):
+        # counters, cache size and latency percentiles in milliseconds
+        latencies = percentiles(self._latencies)
+        return {**self.counters, "workers": self.workers, "max_concurrent": self.max_concurrent,
+                "cached": len(self._cache), "uptime_seconds": time.time() - self.started,
+                "latency_ms": {name: None if value is None else value * 1000 for name, value in latencies.items()},
+                "latency_window": len(self._latencies)}
+
+    async def handle(self, method, path, body):
+        # (status, answer) of an HTTP request
+        if path == "/analyze":
+            if method != "POST":
+                return 405, {"error": "use POST"}
+            try:
+                request = json.loads(body)
+            except ValueError as error:
+                return 400, {"error": f"invalid JSON: {error}"}
+            return await self.analyze(request)
+        if path in ("/stats", "/health"):
+            if method != "GET":
+                return 405, {"error": "use GET"}
+            return 200, self.stats() if path == "/stats" else {"status": "ok"}
+        return 404, {"error": f"unknown endpoint {path}"}
+
+    async def connection(self, reader, writer):
+        # serve the HTTP/1.1 requests of a connection, kept alive until the client closes it
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                start = time.perf_counter()
+                lines = head.decode("latin1").split("\r\n")
+                try:
+                    method, path, version = lines[0].split(" ", 2)
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "malformed request line"}, False)
+                    return
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                try:
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self._respond(writer, 400, {"error": "Content-Length must be a non-negative integer"},
+                                        False)
+                    return
+                if length > max_body_bytes:
+                    await self._respond(writer, 413, {"error": f"bodies are limited to {max_body_bytes} bytes"},
+                                        False)
+                    return
+                body = await reader.readexactly(length) if length else b""
+
+                self.counters["requests"] += 1
+                status, answer = await self.handle(method, path.split("?", 1)[0], body)
+                if path.startswith("/analyze"):
+                    self.record_latency(time.perf_counter() - start)
+                await self._respond(writer, status, answer, keep_alive)
+                if not keep_alive:
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, answer, keep_alive):
+        payload = json.dumps(answer).encode("utf-8")
+        writer.write(f"HTTP/1.1 {status} {_reasons[status]}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(payload)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}"
+                     f"\r\n\r\n".encode("latin1") + payload)
+        await writer.drain()
+
+    async def start(self, host="127.0.0.1", port=8765, unix=None):
+        """
+            Function to start listening
+
+            Parameters
+            ----------
+            host : str
+                interface to listen on
+
+            port : int
+                TCP port, 0 picks a free one
+
+            unix : str
+                path of a Unix socket to listen on instead of TCP
+
+            Return
+            ----------
+            server : asyncio.Server
+                the listening server, etc: server.sockets[0].getsockname() is the address
+
+        """
+        if unix is not None:
+            return await asyncio.start_unix_server(self.connection, unix, limit=1 << 16)
+        return await asyncio.start_server(self.connection, host, port, limit=1 << 16)
+
+
+async def serve(host="127.0.0.1", port=8765, unix=None, **options):
+    # run the service until it is cancelled, options are passed to AnalysisService
+    service = AnalysisService(**options)
+    server = await service.start(host, port, unix)
+    address = unix or "http://%s:%d" % server.sockets[0].getsockname()[:2]
+    print(f"Serving on {address} with {service.workers} worker(s)", file=sys.stderr)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve PDB analyses as JSON over HTTP")
+    parser.add_argument("--host", default="127.0.0.1", help="interface to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port")
+    parser.add_argument("--unix", default=None, help="path of a Unix socket to listen on instead of TCP")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--max-concurrent", type=int, default=None,
+                        help="analyses running at once (default: the number of workers)")
+    parser.add_argument("--max-pending", type=int, default=1024, help="waiting requests before answering 503")
+    parser.add_argument("--cache-size", type=int, default=256, help="analysis records kept in memory")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, workers=args.workers,
+                          max_concurrent=args.max_concurrent, max_pending=args.max_pending,
+                          cache_size=args.cache_size))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+import math
+import heapq
+import itertools
+from array import array
+
+"""
+Spatial index of atom coordinates for neighbor and contact queries
+
+A CellList bins the points into cubic cells, so a query within a cutoff only looks at the few cells around it
+instead of every atom: radius queries, k nearest neighbors and all pairs within a cutoff in about linear time.
+"""
+
+
+class CellList:
+    # Uniform grid cell list built once from a set of points
+    # the coordinates are kept as a flat array (x0, y0, z0, x1, ...) and every occupied cell holds the indices
+    # of its points, the point index is the same as the atom index in the table the coordinates came from
+
+    def __init__(self, coordinates, cell_size=4.0):
+        """
+            Parameters
+            ----------
+            coordinates : sequence
+                flat sequence of coordinates (x0, y0, z0, x1, ...), etc: AtomTable.coordinates,
+                or a sequence of (x, y, z) points
+
+            cell_size : float
+                edge of the cubic cells in Å, queries are fastest with a cutoff close to it
+        """
+        if cell_size <= 0:
+            raise ValueError("cell_size must be positive")
+        if len(coordinates) and not isinstance(coordinates[0], (int, float)):
+            coordinates = itertools.chain.from_iterable(coordinates)
+        self.coordinates = coordinates if isinstance(coordinates, array) and coordinates.typecode == "d" \
+            else array("d", coordinates)
+        if len(self.coordinates) % 3:
+            raise ValueError("coordinates must hold three values per point")
+        self.cell_size = float(cell_size)
+
+        # key: (i, j, k) cell, value: list of point indices
+        self.cells = {}
+        inverse = 1.0 / self.cell_size
+        floor = math.floor
+        cells = self.cells
+        xyz = self.coordinates
+        for index in range(len(xyz) // 3):
+            key = (floor(xyz[3 * index] * inverse), floor(xyz[3 * index + 1] * inverse),
+                   floor(xyz[3 * index + 2] * inverse))
+            members = cells.get(key)
+            if members is None:
+                cells[key] = [index]
+            else:
+                members.append(index)
+
+    def __len__(self):
+        return len(self.coordinates) // 3
+
+    def point(self, index):
+        return tuple(self.coordinates[3 * index:3 * index + 3])
+
+    def _cell_of(self, x, y, z):
+        inverse = 1.0 / self.cell_size
+        return math.floor(x * inverse), math.floor(y * inverse), math.floor(z * inverse)
+
+    def _members(self, ci, cj, ck, reach):
+        # point indices of the cells within reach cells of (ci, cj, ck)
+        cells = self.cells
+        if (2 * reach + 1) ** 3 > len(cells):
+            # a wide reach on a sparse grid, looking at every occupied cell is cheaper
+            for (i, j, k), members in cells.items():
+                if abs(i - ci) <= reach and abs(j - cj) <= reach and abs(k - ck) <= reach:
+                    yield from members
+            return
+        for i in range(ci - reach, ci + reach + 1):
+            for j in range(cj - reach, cj + reach + 1):
+                for k in range(ck - reach, ck + reach + 1):
+                    members = cells.get((i, j, k))
+                    if members is not None:
+                        yield from members
+
+    def query_radius(self, point, radius, distances=False):
+        """
+            Function to find the points within a radius of a point
+
+            Parameters
+            ----------
+            point : tuple
+                (x, y, z) of the query point
+
+            radius : float
+                search radius in Å, points at exactly this distance are included
+
+            distances : bool
+                if True (index, distance) pairs are returned instead of indices
+
+            Return
+            ----------
+            neighbors : list
+                indices of the points (or (index, distance) pairs) in increasing index order
+
+        """
+        x, y, z = point
+        reach = math.ceil(radius / self.cell_size)
+        xyz = self.coordinates
+        radius2 = radius * radius
+        found = []
+        for index in self._members(*self._cell_of(x, y, z), reach):
+            dx = xyz[3 * index] - x
+            dy = xyz[3 * index + 1] - y
+            dz = xyz[3 * index + 2] - z
+            d2 = dx * dx + dy * dy + dz * dz
+            if d2 <= radius2:
+                found.append((index, math.sqrt(d2)) if distances else index)
+        found.sort()
+        return found
+
+    def nearest(self, point, k=1):
+        """
+            Function to find the k nearest points of a point
+
+            Parameters
+            ----------
+            point : tuple
+                (x, y, z) of the query point
+
+            k : int
+                number of neighbors
+
+            Return
+            ----------
+            neighbors : list
+                list of (distance, index), nearest first (ties by index), fewer than k if the index is smaller
+
+        """
+        x, y, z = point
+        k = min(k, len(self))
+        if k <= 0:
+            return []
+        ci, cj, ck = self._cell_of(x, y, z)
+        xyz = self.coordinates
+        best = []
+        seen = set()
+        reach = 0
+        while True:
+            for index in self._members(ci, cj, ck, reach):
+                if index in seen:
+                    continue
+                seen.add(index)
+                dx = xyz[3 * index] - x
+                dy = xyz[3 * index + 1] - y
+                dz = xyz[3 * index + 2] - z
+                # a max heap of the k best as (-distance^2, -index)
+                candidate = (-(dx * dx + dy * dy + dz * dz), -index)
+                if len(best) < k:
+                    heapq.heappush(best, candidate)
+                elif candidate > best[0]:
+                    heapq.heapreplace(best, candidate)
+            # points outside the searched cells are at least reach * cell_size away from the query point
+            if len(seen) == len(self) or (len(best) == k and -best[0][0] < (reach * self.cell_size) ** 2):
+                break
+            reach += 1
+        return [(math.sqrt(-d2), -index) for d2, index in sorted(best, reverse=True)]
+
+    def pairs_within(self, cutoff):
+        """
+            Function to enumerate all pairs of points within a cutoff
+
+            Parameters
+            ----------
+            cutoff : float
+                distance cutoff in Å, pairs at exactly this distance are included
+
+            Return
+            ----------
+            pairs : generator
+                generator of (i, j, distance) with i < j, every pair once, in no particular order
+
+        """
+        reach = math.ceil(cutoff / self.cell_size)
+        cutoff2 = cutoff * cutoff
+        xyz = self.coordinates
+        cells = self.cells
+        # half of the neighbor cells, so every pair of cells is visited once
+        offsets = [offset for offset in itertools.product(range(-reach, reach + 1), repeat=3) if offset > (0, 0, 0)]
+        sqrt = math.sqrt
+
+        for (ci, cj, ck), members in cells.items():
+            points = [(index, xyz[3 * index], xyz[3 * index + 1], xyz[3 * index + 2]) for index in members]
+            # pairs inside the cell
+            for a in range(len(points)):
+                i, x, y, z = points[a]
+                for j, x2, y2, z2 in points[a + 1:]:
+                    dx = x2 - x
+                    dy = y2 - y
+                    dz = z2 - z
+                    d2 = dx * dx + dy * dy + dz * dz
+                    if d2 <= cutoff2:
+                        yield (i, j, sqrt(d2)) if i < j else (j, i, sqrt(d2))
+            # pairs with the neighbor cells
+            for di, dj, dk in offsets:
+                others = cells.get((ci + di, cj + dj, ck + dk))
+                if others is None:
+                    continue
+                for j in others:
+                    x2 = xyz[3 * j]
+                    y2 = xyz[3 * j + 1]
+                    z2 = xyz[3 * j + 2]
+                    for i, x, y, z in points:
+                        dx = x2 - x
+                        dy = y2 - y
+                        dz = z2 - z
+                        d2 = dx * dx + dy * dy + dz * dz
+                        if d2 <= cutoff2:
+                            yield (i, j, sqrt(d2)) if i < j else (j, i, sqrt(d2))
@@ -0,0 +1,412 @@
+import math
+import itertools
+import concurrent.futures
+from array import array
+from operator import mul, sub
+
+from pdb_parser import AtomTable, Structure, Trajectory
+from pdb_select import compile_selection
+
+"""
+Structural superposition and RMSD
+
+The matched atoms of a set of models (etc: the CA atoms by chain, residue sequence number and insertion code) are
+gathered into a CoordinateStack, one flat array of shape (models, atoms, 3) like the coordinates of a Trajectory.
+Every model is centered once, then a pair of models costs the nine sums of its 3x3 covariance matrix and the RMSD
+after the optimal (Kabsch) rotation is the largest root of the characteristic polynomial of a 4x4 quaternion matrix
+(Theobald, 2005), found with a few Newton steps instead of a singular value decomposition. Each covariance sum is
+the dot product of two coordinate columns, taken as (|u|^2 + |v|^2 - |u - v|^2) / 2 with the squared norms kept
+per model and math.dist looping over the columns in C without creating a float per atom. The rotation itself is
+only computed by kabsch and superpose.
+"""
+
+# relative precision of the largest eigenvalue found by the Newton steps
+_eigenvalue_precision = 1e-11
+
+
+class CoordinateStack:
+    # Matched atoms of several models, the coordinates of atom j of model i start at 3 * (i * atoms + j)
+
+    def __init__(self, keys, coordinates):
+        """
+            Parameters
+            ----------
+            keys : list
+                (chain, residue sequence number, insertion code, atom name) of every matched atom
+
+            coordinates : array
+                flat double array of the coordinates of every model, model after model
+        """
+        self.keys = keys
+        self.coordinates = coordinates if isinstance(coordinates, array) and coordinates.typecode == "d" \
+            else array("d", coordinates)
+        if not keys or len(self.coordinates) % (3 * len(keys)):
+            raise ValueError("the coordinates do not hold whole models of the matched atoms")
+
+    def __len__(self):
+        # number of models
+        return len(self.coordinates) // (3 * len(self.keys))
+
+    def model(self, index):
+        # flat coordinates of a model
+        size = 3 * len(self.keys)
+        if not 0 <= index < len(self):
+            raise IndexError("model index out of range")
+        return self.coordinates[index * size:(index + 1) * size]
+
+    def centered(self):
+        # centered columns of every model, see _centered
+        size = 3 * len(self.keys)
+        return [_centered(self.coordinates[start:start + size]) for start in range(0, len(self.coordinates), size)]
+
+
+def _table_of(model):
+    if isinstance(model, Structure):
+        return model.atoms
+    if isinstance(model, AtomTable):
+        return model
+    return AtomTable.from_lines(model)
+
+
+def _atom_keys(table, selection):
+    # key: (chain, residue sequence number, insertion code, atom name), value: atom index of its first location
+    chain, name, insertion_code = table.chain, table.name, table.insertion_code
+    atoms = {}
+    for index in compile_selection(selection).indices(table):
+        key = (chain.categories[chain.codes[index]].strip(), table.residue_number[index],
+               insertion_code.categories[insertion_code.codes[index]].strip(),
+               name.categories[name.codes[index]].strip())
+        atoms.setdefault(key, index)
+    return atoms
+
+
+def coordinate_stack(models, selection="name CA"):
+    """
+        Function to gather the atoms found in every model
+
+        Parameters
+        ----------
+        models : list
+            list of Structures, AtomTables or lists of atomic lines, or a Trajectory
+
+        selection : str
+            selection query of the compared atoms (see pdb_select), etc: "name CA", "name N CA C O and chain A"
+
+        Return
+        ----------
+        stack : CoordinateStack
+            the selected atoms present in every model, matched by (chain, residue sequence number, insertion code,
+            atom name) in the order of the first model
+
+    """
+    if isinstance(models, Trajectory):
+        atoms = _atom_keys(models.topology, selection)
+        if not atoms:
+            raise ValueError(f"no atom matches the selection {selection!r}")
+        # positions of the selected coordinates in every frame of the flat (frames, atoms, 3) array
+        size = 3 * len(models.topology)
+        positions = [3 * index + axis for index in atoms.values() for axis in range(3)]
+        positions = [frame + position for frame in range(0, len(models.coordinates), size) for position in positions]
+        return CoordinateStack(list(atoms), array("d", map(models.coordinates.__getitem__, positions)))
+
+    tables = [_table_of(model) for model in models]
+    if not tables:
+        raise ValueError("no models to compare")
+    atoms = [_atom_keys(table, selection) for table in tables]
+    keys = [key for key in atoms[0] if all(key in other for other in atoms[1:])]
+    if not keys:
+        raise ValueError(f"no atom matching the selection {selection!r} is found in every model")
+    coordinates = array("d")
+    for table, model_atoms in zip(tables, atoms):
+        xyz = table.coordinates
+        for key in keys:
+            index = model_atoms[key]
+            coordinates.extend(xyz[3 * index:3 * index + 3])
+    return CoordinateStack(keys, coordinates)
+
+
+def _centered(flat):
+    # (x, y and z columns moved to their centroid as tuples, their squared norms, the sum of the squared norms)
+    n = len(flat) // 3
+    columns = []
+    for axis in range(3):
+        column = flat[axis::3]
+        columns.append(tuple(map(sub, column, itertools.repeat(math.fsum(column) / n))))
+    norms = tuple(math.fsum(map(mul, column, column)) for column in columns)
+    return columns, norms, sum(norms)
+
+
+def _covariance(a, b):
+    # sums of a_u * b_v of two centered models, row by row (u) over x, y and z (v)
+    dist = math.dist
+    (columns_a, norms_a, _), (columns_b, norms_b, _) = a, b
+    return [0.5 * (norm_u + norm_v - dist(u, v) ** 2) for u, norm_u in zip(columns_a, norms_a)
+            for v, norm_v in zip(columns_b, norms_b)]
+
+
+def _largest_eigenvalue(s, e0):
+    # largest eigenvalue of the 4x4 quaternion matrix of the covariance s, from its characteristic polynomial
+    # x^4 + c2 x^2 + c1 x + c0 (Theobald, 2005), Newton steps from the upper bound e0
+    sxx, sxy, sxz, syx, syy, syz, szx, szy, szz = s
+    sxx2, syy2, szz2 = sxx * sxx, syy * syy, szz * szz
+    sxy2, syz2, sxz2 = sxy * sxy, syz * syz, sxz * sxz
+    syx2, szy2, szx2 = syx * syx, szy * szy, szx * szx
+    syz_szy_m_syy_szz2 = 2.0 * (syz * szy - syy * szz)
+    sxx2_syy2_szz2_syz2_szy2 = syy2 + szz2 - sxx2 + syz2 + szy2
+    c2 = -2.0 * (sxx2 + syy2 + szz2 + sxy2 + syx2 + sxz2 + szx2 + syz2 + szy2)
+    c1 = 8.0 * (sxx * syz * szy + syy * szx * sxz + szz * sxy * syx - sxx * syy * szz - syz * szx * sxy
+                - szy * syx * sxz)
+    sxz_p_szx, syz_p_szy, sxy_p_syx = sxz + szx, syz + szy, sxy + syx
+    syz_m_szy, sxz_m_szx, sxy_m_syx = syz - szy, sxz - szx, sxy - syx
+    sxx_p_syy, sxx_m_syy = sxx + syy, sxx - syy
+    sxy2_sxz2_syx2_szx2 = sxy2 + sxz2 - syx2 - szx2
+    c0 = sxy2_sxz2_syx2_szx2 * sxy2_sxz2_syx2_szx2 \
+        + (sxx2_syy2_szz2_syz2_szy2 + syz_szy_m_syy_szz2) * (sxx2_syy2_szz2_syz2_szy2 - syz_szy_m_syy_szz2) \
+        + (-sxz_p_szx * syz_m_szy + sxy_m_syx * (sxx_m_syy - szz)) \
+        * (-sxz_m_szx * syz_p_szy + sxy_m_syx * (sxx_m_syy + szz)) \
+        + (-sxz_p_szx * syz_p_szy - sxy_p_syx * (sxx_p_syy - szz)) \
+        * (-sxz_m_szx * syz_m_szy - sxy_p_syx * (sxx_p_syy + szz)) \
+        + (sxy_p_syx * syz_p_szy + sxz_p_szx * (sxx_m_syy + szz)) \
+        * (-sxy_m_syx * syz_m_szy + sxz_p_szx * (sxx_p_syy + szz)) \
+        + (sxy_p_syx * syz_m_szy + sxz_m_szx * (sxx_m_syy - szz)) \
+        * (-sxy_m_syx * syz_p_szy + sxz_m_szx * (sxx_p_syy - szz))
+    value = e0
+    for _ in range(50):
+        previous = value
+        x2 = value * value
+        b = (x2 + c2) * value
+        a = b + c1
+        denominator = 2.0 * x2 * value + b + a
+        if denominator == 0.0:
+            break
+        value -= (a * value + c0) / denominator
+        if abs(value - previous) <= abs(_eigenvalue_precision * value):
+            break
+    return value
+
+
+def _pair_rmsd(a, b, n):
+    # RMSD of two centered models after the optimal rotation
+    e0 = 0.5 * (a[2] + b[2])
+    return math.sqrt(max(2.0 * (e0 - _largest_eigenvalue(_covariance(a, b), e0)) / n, 0.0))
+
+
+def _flat(points):
+    # flat double array of flat coordinates or of a sequence of (x, y, z) points
+    if len(points) and not isinstance(points[0], (int, float)):
+        points = itertools.chain.from_iterable(points)
+    return points if isinstance(points, array) and points.typecode == "d" else array("d", points)
+
+
+def _matched(mobile, target):
+    # flat coordinates of two sets of points of the same size
+    mobile, target = _flat(mobile), _flat(target)
+    if not target or len(target) % 3:
+        raise ValueError("expected points of three coordinates")
+    if len(mobile) != len(target):
+        raise ValueError(f"the point sets differ in size: {len(mobile) // 3} and {len(target) // 3}")
+    return mobile, target, len(target) // 3
+
+
+def rmsd(mobile, target):
+    """
+        Function to find the RMSD of two sets of matched points after the optimal superposition
+
+        Parameters
+        ----------
+        mobile : sequence
+            flat coordinates (x0, y0, z0, x1, ...) or a sequence of (x, y, z) points
+
+        target : sequence
+            the same number of points, in the same order
+
+        Return
+        ----------
+        rmsd : float
+            root mean square deviation in Å
+
+    """
+    mobile, target, n = _matched(mobile, target)
+    return _pair_rmsd(_centered(mobile), _centered(target), n)
+
+
+def _jacobi_eigenvector(matrix):
+    # eigenvector of the largest eigenvalue of a small symmetric matrix, by cyclic Jacobi rotations
+    size = len(matrix)
+    a = [list(row) for row in matrix]
+    vectors = [[float(i == j) for j in range(size)] for i in range(size)]
+    for _ in range(50):
+        off = sum(a[i][j] * a[i][j] for i in range(size) for j in range(i + 1, size))
+        if off < 1e-30:
+            break
+        for p in range(size - 1):
+            for q in range(p + 1, size):
+                if abs(a[p][q]) < 1e-300:
+                    continue
+                theta = (a[q][q] - a[p][p]) / (2.0 * a[p][q])
+                t = math.copysign(1.0, theta) / (abs(theta) + math.sqrt(theta * theta + 1.0))
+                c = 1.0 / math.sqrt(t * t + 1.0)
+                s = t * c
+                for k in range(size):
+                    akp, akq = a[k][p], a[k][q]
+                    a[k][p], a[k][q] = c * akp - s * akq, s * akp + c * akq
+                for k in range(size):
+                    apk, aqk = a[p][k], a[q][k]
+                    a[p][k], a[q][k] = c * apk - s * aqk, s * apk + c * aqk
+                for k in range(size):
+                    vkp, vkq = vectors[k][p], vectors[k][q]
+                    vectors[k][p], vectors[k][q] = c * vkp - s * vkq, s * vkp + c * vkq
+    largest = max(range(size), key=lambda i: a[i][i])
+    return [vectors[k][largest] for k in range(size)]
+
+
+def kabsch(mobile, target):
+    """
+        Function to find the rotation and translation superposing a set of points onto another one
+
+        Parameters
+        ----------
+        mobile : sequence
+            flat coordinates (x0, y0, z0, x1, ...) or a sequence of (x, y, z) points, the points moved
+
+        target : sequence
+            the same number of points, in the same order
+
+        Return
+        ----------
+        rotation : tuple
+            3x3 rotation matrix as a tuple of rows
+
+        translation : tuple
+            (x, y, z) added after the rotation, target ~ rotation . mobile + translation
+
+        rmsd : float
+            root mean square deviation in Å of the superposed points
+
+    """
+    mobile, target, n = _matched(mobile, target)
+    a, b = _centered(mobile), _centered(target)
+    sxx, sxy, sxz, syx, syy, syz, szx, szy, szz = _covariance(a, b)
+    # quaternion matrix of the covariance, its top eigenvector is the rotation of mobile onto target (Horn, 1987)
+    q0, q1, q2, q3 = _jacobi_eigenvector([[sxx + syy + szz, syz - szy, szx - sxz, sxy - syx],
+                                          [syz - szy, sxx - syy - szz, sxy + syx, szx + sxz],
+                                          [szx - sxz, sxy + syx, syy - sxx - szz, syz + szy],
+                                          [sxy - syx, szx + sxz, syz + szy, szz - sxx - syy]])
+    rotation = ((q0 * q0 + q1 * q1 - q2 * q2 - q3 * q3, 2.0 * (q1 * q2 - q0 * q3), 2.0 * (q1 * q3 + q0 * q2)),
+                (2.0 * (q1 * q2 + q0 * q3), q0 * q0 - q1 * q1 + q2 * q2 - q3 * q3, 2.0 * (q2 * q3 - q0 * q1)),
+                (2.0 * (q1 * q3 - q0 * q2), 2.0 * (q2 * q3 + q0 * q1), q0 * q0 - q1 * q1 - q2 * q2 + q3 * q3))
+    mobile_center = [math.fsum(mobile[axis::3]) / n for axis in range(3)]
+    target_center = [math.fsum(target[axis::3]) / n for axis in range(3)]
+    translation = tuple(target_center[i] - sum(rotation[i][j] * mobile_center[j] for j in range(3))
+                        for i in range(3))
+    return rotation, translation, _pair_rmsd(a, b, n)
+
+
+def superpose(mobile, target):
+    """
+        Function to move a set of points onto another one
+
+        Parameters
+        ----------
+        mobile : sequence
+            flat coordinates (x0, y0, z0, x1, ...) or a sequence of (x, y, z) points, the points moved
+
+        target : sequence
+            the same number of points, in the same order
+
+        Return
+        ----------
+        coordinates : array
+            flat array('d') of the mobile points after the rotation and translation of kabsch
+
+        rmsd : float
+            root mean square deviation in Å of the superposed points
+
+    """
+    rotation, translation, deviation = kabsch(mobile, target)
+    flat = _flat(mobile)
+    moved = array("d")
+    for start in range(0, len(flat), 3):
+        x, y, z = flat[start:start + 3]
+        moved.extend(row[0] * x + row[1] * y + row[2] * z + shift for row, shift in zip(rotation, translation))
+    return moved, deviation
+
+
+def rmsd_to_reference(stack, reference=0):
+    """
+        Function to find the RMSD of every model of a stack to a reference (one versus many)
+
+        Parameters
+        ----------
+        stack : CoordinateStack
+            matched atoms of the models, see coordinate_stack
+
+        reference : int or sequence
+            index of the reference model in the stack, or its flat coordinates
+
+        Return
+        ----------
+        rmsd : array
+            array('d') of the RMSD in Å of every model after its optimal superposition on the reference
+
+    """
+    n = len(stack.keys)
+    if isinstance(reference, int):
+        target = _centered(stack.model(reference))
+    else:
+        target = _centered(_matched(reference, stack.model(0))[0])
+    return array("d", (_pair_rmsd(model, target, n) for model in stack.centered()))
+
+
+# centered models of the stack of the worker processes, set once per process by _start_worker
+_worker_models = None
+
+
+def _start_worker(models):
+    global _worker_models
+    _worker_models = models
+
+
+def _matrix_rows(rows, models=None):
+    # RMSD of the models of rows to every later model
+    models = _worker_models if models is None else models
+    n = len(models[0][0][0])
+    return [(i, array("d", (_pair_rmsd(models[i], models[j], n) for j in range(i + 1, len(models)))))
+            for i in rows]
+
+
+def rmsd_matrix(stack, workers=None):
+    """
+        Function to find the RMSD of every pair of models (all versus all)
+
+        Parameters
+        ----------
+        stack : CoordinateStack
+            matched atoms of the models, see coordinate_stack
+
+        workers : int
+            processes sharing the rows of the matrix, None or 1 computes it in this process
+
+        Return
+        ----------
+        matrix : list
+            list of array('d') rows, matrix[i][j] is the RMSD in Å of models i and j, 0 on the diagonal
+
+    """
+    models = stack.centered()
+    size = len(models)
+    if workers is None or workers <= 1 or size < 3:
+        upper = _matrix_rows(range(size), models)
+    else:
+        # every task takes rows spread over the matrix, so the long first rows and the short last rows are shared
+        tasks = 4 * workers
+        with concurrent.futures.ProcessPoolExecutor(workers, initializer=_start_worker,
+                                                    initargs=(models,)) as executor:
+            upper = [row for rows in executor.map(_matrix_rows, [range(start, size, tasks) for start in range(tasks)])
+                     for row in rows]
+    matrix = [array("d", bytes(8 * size)) for _ in range(size)]
+    for i, row in upper:
+        matrix[i][i + 1:] = row
+        for offset, value in enumerate(row, i + 1):
+            matrix[offset][i] = value
+    return matrix
@@ -0,0 +1,68 @@
+import pytest
+from pdb_parser import Structure
+from pdb_backbone import backbone_chains, backbone_dihedrals, hydrogen_bonds, secondary_structure
+from bench_pdb_parser import backbone_from_dihedrals
+
+helix_angles = [(-57.0, -47.0, 180.0)] * 12
+hairpin_angles = [(-139.0, 135.0, 180.0)] * 6 + [(60.0, -120.0, 180.0), (-80.0, 0.0, 180.0)] + \
+                 [(-139.0, 135.0, 180.0)] * 6
+
+
+def _shifted(lines, dx):
+    return [line[:30] + "%8.3f" % (float(line[30:38]) + dx) + line[38:] for line in lines]
+
+
+def test_backbone_dihedrals(tmp_path):
+    helix = backbone_from_dihedrals(helix_angles)
+    angles = backbone_dihedrals(helix)["A"]
+    assert [residue[:3] for residue in angles[:2]] == [(1, '', 'ALA'), (2, '', 'ALA')]
+    assert angles[0][3] is None and angles[-1][4:] == (None, None)
+    for _, _, _, phi, psi, omega in angles[1:-1]:
+        assert (phi, psi, abs(omega)) == pytest.approx((-57.0, -47.0, 180.0), abs=0.1)
+
+    # a second conformer far away is ignored, a missing residue is a gap, a residue without CA is left out
+    conformers = [line[:16] + "A" + line[17:] for line in helix[8:12]] + \
+                 [line[:16] + "B" + line[17:] for line in _shifted(helix[8:12], 5.0)]
+    edited = helix[:8] + conformers + helix[12:20] + helix[24:33] + helix[34:]
+    pdb_file = tmp_path / "edited.pdb"
+    pdb_file.write_text("".join(edited))
+    structure = Structure.from_file(str(pdb_file))
+    chain = backbone_chains(structure)["A"]
+    assert [number for number, _ in chain.residues] == [1, 2, 3, 4, 5, 7, 8, 10, 11, 12]
+    assert list(chain.bonded) == [0, 1, 1, 1, 1, 0, 1, 0, 1, 1]
+    edited_angles = {residue[0]: residue[3:] for residue in backbone_dihedrals(structure)["A"]}
+    assert edited_angles[3] == pytest.approx(angles[2][3:])
+    assert edited_angles[5][1:] == (None, None) and edited_angles[7][0] is None
+    assert edited_angles[8] == (pytest.approx(-57.0, abs=0.1), None, None)
+    assert backbone_dihedrals(structure) is backbone_dihedrals(structure)
+
+
+def test_secondary_structure():
+    helix = backbone_from_dihedrals(helix_angles)
+    hairpin = backbone_from_dihedrals(hairpin_angles, chain="B", first_serial=len(helix) + 1)
+    assignment = secondary_structure(helix + _shifted(hairpin, 100.0))
+    assert assignment["A"][1] == "-HHHHHHHHHH-"
+    assert assignment["B"] == ([(number, '') for number in range(1, 15)], "-EEEEETTEEEEE-")
+
+    # the alpha helix bonds every C=O to the N-H four residues on
+    chains = backbone_chains(helix)
+    hbonds = hydrogen_bonds(list(chains.values()))
+    assert all((i, i + 4) in hbonds for i in range(8))
+    assert all(-9.9 <= energy < -0.5 for energy in hbonds.values())
+
+    # prolines have no amide hydrogen to donate
+    proline = [line[:17] + "PRO" + line[20:] if line[22:26] == "   7" else line for line in helix]
+    hbonds = hydrogen_bonds(list(backbone_chains(proline).values()))
+    assert (2, 6) not in hbonds and (1, 5) in hbonds
+
+
+def test_split_residue_is_one_backbone_entry():
+    # the O atom of residue 5 comes after residue 6, the two runs of residue 5 are one residue without a gap
+    helix = backbone_from_dihedrals(helix_angles)
+    oxygen = helix.index(next(line for line in helix if line[22:26] == "   5" and line[12:16] == " O  "))
+    split = helix[:oxygen] + helix[oxygen + 1:oxygen + 5] + [helix[oxygen]] + helix[oxygen + 5:]
+    chain = backbone_chains(split)["A"]
+    assert [number for number, _ in chain.residues] == list(range(1, 13))
+    assert list(chain.bonded) == [0] + [1] * 11
+    assert backbone_dihedrals(split) == backbone_dihedrals(helix)
+    assert secondary_structure(split) == secondary_structure(helix)
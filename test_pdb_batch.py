@@ -0,0 +1,104 @@
+import json
+import gzip
+import pytest
+from pdb_batch import collect_pdb_files, batch_analyze, completed_files, binding_site_columns
+from test_pdb_parser import pdb_content
+
+
+@pytest.fixture
+def pdb_directory(tmp_path):
+    for name in ["a.pdb", "b.pdb"]:
+        (tmp_path / name).write_text(pdb_content)
+    (tmp_path / "broken.pdb").write_text("ATOM      1  CA  GLY A   1      xx.xxx  12.600  26.940  1.00 54.69           C\n")
+    (tmp_path / "notes.txt").write_text("not a structure")
+    return tmp_path
+
+def test_collect_pdb_files(pdb_directory):
+    manifest = pdb_directory / "manifest.txt"
+    manifest.write_text("# structures\na.pdb\n\nb.pdb\n")
+    assert [p.split("/")[-1] for p in collect_pdb_files([str(pdb_directory)])] == ["a.pdb", "b.pdb", "broken.pdb"]
+    assert len(collect_pdb_files([str(pdb_directory / "*.pdb"), str(manifest)])) == 3
+    mirror = pdb_directory / "mirror"
+    mirror.mkdir()
+    (mirror / "c.pdb.gz").write_bytes(gzip.compress(pdb_content.encode()))
+    assert collect_pdb_files([str(mirror)]) == collect_pdb_files([str(mirror / "c.pdb.gz")]) == [str(mirror / "c.pdb.gz")]
+    assert batch_analyze([str(mirror)], str(mirror / "results.jsonl"), workers=1)["atoms"] == 10
+
+def test_batch_analyze_survives_errors_and_resumes(pdb_directory):
+    output = str(pdb_directory / "results.jsonl")
+    summary = batch_analyze([str(pdb_directory)], output, workers=2, chunksize=1)
+    assert (summary["files"], summary["errors"], summary["atoms"]) == (3, 1, 20)
+    records = {r["file"].split("/")[-1]: r for r in map(json.loads, open(output))}
+    assert "ValueError" in records["broken.pdb"]["error"]
+    assert records["a.pdb"]["amino_acid_composition"] == {'MET': 1, 'GLY': 1}
+    assert records["a.pdb"]["most_distant_residues"] == ['1', '2']
+
+    (pdb_directory / "c.pdb").write_text(pdb_content)
+    summary = batch_analyze([str(pdb_directory)], output, workers=1)
+    assert (summary["files"], summary["skipped"]) == (1, 3)
+    assert len(completed_files(output)) == 4
+
+def test_batch_analyze_csv(pdb_directory):
+    output = str(pdb_directory / "results.csv")
+    batch_analyze([str(pdb_directory / "a.pdb")], output, workers=1, output_format="csv")
+    assert completed_files(output, "csv") == {str(pdb_directory / "a.pdb")}
+
+def test_batch_binding_sites(pdb_directory):
+    output = str(pdb_directory / "sites.jsonl")
+    summary = batch_analyze([str(pdb_directory)], output, workers=1, binding_site_cutoff=2.0)
+    assert (summary["files"], summary["errors"]) == (3, 1)
+    records = [json.loads(line) for line in open(output)]
+    ligands = [(r["file"].split("/")[-1], r["ligand"]) for r in records if "error" not in r]
+    assert ligands == [("a.pdb", "ABC"), ("a.pdb", "BLA"), ("b.pdb", "ABC"), ("b.pdb", "BLA")]
+    assert records[0]["residues"][0]["residue_name"] == "GLY"
+
+    csv_output = str(pdb_directory / "sites.csv")
+    batch_analyze([str(pdb_directory / "a.pdb")], csv_output, workers=1, output_format="csv",
+                  binding_site_cutoff=2.0, cache_directory=str(pdb_directory / "cache"))
+    assert open(csv_output).readline().strip() == ",".join(binding_site_columns)
+    assert completed_files(csv_output, "csv") == {str(pdb_directory / "a.pdb")}
+
+def test_batch_columnar_output(pdb_directory):
+    output = str(pdb_directory / "results.columnar")
+    summary = batch_analyze([str(pdb_directory)], output, workers=1, output_format="columnar")
+    assert (summary["files"], summary["errors"]) == (3, 1)
+    batch, = map(json.loads, open(output))
+    assert batch["length"] == 3 and batch["columns"]["atoms"] == [10, 10, None]
+    assert batch["columns"]["error"][:2] == [None, None]
+    assert batch_analyze([str(pdb_directory)], output, workers=1, output_format="columnar")["skipped"] == 3
+    with pytest.raises(ValueError):
+        batch_analyze([str(pdb_directory)], output, output_format="columnar", binding_site_cutoff=4.0)
+
+
+def test_resume_after_a_cut_off_record_and_upper_case_names(tmp_path):
+    (tmp_path / "1ABC.PDB").write_text(pdb_content)
+    (tmp_path / "2abc.ENT.GZ").write_bytes(gzip.compress(pdb_content.encode()))
+    (tmp_path / "3abc.pdb").write_text(pdb_content)
+    assert [p.split("/")[-1] for p in collect_pdb_files([str(tmp_path)])] == ["1ABC.PDB", "2abc.ENT.GZ", "3abc.pdb"]
+
+    # an interrupted batch leaves half a record behind, the resumed batch writes its records on lines of their own
+    output = tmp_path / "results.jsonl"
+    batch_analyze([str(tmp_path / "1ABC.PDB")], str(output), workers=1)
+    with open(output, "a") as f:
+        f.write('{"file": "%s", "atoms": 1' % (tmp_path / "2abc.ENT.GZ"))
+    summary = batch_analyze([str(tmp_path)], str(output), workers=1)
+    assert (summary["files"], summary["skipped"]) == (2, 1)
+    assert [json.loads(line)["file"].split("/")[-1] for line in open(output)] == ["1ABC.PDB", "2abc.ENT.GZ",
+                                                                                 "3abc.pdb"]
+    assert batch_analyze([str(tmp_path)], str(output), workers=1)["skipped"] == 3
+
+
+def test_resume_binding_sites_after_an_interrupted_file(pdb_directory):
+    # the ligands of a file come in one write, an interruption within it leaves only the first of them behind
+    for output_format in ["jsonl", "csv"]:
+        output = str(pdb_directory / f"sites.{output_format}")
+        sources = [str(pdb_directory / "a.pdb"), str(pdb_directory / "b.pdb")]
+        batch_analyze(sources, output, workers=1, output_format=output_format, binding_site_cutoff=2.0)
+        complete = open(output).read()
+        lines = complete.splitlines(keepends=True)
+        assert len(lines) == 4 + (output_format == "csv")
+        with open(output, "w", newline="") as f:
+            f.write("".join(lines[:-1]))
+        summary = batch_analyze(sources, output, workers=1, output_format=output_format, binding_site_cutoff=2.0)
+        assert (summary["files"], summary["skipped"]) == (1, 1)
+        assert open(output).read() == complete
@@ -0,0 +1,34 @@
+import struct
+import pytest
+from pdb_binary import save_structure, load_structure
+from pdb_parser import (RaminCalc, Structure, pdb_file_reader, hetero_atom_pdb_reader, analysis_record,
+                        atom_table_reader)
+from test_pdb_parser import pdb_content
+
+
+def test_binary_round_trip(tmp_path):
+    pdb_file = tmp_path / "test.pdb"
+    pdb_file.write_text(pdb_content)
+    binary_file = str(tmp_path / "test.pdbcol")
+    save_structure(Structure.from_file(str(pdb_file)), binary_file)
+    structure = load_structure(binary_file)
+
+    for table, lines in [(structure.atoms, pdb_file_reader(str(pdb_file))),
+                         (structure.heteroatoms, hetero_atom_pdb_reader(str(pdb_file)))]:
+        assert len(table) == len(lines)
+        for index, line in enumerate(lines):
+            assert table.record(index) == RaminCalc.get_data_pdb(line)
+    assert analysis_record(structure) == analysis_record(str(pdb_file))
+
+    # the header as documented in pdb_binary: magic, version, reserved, atoms, heteroatoms in 32 bytes
+    with open(binary_file, "rb") as f:
+        assert struct.unpack("<8sIIQQ", f.read(32)) == (b"PDBCOL\x00\x00", 1, 0, 10, 3)
+
+def test_binary_atom_table_and_bad_file(tmp_path):
+    pdb_file = tmp_path / "test.pdb"
+    pdb_file.write_text(pdb_content)
+    binary_file = str(tmp_path / "atoms.pdbcol")
+    save_structure(atom_table_reader(str(pdb_file)), binary_file)
+    assert len(load_structure(binary_file).heteroatoms) == 0
+    with pytest.raises(ValueError):
+        load_structure(str(pdb_file))
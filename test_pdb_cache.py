@@ -0,0 +1,33 @@
+import os
+from pdb_cache import ResultCache, content_hash
+from pdb_parser import analysis_record, parser_version
+from test_pdb_parser import pdb_content
+
+
+def test_result_cache_hits_and_misses(tmp_path):
+    pdb_file = tmp_path / "test.pdb"
+    pdb_file.write_text(pdb_content)
+    cache = ResultCache(str(tmp_path / "cache"))
+    structure, record = cache.analyze(str(pdb_file))
+    assert record == analysis_record(str(pdb_file))
+    assert "radius_of_gyration_calculator" in structure.metrics
+    cached_structure, cached_record = cache.analyze(str(pdb_file))
+    assert cached_record == record
+    assert len(cached_structure.atoms) == 10
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+    assert cache.key(str(pdb_file)) == f"{content_hash(str(pdb_file))}-v{parser_version}"
+
+    # a changed file is a new key
+    pdb_file.write_text(pdb_content.replace("MET", "LYS"))
+    _, record = cache.analyze(str(pdb_file))
+    assert record["amino_acid_charge_composition"] == {'Positive': 1, 'Negative': 0}
+    assert cache.misses == 2
+
+def test_result_cache_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=1)
+    for index in range(3):
+        pdb_file = tmp_path / f"{index}.pdb"
+        pdb_file.write_text(pdb_content.replace("54.69", f"5{index}.00"))
+        cache.analyze(str(pdb_file))
+    assert cache.evictions == 2
+    assert len(os.listdir(tmp_path / "cache")) == 1
@@ -0,0 +1,48 @@
+import math
+import random
+import pytest
+from pdb_contacts import ca_coordinates, distance_tiles, distance_matrix, contact_map, read_npy
+from pdb_parser import Structure
+
+
+def _chain_lines(n, chain="A", seed=0):
+    rng = random.Random(seed)
+    x = y = z = 0.0
+    for i in range(n):
+        x, y, z = x + rng.uniform(-3, 3), y + rng.uniform(-3, 3), z + rng.uniform(-3, 3)
+        yield "ATOM  %5d  CA  GLY %1s%4d    %8.3f%8.3f%8.3f  1.00 10.00           C  " % (i + 1, chain, i + 1, x, y, z)
+
+
+def test_distance_matrix_tiles(tmp_path):
+    atom_lines = list(_chain_lines(23)) + list(_chain_lines(5, "B"))
+    numbers, points = ca_coordinates(atom_lines)["A"]
+    assert numbers == [str(i) for i in range(1, 24)]
+    assert [tile[:4] for tile in distance_tiles(points, 10)] == [(0, 0, 10, 10), (0, 10, 10, 10), (0, 20, 10, 3),
+                                                                 (10, 10, 10, 10), (10, 20, 10, 3), (20, 20, 3, 3)]
+    _, matrix = distance_matrix(atom_lines, "A", tile_size=10)
+    for i in range(23):
+        for j in range(23):
+            assert matrix[i * 23 + j] == pytest.approx(math.dist(points[i], points[j]), abs=1e-4)
+
+    # the same matrix through a memory-mapped .npy file, from a Structure
+    output = str(tmp_path / "A.npy")
+    assert distance_matrix(Structure.from_lines(atom_lines), "A", tile_size=7, output=output)[1] == output
+    shape, values = read_npy(output)
+    assert shape == (23, 23)
+    assert values.tolist() == matrix.tolist()
+
+
+def test_contact_map_dense_and_sparse(tmp_path):
+    atom_lines = list(_chain_lines(40))
+    _, points = ca_coordinates(atom_lines)["A"]
+    _, dense = contact_map(atom_lines, "A", cutoff=8.0, tile_size=16)
+    _, sparse = contact_map(atom_lines, "A", cutoff=8.0, sparse=True)
+    expected = [(i, j) for i in range(40) for j in range(i + 1, 40) if math.dist(points[i], points[j]) <= 8.0]
+    assert [(i, j) for i, j, _ in sparse] == expected
+    assert [(i, j) for i in range(40) for j in range(i + 1, 40) if dense[i * 40 + j]] == expected
+    assert all(dense[i * 41] == 1 for i in range(40))
+
+    output = str(tmp_path / "contacts.npy")
+    contact_map(atom_lines, "A", cutoff=8.0, output=output)
+    shape, values = read_npy(output)
+    assert shape == (40, 40) and bytes(values) == bytes(dense)
@@ -12,9 +12,46 @@ from pdb_parser import (
     hetero_atom_residue_counter,
     most_distant_residue_finder,
     radius_of_gyration_calculator,
-    Kyte_Doolittle_scale
+    Kyte_Doolittle_scale,
+    RaminCalc,
+    ColumnExtractor,
+    Structure,
+    AtomTable,
+    atom_table_reader,
+    mmap_pdb_reader,
+    pdb_file_stream,
+    stream_accumulate,
+    AminoAcidCompositionAccumulator,
+    AtomicCompositionAccumulator,
+    HeteroAtomResidueAccumulator,
+    AminoAcidChargeCompositionAccumulator,
+    RadiusOfGyrationAccumulator,
+    element_mass,
+    binding_site_finder,
+    Trajectory,
+    trajectory_reader,
+    open_pdb,
+    print_function,
+    analysis_record,
+    LazyAtomTable,
+    lazy_table_reader,
+    AnalysisResult,
+    analyze,
+    write_results,
+    result_columns
 )
 import os
+from pdb_profile import Profiler
+import pdb_parser
+import io
+import gzip
+import random
+import math
+import types
+import bz2
+import lzma
+import csv
+import json
 
 # Sample PDB data for testing
 pdb_content = """
@@ -110,4 +147,428 @@ def test_radius_of_gyration_calculator(create_pdb_file):
     pdb_file = create_pdb_file
     atom_lines = pdb_file_reader(str(pdb_file))
     radius_of_gyration = radius_of_gyration_calculator(atom_lines)
-    assert radius_of_gyration == pytest.approx(2.3, 0.3) 
\ No newline at end of file
+    assert radius_of_gyration == pytest.approx(2.3, 0.3)
+
+def test_compiled_extractor_matches_get_custom_data_pdb(create_pdb_file):
+    pdb_file = create_pdb_file
+    atom_lines = pdb_file_reader(str(pdb_file))
+    template = RaminCalc.get_template_pdb(["Residue name", "Residue sequence number", "Alternate location indicator"])
+    extractor = RaminCalc.compile_template_pdb(template)
+    for line in atom_lines:
+        assert extractor(line) == RaminCalc.get_custom_data_pdb(line, template)
+    assert extractor(atom_lines[0]) == {'Residue name': 'MET', 'Residue sequence number': '1',
+                                        'Alternate location indicator': ''}
+
+def test_compiled_extractor_converters(create_pdb_file):
+    pdb_file = create_pdb_file
+    atom_lines = pdb_file_reader(str(pdb_file))
+    template = RaminCalc.get_template_pdb(["Atom serial number", "X orthogonal Å coordinate", "Element symbol"])
+    extractor = RaminCalc.compile_template_pdb(template, {"Atom serial number": int, "X orthogonal Å coordinate": float})
+    assert extractor.values(atom_lines[1]) == (2, 37.2, 'C')
+    assert RaminCalc.get_custom_data_pdb(atom_lines[1], RaminCalc.get_template_pdb(["Element symbol"]), True) == 'C'
+    with pytest.raises(ValueError):
+        ColumnExtractor({"Atom name": "[12:16].upper()"})
+
+def test_structure_matches_line_calculators(create_pdb_file):
+    pdb_file = create_pdb_file
+    atom_lines = pdb_file_reader(str(pdb_file))
+    structure = Structure.from_file(str(pdb_file))
+    assert len(structure) == 10
+    assert len(structure.heteroatoms) == len(hetero_atom_pdb_reader(str(pdb_file)))
+    for calculator in [amino_acid_composition_calculator, amino_acid_composition_percentage_calculator,
+                       atomic_composition_calculator, atomic_composition_percentage_calculator,
+                       most_distant_residue_finder, radius_of_gyration_calculator]:
+        assert calculator(structure) == calculator(atom_lines)
+    assert hetero_atom_residue_counter(structure) == {'ABC': 1, 'BLA': 1}
+
+def test_structure_memoizes_metrics(create_pdb_file):
+    structure = Structure.from_file(str(create_pdb_file))
+    composition = amino_acid_composition_calculator(structure)
+    amino_acid_composition_percentage_calculator(structure)
+    assert amino_acid_composition_calculator(structure) is composition
+    assert set(structure.metrics) == {'amino_acid_composition_calculator',
+                                      'amino_acid_composition_percentage_calculator'}
+
+def test_atom_table_reader(create_pdb_file):
+    pdb_file = create_pdb_file
+    atom_lines = pdb_file_reader(str(pdb_file))
+    table = atom_table_reader(str(pdb_file))
+    assert len(table) == 10
+    assert table.column("Atom serial number") == list(range(1, 11))
+    assert table.column("Residue name") == ['MET'] * 5 + ['GLY'] * 5
+    assert table.element.categories == ['N', 'C', 'O']
+    assert table.coordinates_view().shape == (10, 3)
+    assert list(table.xyz())[1] == (37.2, 14.748, 27.74)
+    assert table.column("Temperature factor") == [54.69] * 10
+    for calculator in [amino_acid_composition_calculator, atomic_composition_percentage_calculator,
+                       most_distant_residue_finder, radius_of_gyration_calculator]:
+        assert calculator(table) == calculator(atom_lines)
+
+def _ca_lines(coordinates, chain="A"):
+    return ["ATOM  %5d  CA  ALA %1s%4d    %8.3f%8.3f%8.3f  1.00 20.00           C" % (i + 1, chain, i + 1, x, y, z)
+            for i, (x, y, z) in enumerate(coordinates)]
+
+def test_most_distant_residue_finder_fast_is_identical():
+    rng = random.Random(7)
+    for trial in range(20):
+        atom_lines = []
+        for chain in "AB":
+            n = rng.randint(2, 120)
+            if trial % 2:
+                # integer grid coordinates produce many tied distances
+                coordinates = [(rng.randint(0, 4), rng.randint(0, 4), rng.randint(0, 4)) for _ in range(n)]
+            else:
+                coordinates = [(rng.uniform(-60, 60), rng.uniform(-60, 60), rng.uniform(-60, 60)) for _ in range(n)]
+            atom_lines += _ca_lines(coordinates, chain)
+        expected = most_distant_residue_finder(atom_lines)
+        assert most_distant_residue_finder(atom_lines, fast=True) == expected
+        assert most_distant_residue_finder(AtomTable.from_lines(atom_lines), fast=True) == expected
+
+def test_most_distant_residue_finder_fast_on_a_spherical_shell(monkeypatch):
+    # on a shell every point is as far from the center as any other, the worst case of a radial bound
+    rng = random.Random(3)
+    directions = [[rng.gauss(0, 1) for _ in range(3)] for _ in range(1000)]
+    shell = [tuple(40 * value / math.sqrt(sum(v * v for v in direction)) + offset
+                   for value, offset in zip(direction, (25.0, -7.5, 3.0))) for direction in directions]
+    for coordinates in [shell, [point for point in shell if point[2] >= 3.0]]:
+        atom_lines = _ca_lines(coordinates)
+        expected = most_distant_residue_finder(atom_lines)
+        # every distance of the search goes through math.sqrt or math.dist
+        calls = []
+        counted = types.SimpleNamespace(**vars(math))
+        counted.sqrt = lambda value: calls.append(1) or math.sqrt(value)
+        counted.dist = lambda p, q: calls.append(1) or math.dist(p, q)
+        monkeypatch.setattr(pdb_parser, "math", counted)
+        assert most_distant_residue_finder(atom_lines, fast=True) == expected
+        monkeypatch.undo()
+        # a few passes over the points instead of comparing every pair
+        assert len(calls) < 20 * len(coordinates)
+
+def test_mmap_pdb_reader(create_pdb_file):
+    pdb_file = create_pdb_file
+    atom_lines = pdb_file_reader(str(pdb_file))
+    with mmap_pdb_reader(str(pdb_file)) as records:
+        assert len(records) == 10
+        assert list(records) == atom_lines
+        fields = next(records.iter_fields(["Residue name", "Element symbol"]))
+        assert [bytes(field) for field in fields] == [b'MET', b' N']
+        del fields
+        for calculator in [amino_acid_composition_calculator, atomic_composition_percentage_calculator,
+                           most_distant_residue_finder, radius_of_gyration_calculator]:
+            assert calculator(records) == calculator(atom_lines)
+    with mmap_pdb_reader(str(pdb_file), hetero=True) as records:
+        assert hetero_atom_residue_counter(records) == {'ABC': 1, 'BLA': 1}
+
+def test_mmap_pdb_reader_line_endings(tmp_path):
+    pdb_file = tmp_path / "crlf.pdb"
+    pdb_file.write_bytes(pdb_content.strip().replace("\n", "\r\n").encode())
+    with mmap_pdb_reader(str(pdb_file)) as records:
+        assert atomic_composition_calculator(records) == {'C': 5, 'O': 3, 'N': 2}
+    empty_file = tmp_path / "empty.pdb"
+    empty_file.write_text("")
+    with mmap_pdb_reader(str(empty_file)) as records:
+        assert len(records) == 0
+
+def test_pdb_file_stream(create_pdb_file):
+    pdb_file = create_pdb_file
+    assert list(pdb_file_stream(str(pdb_file))) == pdb_file_reader(str(pdb_file))
+    assert len(list(pdb_file_stream(io.StringIO(pdb_content), ("ATOM", "HETATM")))) == 13
+
+def test_stream_accumulators(create_pdb_file):
+    pdb_file = create_pdb_file
+    atom_lines = pdb_file_reader(str(pdb_file))
+    gz_file = pdb_file.with_suffix(".pdb.gz")
+    gz_file.write_bytes(gzip.compress(pdb_content.encode()))
+    composition = AminoAcidCompositionAccumulator()
+    atomic = AtomicCompositionAccumulator()
+    with gzip.open(gz_file, "rt") as f:
+        results = stream_accumulate(pdb_file_stream(f, ("ATOM", "HETATM")),
+                                    [composition, atomic, HeteroAtomResidueAccumulator(),
+                                     AminoAcidChargeCompositionAccumulator(), RadiusOfGyrationAccumulator()])
+    assert results[0] == amino_acid_composition_calculator(atom_lines)
+    assert results[1] == atomic_composition_calculator(atom_lines)
+    assert results[2] == {'ABC': 1, 'BLA': 1}
+    assert results[3] == {'Positive': 0, 'Negative': 0}
+    assert results[4] == pytest.approx(radius_of_gyration_calculator(atom_lines), 1e-9)
+    assert composition.percentage() == amino_acid_composition_percentage_calculator(atom_lines)
+    assert atomic.percentage() == atomic_composition_percentage_calculator(atom_lines)
+
+def test_radius_of_gyration_variants():
+    # two iron atoms in chain A, two zinc atoms and an unknown element in chain B
+    atom_lines = [
+        "ATOM      1 FE   HEM A   1       0.000   0.000   0.000  1.00  0.00          FE  ",
+        "ATOM      2 FE   HEM A   1       2.000   0.000   0.000  1.00  0.00          FE  ",
+        "ATOM      3 ZN   ZNC B   2       0.000   0.000   0.000  1.00  0.00          ZN  ",
+        "ATOM      4 ZN   ZNC B   3       0.000   4.000   0.000  1.00  0.00          ZN  ",
+        "ATOM      5  X   UNK B   3      50.000  50.000  50.000  1.00  0.00          XX  ",
+    ]
+    assert element_mass("FE") == element_mass("Fe") > 0
+    assert element_mass("XX") == 0.0
+    for source in [atom_lines, Structure.from_lines(atom_lines)]:
+        by_chain = radius_of_gyration_calculator(source, by_chain=True)
+        assert by_chain["A"] == pytest.approx(1.0)
+        assert by_chain["B"] == pytest.approx(2.0)
+        assert radius_of_gyration_calculator(source, residues={("B", 2), ("B", 3)}) == pytest.approx(2.0)
+        assert radius_of_gyration_calculator(source) == pytest.approx(radius_of_gyration_calculator(atom_lines))
+    with pytest.raises(ValueError):
+        radius_of_gyration_calculator(atom_lines, residues={("C", 1)})
+
+def test_binding_site_finder(create_pdb_file):
+    pdb_file = create_pdb_file
+    atom_lines = pdb_file_reader(str(pdb_file))
+    heteroatom_lines = hetero_atom_pdb_reader(str(pdb_file))
+    binding_sites = binding_site_finder(atom_lines, heteroatom_lines, cutoff=2.0)
+    assert [(site["ligand"], site["residue_number"], site["atoms"]) for site in binding_sites] == \
+        [("ABC", 3, 2), ("BLA", 4, 1)]
+    assert binding_sites[0]["residues"] == [{"chain": "A", "residue_name": "GLY", "residue_number": 2,
+                                             "insertion_code": "", "min_distance": 1.077}]
+    assert binding_sites[1]["min_distance"] == 1.4
+    # every residue within the cutoff of some ligand atom, checked against all atom pairs
+    wide = binding_site_finder(Structure.from_file(str(pdb_file)), cutoff=5.0)
+    columns = ["X orthogonal Å coordinate", "Y orthogonal Å coordinate", "Z orthogonal Å coordinate"]
+    for site, ligand_lines in [(wide[0], heteroatom_lines[:2]), (wide[1], heteroatom_lines[2:])]:
+        expected = {}
+        for ligand_line in ligand_lines:
+            ligand = RaminCalc.get_data_pdb(ligand_line)
+            for line in atom_lines:
+                atom = RaminCalc.get_data_pdb(line)
+                distance = math.dist([float(ligand[c]) for c in columns], [float(atom[c]) for c in columns])
+                if distance <= 5.0:
+                    key = int(atom["Residue sequence number"])
+                    expected[key] = min(expected.get(key, distance), distance)
+        assert {r["residue_number"]: r["min_distance"] for r in site["residues"]} == \
+            {key: round(distance, 3) for key, distance in expected.items()}
+
+def _ensemble(n_models):
+    # the ATOM records of pdb_content as models, every model shifted and stretched along x
+    atom_lines = [line for line in pdb_content.splitlines() if line.startswith("ATOM")]
+    text = ""
+    for model in range(n_models):
+        text += "MODEL     %4d\n" % (model + 1)
+        for line in atom_lines:
+            x = float(line[30:38]) * (1 + model / 10) + model
+            text += line[:30] + "%8.3f" % x + line[38:] + "\n"
+        text += "ENDMDL\n"
+    return text + "END\n"
+
+def test_trajectory_reader(tmp_path):
+    pdb_file = tmp_path / "ensemble.pdb"
+    pdb_file.write_text(_ensemble(3))
+    # the single structure readers only see the first model
+    assert len(pdb_file_reader(str(pdb_file))) == 10
+    assert amino_acid_composition_calculator(pdb_file_reader(str(pdb_file))) == {'MET': 1, 'GLY': 1}
+    assert len(Structure.from_file(str(pdb_file))) == 10
+    with mmap_pdb_reader(str(pdb_file)) as records:
+        assert len(records) == 10
+
+    trajectory = trajectory_reader(str(pdb_file))
+    assert (len(trajectory), len(trajectory.topology)) == (3, 10)
+    assert trajectory.frames_view().shape == (3, 10, 3)
+    assert trajectory.composition() == {'MET': 1, 'GLY': 1}
+    rgs = trajectory.radius_of_gyration()
+    most_distant = trajectory.most_distant_residues()
+    for index in range(3):
+        frame = trajectory.frame(index)
+        assert rgs[index] == pytest.approx(radius_of_gyration_calculator(frame), 1e-9)
+        assert most_distant[index] == most_distant_residue_finder(frame)
+    assert rgs[0] < rgs[1] < rgs[2]
+    assert trajectory.frame(2).coordinates[0] == round(38.428 * 1.2 + 2, 3)
+
+    # a file without MODEL records is a single frame
+    assert len(Trajectory.from_file(io.StringIO(pdb_content))) == 1
+    broken = _ensemble(2).replace("ATOM     10", "REMARK   10", 1)
+    with pytest.raises(ValueError):
+        Trajectory.from_file(io.StringIO(broken))
+
+def test_compressed_and_stdin_input(create_pdb_file, monkeypatch, capsys):
+    pdb_file = create_pdb_file
+    atom_lines = pdb_file_reader(str(pdb_file))
+    heteroatom_lines = hetero_atom_pdb_reader(str(pdb_file))
+    print_function(str(pdb_file))
+    expected_output = capsys.readouterr().out
+    for suffix, compress in [(".gz", gzip.compress), (".bz2", bz2.compress), (".xz", lzma.compress)]:
+        compressed_file = str(pdb_file) + suffix
+        with open(compressed_file, "wb") as f:
+            f.write(compress(pdb_content.encode()))
+        assert pdb_file_reader(compressed_file) == atom_lines
+        assert hetero_atom_pdb_reader(compressed_file) == heteroatom_lines
+        assert len(Structure.from_file(compressed_file).heteroatoms) == 3
+        print_function(compressed_file)
+        assert capsys.readouterr().out == expected_output
+
+    monkeypatch.setattr("sys.stdin", io.StringIO(pdb_content))
+    assert pdb_file_reader("-") == atom_lines
+
+    # the background reader stops when the caller leaves early, and hands read errors over
+    ensemble_file = str(pdb_file) + ".ensemble.gz"
+    with gzip.open(ensemble_file, "wt") as f:
+        f.write(_ensemble(2000))
+    assert len(pdb_file_reader(ensemble_file)) == 10
+    with open_pdb(ensemble_file, buffer_chunks=1) as lines:
+        assert next(iter(lines)).startswith("MODEL")
+    with open(ensemble_file, "r+b") as f:
+        f.truncate(os.path.getsize(ensemble_file) // 2)
+    with pytest.raises(EOFError):
+        len(trajectory_reader(ensemble_file))
+
+def test_profiler_hooks(create_pdb_file, capsys):
+    pdb_file = str(create_pdb_file)
+    print_function(pdb_file)
+    expected_output = capsys.readouterr().out
+    calls = []
+    profiler = Profiler(memory=True, callback=lambda name, seconds, peak: calls.append((name, seconds >= 0, peak >= 0)))
+    print_function(pdb_file, profiler)
+    assert capsys.readouterr().out == expected_output
+    assert list(profiler.stages) == ["parse", "composition", "atomic composition", "hetero atoms",
+                                     "most distant residues", "radius of gyration", "output"]
+    assert profiler.stages["composition"]["calls"] == 2
+    assert profiler.counters == {"lines": 14, "atoms": 10, "heteroatoms": 3}
+    assert calls[0] == ("parse", True, True) and len(calls) == 8
+
+    profiler = Profiler()
+    assert analysis_record(pdb_file, profiler) == analysis_record(pdb_file)
+    assert profiler.stages["parse"]["peak_bytes"] is None
+    profiler.report()
+    assert "radius of gyration" in capsys.readouterr().err
+
+def test_lazy_table_decodes_only_used_columns(create_pdb_file):
+    pdb_file = str(create_pdb_file)
+    atom_lines = pdb_file_reader(pdb_file)
+    table = lazy_table_reader(pdb_file)
+    assert atomic_composition_calculator(table) == atomic_composition_calculator(atom_lines)
+    assert table.decoded() == ["element"]
+    table = LazyAtomTable(atom_lines)
+    assert most_distant_residue_finder(table, fast=True) == most_distant_residue_finder(atom_lines)
+    assert sorted(table.decoded()) == ["chain", "coordinates", "name", "residue_number"]
+    for calculator in [amino_acid_composition_calculator, radius_of_gyration_calculator]:
+        assert calculator(table) == calculator(atom_lines)
+    assert [table.record(index) for index in range(len(table))] == [RaminCalc.get_data_pdb(line) for line in atom_lines]
+
+    # appending drops the decoded columns, they are decoded again with the new atom
+    table.append_line(atom_lines[0])
+    assert table.decoded() == []
+    assert atomic_composition_calculator(table) == {'C': 5, 'O': 3, 'N': 3}
+
+def test_residue_index_and_multi_chain_counts(tmp_path):
+    # residue 1 exists in chains A and B, residue 2 of chain A has an insertion 2A
+    atom_lines = [
+        "ATOM      1  N   MET A   1      38.428  13.947  27.340  1.00 54.69           N  ",
+        "ATOM      2  CA  MET A   1      37.200  14.748  27.740  1.00 54.69           C  ",
+        "ATOM      3  CA  GLY A   2      34.800  11.800  26.540  1.00 54.69           C  ",
+        "ATOM      4  CA  GLY A   2A     33.600  12.600  26.940  1.00 54.69           C  ",
+        "ATOM      5  N   MET B   1      32.600  12.200  26.540  1.00 54.69           N  ",
+        "ATOM      6  CA  MET B   1      31.600  11.200  26.140  1.00 54.69           C  ",
+    ]
+    pdb_file = tmp_path / "chains.pdb"
+    pdb_file.write_text("\n".join(atom_lines) + "\n")
+    expected = {'MET': 2, 'GLY': 2}
+    assert amino_acid_composition_calculator(atom_lines) == expected
+    assert amino_acid_composition_calculator(Structure.from_lines(atom_lines)) == expected
+    with mmap_pdb_reader(str(pdb_file)) as records:
+        assert amino_acid_composition_calculator(records) == expected
+    assert stream_accumulate(atom_lines, [AminoAcidCompositionAccumulator()])[0] == expected
+    assert hetero_atom_residue_counter([line.replace("ATOM  ", "HETATM") for line in atom_lines]) == expected
+
+    residues = AtomTable.from_lines(atom_lines).residues()
+    assert list(residues) == [("A", 1, ""), ("A", 2, ""), ("A", 2, "A"), ("B", 1, "")]
+    assert residues[("B", "1")] == range(4, 6)
+    assert residues.name(("A", 2, "A")) == "GLY"
+    assert ("C", 1) not in residues
+    assert residues.slice(("A", 2), ("B", 1)) == range(2, 6)
+
+
+def test_analyze_result_and_serialization(create_pdb_file, capsys):
+    pdb_file = str(create_pdb_file)
+    result = analyze(pdb_file)
+    assert isinstance(result, AnalysisResult) and not hasattr(result, "__dict__")
+    assert result.as_dict() == analysis_record(pdb_file)
+    assert AnalysisResult.from_dict({"file": pdb_file, **result.as_dict()}) == result
+    assert result.most_distant_residues == ['1', '2'] and isinstance(result.radius_of_gyration, float)
+
+    print_function(pdb_file)
+    text = capsys.readouterr().out
+    assert write_results([result], output_format="text") == 1 and capsys.readouterr().out == text
+
+    print_function(pdb_file, output_format="json")
+    assert json.loads(capsys.readouterr().out) == {"file": pdb_file, **json.loads(result.to_json())}
+
+    # a generator is consumed one result at a time
+    records = ({"file": str(index), **result.as_dict()} for index in range(5))
+    output = io.StringIO()
+    assert write_results(records, output, "csv") == 5
+    rows = list(csv.DictReader(io.StringIO(output.getvalue())))
+    assert [row["file"] for row in rows] == ["0", "1", "2", "3", "4"]
+    assert json.loads(rows[0]["atomic_composition"]) == result.atomic_composition
+
+    output = io.StringIO()
+    assert write_results([result] * 5, output, "columnar", batch_size=2) == 5
+    batches = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [batch["length"] for batch in batches] == [2, 2, 1]
+    assert batches[0]["columns"]["radius_of_gyration"] == [result.radius_of_gyration] * 2
+    assert batches[0]["columns"]["file"] == [None, None]
+    assert {column["name"]: column["type"] for column in batches[0]["schema"]}["atoms"] == "int64"
+    assert result_columns([])["length"] == 0
+    with pytest.raises(ValueError):
+        write_results([result], output, "xml")
+
+
+def test_overflowed_serial_and_residue_numbers(tmp_path, capsys):
+    # serials past 99999 are written in hybrid-36 (A0000 = 100000) or as stars by some programs
+    lines = [line for line in pdb_content.strip().splitlines() if line.startswith("ATOM")]
+    lines[0] = lines[0][:6] + "A0000" + lines[0][11:]
+    lines[1] = lines[1][:6] + "*****" + lines[1][11:]
+    lines[5:] = [line[:22] + "A000" + line[26:] for line in lines[5:]]
+    pdb_file = tmp_path / "overflow.pdb"
+    pdb_file.write_text("\n".join(lines) + "\n")
+
+    table = AtomTable.from_lines(lines)
+    assert list(table.serial[:3]) == [100000, -1, 3]
+    assert list(table.residue_number) == [1] * 5 + [10000] * 5
+    structure = Structure.from_file(str(pdb_file))
+    assert amino_acid_composition_calculator(structure) == {"MET": 1, "GLY": 1}
+    print_function(str(pdb_file))
+    output = capsys.readouterr().out
+    assert "GLY 1 50.00%" in output and "residues 1 and 10000" in output
+
+
+def test_analyze_single_residue(tmp_path, capsys):
+    # a single CA atom has no most distant pair, the metric stays None in every output
+    pdb_file = tmp_path / "single.pdb"
+    pdb_file.write_text("".join(line + "\n" for line in pdb_content.strip().splitlines()[:5]))
+    result = analyze(str(pdb_file))
+    assert result.most_distant_residues_distance is None and result.most_distant_residues == [None, None]
+    assert analysis_record(str(pdb_file))["most_distant_residues_distance"] is None
+    for output_format in ["json", "csv", "columnar"]:
+        assert write_results([result], io.StringIO(), output_format) == 1
+    print_function(str(pdb_file))
+    assert "most distant residues: not available" in capsys.readouterr().out
+
+
+def test_residue_names_are_stripped_in_every_path():
+    # a two letter residue name is padded to " ZN" in the columns, every input counts it as "ZN"
+    zinc = "HETATM 1000 ZN    ZN A 301      10.000  10.000  10.000  1.00 20.00          ZN  "
+    for heteroatom_lines in [[zinc], AtomTable.from_lines([zinc]), Structure.from_lines([], [zinc])]:
+        assert hetero_atom_residue_counter(heteroatom_lines) == {"ZN": 1}
+    assert amino_acid_composition_calculator([zinc]) == amino_acid_composition_calculator(
+        AtomTable.from_lines([zinc])) == {"ZN": 1}
+    assert stream_accumulate([zinc], [HeteroAtomResidueAccumulator()]) == [{"ZN": 1}]
+
+
+def test_structure_cache_does_not_rerun_failing_calculators(create_pdb_file):
+    from pdb_parser import _structure_cached
+    calls = []
+
+    @_structure_cached
+    def failing(atom_lines, scale=1):
+        calls.append(scale)
+        raise TypeError("bad atom")
+
+    structure = Structure.from_file(str(create_pdb_file))
+    with pytest.raises(TypeError, match="bad atom"):
+        failing(structure)
+    with pytest.raises(TypeError, match="bad atom"):
+        failing(structure, scale=[2])
+    # the error of the calculator is raised by its only run, an unhashable option only skips the memoization
+    assert calls == [1, [2]]
+    # memoized results are shared, not copied
+    assert amino_acid_composition_calculator(structure) is amino_acid_composition_calculator(structure)
@@ -0,0 +1,66 @@
+import math
+import pytest
+from pdb_parser import Structure, Kyte_Doolittle_scale
+from bench_pdb_parser import backbone_from_dihedrals
+from pdb_sasa import atom_sasa, residue_sasa, surface_hydrophobicity, sphere_points, probe_radius
+
+atom_line = "ATOM  %5d  %-3s %3s %s%4d    %8.3f%8.3f%8.3f  1.00 20.00          %2s  \n"
+
+
+def test_atom_sasa():
+    points = sphere_points(50)
+    assert len(points) == 50 and all(x * x + y * y + z * z == pytest.approx(1.0) for x, y, z in points)
+
+    # an isolated atom exposes its whole grown sphere, the element columns (or the atom name) give the radius
+    assert atom_sasa([atom_line % (1, "CA", "ALA", "A", 1, 0.0, 0.0, 0.0, "C")])[0] == \
+        pytest.approx(4 * math.pi * (1.70 + probe_radius) ** 2)
+    assert atom_sasa([atom_line % (1, "OG", "SER", "A", 1, 0.0, 0.0, 0.0, "")])[0] == \
+        pytest.approx(4 * math.pi * (1.52 + probe_radius) ** 2)
+    assert atom_sasa([atom_line % (1, "CA", "ALA", "A", 1, 0.0, 0.0, 0.0, "C")], radii={"C": 2.0}, probe=0.0)[0] == \
+        pytest.approx(4 * math.pi * 4.0)
+
+    # two overlapping spheres each lose a spherical cap of height R - d / 2
+    pair = [atom_line % (1, "CA", "ALA", "A", 1, 0.0, 0.0, 0.0, "C"),
+            atom_line % (2, "CB", "ALA", "B", 1, 1.5, 0.0, 0.0, "C")]
+    radius = 1.70 + probe_radius
+    exact = 4 * math.pi * radius ** 2 - 2 * math.pi * radius * (radius - 0.75)
+    areas = atom_sasa(pair, n_points=1000)
+    assert list(areas) == pytest.approx([exact, exact], rel=0.01)
+    # the chains measured in separate processes give the same areas
+    assert list(atom_sasa(pair, n_points=1000, workers=2)) == list(areas)
+
+
+def test_residue_sasa_and_hydrophobicity(tmp_path):
+    helix = backbone_from_dihedrals([(-57.0, -47.0, 180.0)] * 10)
+    pdb_file = tmp_path / "helix.pdb"
+    pdb_file.write_text("".join(line[:17] + ("LEU" if line[22:26] == "   5" else "LYS") + line[20:]
+                                for line in helix))
+    structure = Structure.from_file(str(pdb_file))
+    residue_areas = residue_sasa(structure)
+    assert list(residue_areas) == [("A", number, "") for number in range(1, 11)]
+    assert sum(area for _, area, _ in residue_areas.values()) == pytest.approx(sum(atom_sasa(structure)))
+    # the terminal residues are the most exposed
+    name, area, exposure = residue_areas[("A", 1, "")]
+    assert name == "LYS" and exposure == pytest.approx(area / 236.0)
+    assert area > residue_areas[("A", 5, "")][1]
+    assert atom_sasa(structure) is atom_sasa(structure)
+
+    summary = surface_hydrophobicity(structure, Kyte_Doolittle_scale)
+    assert summary["total_area"] == pytest.approx(summary["Hydrophobic"] + summary["Hydrophilic"])
+    assert summary["Hydrophobic"] == pytest.approx(residue_areas[("A", 5, "")][1])
+    assert summary["mean_hydrophobicity"] == pytest.approx((9 * -3.9 + 3.8) / 10)
+    assert -3.9 < summary["exposure_weighted_hydrophobicity"] < summary["mean_hydrophobicity"]
+
+
+def test_residue_sasa_of_a_split_residue():
+    # the O atom of residue 5 comes after residue 6, the residue has two runs of atoms
+    helix = backbone_from_dihedrals([(-57.0, -47.0, 180.0)] * 8)
+    oxygen = next(i for i, line in enumerate(helix) if line[22:26] == "   5" and line[12:16] == " O  ")
+    split = helix[:oxygen] + [line for line in helix[oxygen + 1:] if line[22:26] == "   6"] + [helix[oxygen]] \
+        + [line for line in helix[oxygen + 1:] if line[22:26] not in ("   5", "   6")]
+    areas = atom_sasa(split)
+    residue_areas = residue_sasa(split)
+    assert list(residue_areas) == [("A", number, "") for number in range(1, 9)]
+    assert residue_areas[("A", 5, "")][1] == pytest.approx(sum(area for line, area in zip(split, areas)
+                                                               if line[22:26] == "   5"))
+    assert sum(area for _, area, _ in residue_areas.values()) == pytest.approx(sum(areas))
@@ -0,0 +1,54 @@
+import pytest
+from pdb_select import compile_selection, select
+from pdb_parser import (Structure, AtomTable, RaminCalc, pdb_file_reader, hetero_atom_pdb_reader,
+                        atomic_composition_calculator, radius_of_gyration_calculator)
+from test_pdb_parser import pdb_content
+
+
+@pytest.fixture
+def structure(tmp_path):
+    pdb_file = tmp_path / "test.pdb"
+    pdb_file.write_text(pdb_content)
+    return Structure.from_file(str(pdb_file)), pdb_file_reader(str(pdb_file)) + hetero_atom_pdb_reader(str(pdb_file))
+
+
+def _brute_force(lines, keep):
+    return [index for index, line in enumerate(lines) if keep(RaminCalc.get_data_pdb(line))]
+
+
+def test_selection_matches_python_filtering(structure):
+    structure, lines = structure
+    cases = [
+        ("chain A and name CA", lambda a: a["Chain identifier"] == "A" and a["Atom name"] == "CA"),
+        ("element C N and bfactor < 60", lambda a: a["Element symbol"] in ("C", "N")),
+        ("resid 2-3 or resname BLA", lambda a: a["Residue sequence number"] in ("2", "3") or a["Residue name"] == "BLA"),
+        ("not (hetero or name O) and x >= 34.8", lambda a: a["Type"] == "ATOM" and a["Atom name"] != "O"
+         and float(a["X orthogonal Å coordinate"]) >= 34.8),
+        ("protein and resid 1:1 -5", lambda a: a["Type"] == "ATOM" and a["Residue sequence number"] == "1"),
+        ("none or all and serial > 12", lambda a: int(a["Atom serial number"]) > 12),
+    ]
+    for query, keep in cases:
+        assert compile_selection(query).indices(structure) == _brute_force(lines, keep), query
+
+
+def test_selection_around_cache_and_calculators(structure):
+    structure, lines = structure
+    # atoms within 1.5 Å of the ABC ligand, without the ligand itself: the two last GLY oxygens and the B atom
+    assert compile_selection("resname ABC around 1.5").indices(structure) == [8, 9, 12]
+    assert compile_selection("resname ABC around 1.5 and protein").indices(lines) == [8, 9]
+
+    selection = compile_selection("chain A and name CA")
+    assert compile_selection("chain A and name CA") is selection
+    table = structure.all_atoms()
+    assert selection.mask(structure) is selection.mask(structure)
+    assert ("selection", selection.tree) in table.derived()
+
+    chain_a = select(structure, "protein")
+    assert isinstance(chain_a, AtomTable) and len(chain_a) == 10
+    assert atomic_composition_calculator(chain_a) == atomic_composition_calculator(structure)
+    assert radius_of_gyration_calculator(chain_a) == pytest.approx(radius_of_gyration_calculator(structure))
+    assert atomic_composition_calculator(select(structure, "hetero")) == {'O': 1, 'C': 1, 'B': 1}
+
+    for query in ["chain", "chain A and", "resid < x", "(name CA", "colour red", "name CA )"]:
+        with pytest.raises(ValueError):
+            compile_selection(query)
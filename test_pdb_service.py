@@ -0,0 +1,85 @@
+import json
+import asyncio
+from pdb_service import AnalysisService, percentiles
+from pdb_parser import analysis_record
+from test_pdb_parser import pdb_content
+
+
+async def _request(reader, writer, method, path, body=None):
+    # one HTTP request on a kept alive connection, answers (status, JSON)
+    payload = b"" if body is None else json.dumps(body).encode()
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: test\r\nContent-Length: {len(payload)}\r\n\r\n".encode() + payload)
+    await writer.drain()
+    head = (await reader.readuntil(b"\r\n\r\n")).decode()
+    length = int(head.lower().split("content-length:")[1].split("\r\n")[0])
+    return int(head.split(" ")[1]), json.loads(await reader.readexactly(length))
+
+
+def test_service_answers_analyses_and_stats(tmp_path):
+    pdb_file = tmp_path / "test.pdb"
+    pdb_file.write_text(pdb_content)
+
+    async def scenario():
+        service = AnalysisService(workers=2, cache_size=1)
+        server = await service.start(port=0)
+        reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+        try:
+            answers = [await _request(reader, writer, "POST", "/analyze", {"path": str(pdb_file)}),
+                       await _request(reader, writer, "POST", "/analyze", {"path": str(pdb_file)}),
+                       await _request(reader, writer, "POST", "/analyze", {"content": pdb_content}),
+                       await _request(reader, writer, "POST", "/analyze", {"path": str(tmp_path / "missing.pdb")}),
+                       await _request(reader, writer, "POST", "/analyze", {"file": "x"}),
+                       await _request(reader, writer, "GET", "/analyze"),
+                       await _request(reader, writer, "GET", "/nowhere")]
+            # identical requests in flight share one analysis
+            shared = await asyncio.gather(*[service.analyze({"content": pdb_content + "\n"}) for _ in range(3)])
+            stats = await _request(reader, writer, "GET", "/stats")
+        finally:
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            service.close()
+        return answers, shared, stats
+
+    answers, shared, (status, stats) = asyncio.run(scenario())
+    record = json.loads(json.dumps(analysis_record(str(pdb_file))))
+    assert answers[0] == (200, {"file": str(pdb_file), **record, "cache": "miss"})
+    assert answers[1] == (200, {"file": str(pdb_file), **record, "cache": "hit"})
+    assert answers[2] == (200, {"file": "<content>", **record, "cache": "miss"})
+    assert answers[3][0] == 422 and "FileNotFoundError" in answers[3][1]["error"]
+    assert [status for status, _ in answers[4:]] == [400, 405, 404]
+    assert [answer["cache"] for _, answer in shared] == ["miss"] * 3
+
+    assert status == 200
+    assert (stats["requests"], stats["analyses"], stats["shared"], stats["cache_hits"], stats["errors"]) == (8, 4, 2, 1, 1)
+    assert stats["cached"] == 1 and stats["latency_window"] == 6
+    assert stats["latency_ms"]["p50"] <= stats["latency_ms"]["p90"] <= stats["latency_ms"]["p99"]
+
+
+def test_percentiles():
+    assert percentiles(range(1, 101)) == {"p50": 50, "p90": 90, "p99": 99}
+    assert percentiles([3.0], (0, 100)) == {"p0": 3.0, "p100": 3.0}
+    assert percentiles([]) == {"p50": None, "p90": None, "p99": None}
+
+
+def test_service_rejects_malformed_content_length():
+    async def scenario():
+        service = AnalysisService(workers=1)
+        server = await service.start(port=0)
+        answers = []
+        try:
+            for length in ["abc", "-5"]:
+                reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+                writer.write(f"POST /analyze HTTP/1.1\r\nContent-Length: {length}\r\n\r\n".encode())
+                await writer.drain()
+                head = (await reader.readuntil(b"\r\n\r\n")).decode()
+                answers.append((int(head.split(" ")[1]), json.loads(await reader.read())))
+                writer.close()
+        finally:
+            server.close()
+            await server.wait_closed()
+            service.close()
+        return answers
+
+    for status, answer in asyncio.run(scenario()):
+        assert status == 400 and "Content-Length" in answer["error"]
@@ -0,0 +1,46 @@
+import math
+import random
+import pytest
+from pdb_spatial import CellList
+from pdb_parser import Structure, spatial_index
+from test_pdb_parser import pdb_content
+
+
+def _points(n, seed=0):
+    rng = random.Random(seed)
+    return [(rng.uniform(-20, 20), rng.uniform(-20, 20), rng.uniform(-20, 20)) for _ in range(n)]
+
+
+def test_cell_list_matches_brute_force():
+    points = _points(400)
+    index = CellList(points, cell_size=3.0)
+    assert len(index) == 400
+    brute_pairs = {(i, j) for i in range(400) for j in range(i + 1, 400)
+                   if math.dist(points[i], points[j]) <= 5.0}
+    pairs = list(index.pairs_within(5.0))
+    assert len(pairs) == len(brute_pairs)
+    assert {(i, j) for i, j, _ in pairs} == brute_pairs
+    assert all(d == pytest.approx(math.dist(points[i], points[j])) for i, j, d in pairs)
+
+    query = (1.0, -2.0, 3.0)
+    assert index.query_radius(query, 6.5) == [i for i, p in enumerate(points) if math.dist(p, query) <= 6.5]
+    brute_nearest = sorted((math.dist(p, query), i) for i, p in enumerate(points))
+    for k in [1, 7, 400, 500]:
+        nearest = index.nearest(query, k)
+        assert [i for _, i in nearest] == [i for _, i in brute_nearest[:k]]
+    # a query point far away from every point
+    far = (500.0, 500.0, 500.0)
+    assert index.nearest(far, 1)[0][1] == min(range(400), key=lambda i: math.dist(points[i], far))
+
+
+def test_spatial_index_of_structure():
+    atom_lines = [line for line in pdb_content.splitlines() if line.startswith("ATOM")]
+    heteroatom_lines = [line for line in pdb_content.splitlines() if line.startswith("HETATM")]
+    structure = Structure.from_lines(atom_lines, heteroatom_lines)
+    index = spatial_index(structure)
+    assert len(index) == 10
+    assert index.point(0) == (38.428, 13.947, 27.34)
+    # the atoms around the first HETATM oxygen
+    ligand = spatial_index(structure, hetero=True).point(0)
+    assert [i for i, d in index.query_radius(ligand, 1.5, distances=True)] == [8, 9]
+    assert spatial_index(atom_lines).coordinates == index.coordinates
@@ -0,0 +1,68 @@
+import io
+import math
+import pytest
+from pdb_parser import Structure, Trajectory
+from bench_pdb_parser import backbone_from_dihedrals
+from pdb_superpose import coordinate_stack, rmsd, kabsch, superpose, rmsd_to_reference, rmsd_matrix
+
+helix = backbone_from_dihedrals([(-57.0, -47.0, 180.0)] * 12)
+
+
+def _moved(lines, angle, shift, noise=0.0):
+    # lines rotated by angle (radians) around z, shifted and jittered along x
+    moved = []
+    for index, line in enumerate(lines):
+        x, y, z = (float(line[start:start + 8]) for start in (30, 38, 46))
+        x, y = math.cos(angle) * x - math.sin(angle) * y, math.sin(angle) * x + math.cos(angle) * y
+        moved.append(line[:30] + "%8.3f%8.3f%8.3f" % (x + shift + noise * (-1) ** index, y, z + shift) + line[54:])
+    return moved
+
+
+def test_superposition():
+    points = [tuple(float(line[start:start + 8]) for start in (30, 38, 46)) for line in helix]
+    target = [tuple(float(line[start:start + 8]) for start in (30, 38, 46)) for line in _moved(helix, 1.0, 5.0)]
+    assert rmsd(points, target) == pytest.approx(0.0, abs=1e-3)
+    rotation, translation, deviation = kabsch(points, target)
+    assert rotation[0][:2] == pytest.approx((math.cos(1.0), -math.sin(1.0)), abs=1e-4)
+    assert translation[2] == pytest.approx(5.0, abs=1e-3) and deviation == pytest.approx(0.0, abs=1e-3)
+
+    # the RMSD of the superposed coordinates is the one found from the quaternion eigenvalue
+    noisy = [tuple(float(line[start:start + 8]) for start in (30, 38, 46))
+             for line in _moved(helix, 2.0, -3.0, noise=0.5)]
+    moved, deviation = superpose(points, noisy)
+    explicit = math.sqrt(sum((moved[3 * k + axis] - noisy[k][axis]) ** 2 for k in range(len(noisy))
+                             for axis in range(3)) / len(noisy))
+    assert deviation == pytest.approx(explicit) and deviation == pytest.approx(rmsd(points, noisy))
+    assert 0.4 < deviation < 0.5
+    # a mirror image can not be superposed by a rotation
+    assert rmsd(points, [(-x, y, z) for x, y, z in points]) > 1.0
+    with pytest.raises(ValueError):
+        rmsd(points, points[1:])
+
+
+def test_coordinate_stack_and_rmsd_matrix(tmp_path):
+    chain_b = [line[:21] + "B" + line[22:] for line in _moved(helix, 0.0, 30.0)]
+    models = [helix + chain_b, _moved(helix, 0.5, 2.0, noise=0.2), _moved(helix, 1.5, -4.0, noise=0.6)]
+    # the second model misses residue 3 and only the first has a chain B: only the atoms found in every model are
+    # compared
+    models[1] = [line for line in models[1] if line[22:26] != "   3"]
+    stack = coordinate_stack([Structure.from_lines(model) for model in models])
+    assert len(stack) == 3 and len(stack.keys) == 11 and {key[0] for key in stack.keys} == {"A"}
+    assert len(coordinate_stack([Structure.from_lines(models[0])] * 2).keys) == 24
+    assert stack.keys[:3] == [("A", 1, "", "CA"), ("A", 2, "", "CA"), ("A", 4, "", "CA")]
+
+    deviations = rmsd_to_reference(stack)
+    assert deviations[0] == pytest.approx(0.0, abs=1e-6) and deviations[1] < deviations[2]
+    matrix = rmsd_matrix(stack)
+    assert [row[0] for row in matrix] == pytest.approx(list(deviations), abs=1e-6)
+    assert all(matrix[i][j] == matrix[j][i] for i in range(3) for j in range(3)) and matrix[1][1] == 0.0
+    assert matrix[1][2] == pytest.approx(rmsd(stack.model(1), stack.model(2)))
+    assert rmsd_matrix(stack, workers=2) == matrix
+
+    # the models of a trajectory share their topology
+    text = "".join(f"MODEL     {index + 1:4d}\n" + "".join(model) + "ENDMDL\n" for index, model in
+                   enumerate([helix, _moved(helix, 0.5, 2.0, noise=0.2)]))
+    trajectory = Trajectory.from_file(io.StringIO(text))
+    stack = coordinate_stack(trajectory, "name N CA C")
+    assert len(stack) == 2 and len(stack.keys) == 36
+    assert rmsd_to_reference(stack, reference=stack.model(1))[1] == pytest.approx(0.0, abs=1e-6)